@@ -0,0 +1,201 @@
+"""
+Compare kNN index profiles on a sample of an existing index.
+
+Samples documents with their embeddings from --index, loads them into one scratch index per
+profile from opensearch-config/index-profiles.json and runs the same approximate kNN queries
+against each. Recall@k is measured against exact neighbours from the knn_score script, latency
+client-side and as reported by OpenSearch, memory as store size and native graph memory.
+Queries are embeddings of held-out sampled documents, so no inference is needed.
+
+Connection settings come from the environment as for the service (OPENSEARCH_HOSTS, ...).
+
+    python benchmarks/evaluate_profiles.py --index <user id> --sample 5000 --queries 200 --k 10
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCHMARKS_DIR.parent / "src"))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from opensearchpy.helpers import bulk
+from index_profiles import load_profiles
+from opensearch_client import OpenSearchClient, default_index_body
+from run_benchmarks import percentile
+from tenancy import resolve, scope_query
+import settings
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index", required=True, help="index (user id) to sample, resolved like the routes do")
+    parser.add_argument("--profiles", default=",".join(load_profiles()), help="comma-separated profile names")
+    parser.add_argument("--sample", type=int, default=5000, help="documents to sample, at most 10000")
+    parser.add_argument("--queries", type=int, default=100, help="held-out documents used as queries")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--space-type", default="cosinesimil", help="space of the exact neighbours, the model's own")
+    parser.add_argument("--force-merge", action="store_true", help="merge every scratch index into one segment first")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch indices")
+    parser.add_argument("--label", default="profiles")
+    parser.add_argument("--output-dir", default=str(BENCHMARKS_DIR / "results"))
+    return parser.parse_args()
+
+def sample_documents(client: OpenSearchClient, index: str, size: int, seed: int) -> list[dict]:
+    target = resolve(index)
+    response = client.client.search(
+        index=target.index,
+        routing=target.routing,
+        body={
+            "size": min(size, 10000),
+            "_source": ["embedding"],
+            "query": {
+                "function_score": {
+                    "query": scope_query(target, {"match_all": {}}),
+                    "random_score": {"seed": seed, "field": "_seq_no"},
+                }
+            },
+        },
+    )
+    return [
+        {"_id": hit["_id"], "embedding": hit["_source"]["embedding"]}
+        for hit in response["hits"]["hits"]
+        if hit["_source"].get("embedding")
+    ]
+
+def load(client: OpenSearchClient, index: str, body: str, documents: list[dict], force_merge: bool) -> float:
+    """
+    Create the scratch index and index the sampled vectors. Returns the indexing time in seconds.
+    """
+    if client.client.indices.exists(index=index):
+        client.client.indices.delete(index=index)
+    client.client.indices.create(index=index, body=body)
+    started = time.perf_counter()
+    bulk(client.client, ({"_index": index, "_id": doc["_id"], "embedding": doc["embedding"]} for doc in documents))
+    client.client.indices.refresh(index=index)
+    if force_merge:
+        client.client.indices.forcemerge(index=index, max_num_segments=1)
+    return time.perf_counter() - started
+
+def exact_neighbours(client: OpenSearchClient, index: str, vectors: list[list[float]], k: int, space_type: str) -> list[list[str]]:
+    neighbours = []
+    for vector in vectors:
+        response = client.client.search(index=index, body={
+            "size": k,
+            "_source": False,
+            "query": {
+                "script_score": {
+                    "query": {"match_all": {}},
+                    "script": {
+                        "lang": "knn",
+                        "source": "knn_score",
+                        "params": {"field": "embedding", "query_value": vector, "space_type": space_type},
+                    },
+                }
+            },
+        })
+        neighbours.append([hit["_id"] for hit in response["hits"]["hits"]])
+    return neighbours
+
+def graph_memory_kb(client: OpenSearchClient, index: str) -> float | None:
+    """
+    Native memory of the index's graphs summed over the nodes, None if the k-NN stats are unavailable.
+    """
+    response = client._perform_request("GET", "/_plugins/_knn/stats", body={}, verbose=False, operation="knn_stats")
+    if not response:
+        return None
+    return sum(
+        cache.get(index, {}).get("graph_memory_usage", 0)
+        for cache in (node.get("indices_in_cache", {}) for node in response.get("nodes", {}).values())
+    )
+
+def evaluate(client: OpenSearchClient, index: str, vectors: list[list[float]], truth: list[list[str]], k: int) -> dict:
+    # loads the native graphs, otherwise the first queries pay for it; lucene indices have nothing to warm
+    client._perform_request("GET", f"/_plugins/_knn/warmup/{index}", body={}, verbose=False, operation="knn_warmup")
+    recalls, latencies, took = [], [], []
+    for vector, expected in zip(vectors, truth):
+        started = time.perf_counter()
+        response = client.client.search(index=index, body={
+            "size": k,
+            "_source": False,
+            "query": {"knn": {"embedding": {"vector": vector, "k": k}}},
+        })
+        latencies.append(time.perf_counter() - started)
+        took.append(response.get("took", 0))
+        found = {hit["_id"] for hit in response["hits"]["hits"]}
+        recalls.append(len(found & set(expected)) / max(1, len(expected)))
+
+    latencies.sort()
+    took.sort()
+    store = client.client.indices.stats(index=index, metric="store")
+    return {
+        "recall": round(sum(recalls) / len(recalls), 4),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "took_p50_ms": percentile(took, 0.50),
+        "store_bytes": store["indices"][index]["total"]["store"]["size_in_bytes"],
+        "graph_memory_kb": graph_memory_kb(client, index),
+    }
+
+def main() -> None:
+    args = parse_args()
+    client = OpenSearchClient()
+    profiles = load_profiles()
+    names = args.profiles.split(",")
+    unknown = [name for name in names if name not in profiles]
+    if unknown:
+        sys.exit(f"Unknown profile(s) {unknown}, expected some of {list(profiles)}")
+
+    documents = sample_documents(client, args.index, args.sample + args.queries, args.seed)
+    if len(documents) <= args.queries:
+        sys.exit(f"Only {len(documents)} documents with embeddings in {args.index}, need more than --queries")
+    queries, documents = documents[:args.queries], documents[args.queries:]
+    vectors = [query["embedding"] for query in queries]
+    print(f"Sampled {len(documents)} documents and {len(queries)} queries from {args.index}", file=sys.stderr)
+
+    prefix = f"profile-eval-{resolve(args.index).index}"
+    exact_index = f"{prefix}-exact"
+    exact_body = json.dumps({
+        "settings": {"index.knn": False},
+        "mappings": {"properties": {"embedding": {"type": "knn_vector", "dimension": settings.EMBEDDING_DIMENSION}}},
+    })
+    scratch = [exact_index]
+    results = []
+    try:
+        load(client, exact_index, exact_body, documents, force_merge=False)
+        truth = exact_neighbours(client, exact_index, vectors, args.k, args.space_type)
+
+        for name in names:
+            index = f"{prefix}-{name}"
+            scratch.append(index)
+            indexing_seconds = load(client, index, default_index_body(profile=name, pipeline=None), documents, args.force_merge)
+            result = {"profile": name, "indexing_seconds": round(indexing_seconds, 2)}
+            result |= evaluate(client, index, vectors, truth, args.k)
+            results.append(result)
+            print(f"{name}: recall@{args.k} {result['recall']}, p95 {result['p95_ms']} ms", file=sys.stderr)
+    finally:
+        if not args.keep:
+            for index in scratch:
+                client.client.indices.delete(index=index, ignore_unavailable=True)
+
+    print(f"{'profile':<16} {'recall':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'took ms':>8} {'store MB':>9} {'graph MB':>9} {'index s':>8}")
+    for result in results:
+        graph = result["graph_memory_kb"]
+        print(f"{result['profile']:<16} {result['recall']:>7} {result['p50_ms']:>8} {result['p95_ms']:>8} {result['p99_ms']:>8} "
+              f"{result['took_p50_ms']:>8} {result['store_bytes'] / 2**20:>9.1f} {'-' if graph is None else f'{graph / 1024:.1f}':>9} "
+              f"{result['indexing_seconds']:>8}")
+
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    path = output_dir / f"{datetime.now():%Y%m%d-%H%M%S}-{args.label}.json"
+    config = {name: value for name, value in vars(args).items() if name != "output_dir"}
+    path.write_text(json.dumps({"config": config, "documents": len(documents), "results": results}, indent=2))
+    print(f"Results written to {path}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,510 @@
+"""
+Minimal in-memory OpenSearch stand-in for local benchmarks.
+
+Implements just enough of the REST API for the service: bulk, search (neural / knn / composite
+aggregations), msearch, mget, count, delete_by_query, documents, index settings, mappings, stats,
+open / close, the kNN graph cache and the ML Commons endpoints used by the bootstrap. Query vectors are derived from a hash of the text, so results are
+deterministic but not semantically meaningful. Latency, 429 rejections and embedding cost can be
+simulated to see how the service reacts to a slow or overloaded cluster.
+
+    python benchmarks/fake_opensearch.py --port 9200 --latency 0.005 --reject-rate 0.05
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+DIMENSION = 384
+
+class FakeCluster:
+    """
+    In-memory state shared by all request handlers.
+    """
+    def __init__(self, latency: float = 0.0, reject_rate: float = 0.0, embed_latency: float = 0.0) -> None:
+        self.latency = latency
+        self.reject_rate = reject_rate
+        self.embed_latency = embed_latency
+        self.indices: dict[str, dict] = {}
+        self.tasks: dict[str, dict] = {}
+        self.model_group_id = "fake-model-group"
+        self.model_id = "fake-model"
+        self.requests = 0
+        # refresh / force merge / flush calls as (action, index, params)
+        self.maintenance: list[tuple] = []
+        # texts run through the ingest pipeline's embedding model
+        self.embedded = 0
+        # ML state: the model starts deployed unless a test resets it
+        self.model_state = "DEPLOYED"
+        self.deploy_seconds = 0.0
+        self.deploy_started = None
+        self.deploy_calls = 0
+        self.register_calls = 0
+        self.cluster_settings: dict = {}
+        self.pipelines: dict = {}
+
+    def index(self, name: str) -> dict:
+        return self.indices.setdefault(name, {"docs": {}, "settings": {}, "mappings": {}, "closed": False, "searches": 0, "indexed": 0, "graphs_loaded": False})
+
+    def graph_memory_kb(self, name: str) -> float:
+        # float32 vectors plus about as much again for the HNSW links
+        state = self.indices[name]
+        return len(state["docs"]) * DIMENSION * 8 / 1024 if state["graphs_loaded"] else 0
+
+def embed(text: str) -> list[float]:
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    rng = random.Random(digest)
+    return [rng.uniform(-1, 1) for _ in range(DIMENSION)]
+
+def similarity(a: list[float], b: list[float]) -> float:
+    return sum(x * y for x, y in zip(a, b))
+
+class Handler(BaseHTTPRequestHandler):
+    cluster: FakeCluster = None
+    protocol_version = "HTTP/1.1"
+    # headers and body are written separately, without this every response waits for a delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        if self.headers.get("Content-Encoding") == "gzip":
+            raw = gzip.decompress(raw)
+        return raw
+
+    def _send(self, status: int, payload=None, head: bool = False):
+        body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        self._dispatch("HEAD")
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def _dispatch(self, method: str):
+        cluster = self.cluster
+        cluster.requests += 1
+        url = urlparse(self.path)
+        path = unquote(url.path).rstrip("/") or "/"
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        raw = self._body()
+        if cluster.latency:
+            time.sleep(cluster.latency)
+        try:
+            status, payload = self._route(method, path, params, raw)
+        except KeyError as e:
+            status, payload = 404, {"error": {"type": "index_not_found_exception", "reason": str(e)}, "status": 404}
+        self._send(status, payload, head=method == "HEAD")
+
+    def _json(self, raw: bytes):
+        return json.loads(raw) if raw.strip() else {}
+
+    def _route(self, method, path, params, raw):
+        c = self.cluster
+        if path == "/":
+            return 200, {"cluster_name": "fake", "version": {"number": "2.17.0", "distribution": "opensearch"}}
+        if path == "/_cluster/settings":
+            if method == "PUT":
+                c.cluster_settings.update(self._json(raw).get("persistent", {}))
+                return 200, {"acknowledged": True}
+            return 200, {"persistent": dict(c.cluster_settings), "transient": {}}
+        if path.startswith("/_ingest/pipeline"):
+            name = path[len("/_ingest/pipeline/"):]
+            if method == "PUT":
+                c.pipelines[name] = self._json(raw)
+                return 200, {"acknowledged": True}
+            if name:
+                return (200, {name: c.pipelines[name]}) if name in c.pipelines else (404, {})
+            return 200, c.pipelines
+        if path == "/_cluster/health" or path.startswith("/_cluster/health/"):
+            return 200, {"status": "green", "timed_out": False}
+        if path == "/_nodes/_all/http" or path == "/_nodes/http":
+            return 200, {"nodes": {}}
+        if path.startswith("/_plugins/_ml"):
+            return self._ml(method, path, params, raw)
+        if path == "/_bulk" or re.fullmatch(r"/[^/_][^/]*/_bulk", path):
+            return self._bulk(raw)
+        if path == "/_msearch" or re.fullmatch(r"/[^/_][^/]*/_msearch", path):
+            lines = [json.loads(line) for line in raw.decode("utf-8").splitlines() if line.strip()]
+            responses = []
+            for header, body in zip(lines[::2], lines[1::2]):
+                index = header.get("index")
+                if index not in c.indices:
+                    responses.append({"error": {"type": "index_not_found_exception"}, "status": 404})
+                elif c.indices[index]["closed"]:
+                    responses.append({"error": {"type": "index_closed_exception"}, "status": 400})
+                else:
+                    responses.append(self._search(index, body, {}) | {"status": 200})
+            return 200, {"took": 1, "responses": responses}
+        if path == "/_mget" or re.fullmatch(r"/[^/_][^/]*/_mget", path):
+            body = self._json(raw)
+            docs = []
+            for doc in body.get("docs", []):
+                index = doc.get("_index") or path.split("/")[1]
+                source = c.indices.get(index, {"docs": {}})["docs"].get(doc["_id"])
+                docs.append({"_index": index, "_id": doc["_id"], "found": source is not None} | ({"_source": source} if source is not None else {}))
+            return 200, {"docs": docs}
+        if path.startswith("/_tasks/"):
+            task = c.tasks.get(path.split("/")[2])
+            if not task:
+                return 404, {"error": {"type": "resource_not_found_exception"}}
+            return 200, task
+        if path.startswith("/_cluster/state/metadata/"):
+            index = path.split("/")[4]
+            if index not in c.indices:
+                return 404, {"error": {"type": "index_not_found_exception"}, "status": 404}
+            state = c.indices[index]
+            metadata = {"state": "close" if state["closed"] else "open", "mappings": {"_doc": state["mappings"]}}
+            return 200, {"metadata": {"indices": {index: metadata}}}
+        if path.startswith("/_stats"):
+            # per-shard counters live in memory, closed indices have none
+            return 200, {"indices": {
+                name: {"total": {"search": {"query_total": state["searches"]}, "indexing": {"index_total": state["indexed"]}}}
+                for name, state in c.indices.items() if not state["closed"]
+            }}
+        if path == "/_all/_settings" or path.startswith("/_all/_settings/"):
+            return 200, {
+                name: {"settings": {key if key.startswith("index.") else f"index.{key}": value for key, value in state["settings"].items()}}
+                for name, state in c.indices.items()
+            }
+        if path == "/_all/_mapping":
+            return 200, {name: {"mappings": state["mappings"]} for name, state in c.indices.items()}
+        if path.startswith("/_plugins/_knn/stats"):
+            loaded = {name: {"graph_memory_usage": c.graph_memory_kb(name)} for name, state in c.indices.items() if state["graphs_loaded"]}
+            return 200, {"nodes": {"fake-node": {"indices_in_cache": loaded}}}
+        if path.startswith("/_plugins/_knn/clear_cache/"):
+            c.indices[path.split("/")[-1]]["graphs_loaded"] = False
+            return 200, {"_shards": {"total": 1, "successful": 1, "failed": 0}}
+        if path.startswith("/_plugins/_knn/warmup/"):
+            state = c.indices[path.split("/")[-1]]
+            if state["closed"]:
+                return 400, {"error": {"type": "index_closed_exception"}, "status": 400}
+            state["graphs_loaded"] = True
+            return 200, {"_shards": {"total": 1, "successful": 1, "failed": 0}}
+        if path == "/_cat/indices":
+            return 200, "\n".join(f"green open {name}" for name in c.indices)
+
+        parts = path.strip("/").split("/")
+        index = parts[0]
+        if len(parts) == 1:
+            if method == "HEAD":
+                return (200 if index in c.indices else 404), None
+            if method == "PUT":
+                if index in c.indices:
+                    return 400, {"error": {"type": "resource_already_exists_exception"}, "status": 400}
+                body = self._json(raw)
+                state = c.index(index)
+                state["settings"] = {"index.number_of_replicas": "1"} | body.get("settings", {})
+                state["mappings"] = body.get("mappings", {})
+                return 200, {"acknowledged": True, "index": index}
+            if method == "DELETE":
+                c.indices.pop(index)
+                return 200, {"acknowledged": True}
+            state = c.indices[index]
+            return 200, {index: {"settings": {"index": state["settings"]}, "mappings": state["mappings"]}}
+        action = parts[1]
+        if action in ("_doc", "_create") and len(parts) == 3:
+            return self._doc(method, c.index(index) if method != "GET" else c.indices[index], action, parts[2], params, raw)
+        state = c.indices[index]
+        if state["closed"] and action not in ("_open", "_close", "_settings", "_stats"):
+            return 400, {"error": {"type": "index_closed_exception", "reason": f"closed: {index}"}, "status": 400}
+        if action == "_mapping":
+            if method == "PUT":
+                body = self._json(raw)
+                if "_meta" in body:
+                    state["mappings"]["_meta"] = body["_meta"]
+                state["mappings"].setdefault("properties", {}).update(body.get("properties", {}))
+                return 200, {"acknowledged": True}
+            return 200, {index: {"mappings": state["mappings"]}}
+        if action == "_search":
+            return 200, self._search(index, self._json(raw), params)
+        if action == "_count":
+            query = self._json(raw).get("query", {})
+            return 200, {"count": sum(self._matches(doc, query) for doc in state["docs"].values())}
+        if action == "_delete_by_query":
+            query = self._json(raw).get("query", {})
+            # list() snapshots the documents, handlers run concurrently with bulk requests
+            matches = [doc_id for doc_id, doc in list(state["docs"].items()) if self._matches(doc, query)]
+            for doc_id in matches:
+                state["docs"].pop(doc_id, None)
+            result = {"took": 1, "deleted": len(matches), "total": len(matches), "failures": []}
+            if params.get("wait_for_completion") == "false":
+                task_id = f"fake-node:{len(c.tasks) + 1}"
+                c.tasks[task_id] = {"completed": True, "task": {"status": {"total": len(matches), "deleted": len(matches)}}, "response": result}
+                return 200, {"task": task_id}
+            return 200, result
+        if action == "_settings":
+            if method == "PUT":
+                body = self._json(raw)
+                for name, value in body.get("index", body).items():
+                    name = name if name.startswith("index.") else f"index.{name}"
+                    if value is None:
+                        state["settings"].pop(name, None)
+                    else:
+                        state["settings"][name] = value
+                return 200, {"acknowledged": True}
+            flat = {name if name.startswith("index.") else f"index.{name}": value for name, value in state["settings"].items()}
+            if len(parts) > 2:
+                flat = {name: value for name, value in flat.items() if name in parts[2].split(",")}
+            if params.get("flat_settings") == "true":
+                return 200, {index: {"settings": flat}}
+            return 200, {index: {"settings": {"index": {name[len("index."):]: value for name, value in flat.items()}}}}
+        if action in ("_refresh", "_forcemerge", "_flush"):
+            c.maintenance.append((action, index, params))
+            return 200, {"_shards": {"total": 1, "successful": 1, "failed": 0}}
+        if action == "_open":
+            state["closed"] = False
+            # reopened shards start with fresh counters
+            state["searches"] = state["indexed"] = 0
+            return 200, {"acknowledged": True}
+        if action == "_close":
+            state["closed"] = True
+            state["graphs_loaded"] = False
+            return 200, {"acknowledged": True}
+        if action == "_stats":
+            if state["closed"]:
+                return 400, {"error": {"type": "index_closed_exception"}, "status": 400}
+            return 200, {"indices": {index: {"total": {"docs": {"count": len(state["docs"])}, "store": {"size_in_bytes": 1024 * len(state["docs"])}, "segments": {"count": 1, "memory_in_bytes": 64 * len(state["docs"])}}}}}
+        return 400, {"error": {"type": "illegal_argument_exception", "reason": f"unsupported {method} {path}"}}
+
+    def _doc(self, method, state, action, doc_id, params, raw):
+        versions = state.setdefault("versions", {})
+        current = state["docs"].get(doc_id)
+        if "if_seq_no" in params and (current is None or int(params["if_seq_no"]) != versions.get(doc_id)):
+            return 409, {"error": {"type": "version_conflict_engine_exception"}, "status": 409}
+        if method == "GET":
+            if current is None:
+                return 404, {"_id": doc_id, "found": False}
+            return 200, {"_id": doc_id, "found": True, "_seq_no": versions[doc_id], "_primary_term": 1, "_source": current}
+        if method == "DELETE":
+            if current is None:
+                return 404, {"result": "not_found"}
+            del state["docs"][doc_id]
+            return 200, {"result": "deleted"}
+        if current is not None and (action == "_create" or params.get("op_type") == "create"):
+            return 409, {"error": {"type": "version_conflict_engine_exception"}, "status": 409}
+        state["docs"][doc_id] = self._json(raw)
+        versions[doc_id] = versions.get(doc_id, -1) + 1
+        return 201, {"_id": doc_id, "result": "created", "_seq_no": versions[doc_id], "_primary_term": 1}
+
+    def _model_state(self):
+        c = self.cluster
+        if c.model_state == "DEPLOYING" and time.time() - c.deploy_started >= c.deploy_seconds:
+            c.model_state = "DEPLOYED"
+        return c.model_state
+
+    def _ml(self, method, path, params, raw):
+        c = self.cluster
+        if path.endswith("/model_groups/_search"):
+            return 200, {"hits": {"hits": [{"_id": c.model_group_id, "_source": {"name": "Model group"}}]}}
+        if path.endswith("/model_groups/_register"):
+            return 200, {"model_group_id": c.model_group_id}
+        if path.endswith("/models/_search"):
+            if c.model_state is None:
+                return 200, {"hits": {"hits": []}}
+            return 200, {"hits": {"hits": [{"_id": c.model_id, "_source": {"model_state": self._model_state()}}]}}
+        if path.endswith("/models/_register"):
+            c.register_calls += 1
+            c.model_state = "REGISTERED"
+            return 200, {"task_id": "fake-task", "status": "CREATED"}
+        if path.endswith("/_deploy"):
+            c.deploy_calls += 1
+            c.model_state, c.deploy_started = "DEPLOYING", time.time()
+            return 200, {"task_id": "fake-task", "status": "CREATED"}
+        if "/tasks/" in path:
+            return 200, {"state": "COMPLETED", "model_id": c.model_id}
+        if "/_predict/" in path:
+            body = self._json(raw)
+            if c.embed_latency:
+                time.sleep(c.embed_latency)
+            return 200, {"inference_results": [
+                {"output": [{"name": "sentence_embedding", "data_type": "FLOAT32", "shape": [DIMENSION], "data": embed(text)}]}
+                for text in body.get("text_docs", [])
+            ]}
+        if re.search(r"/models/[^/]+$", path):
+            state = self._model_state()
+            return 200, {"model_state": state, "planning_worker_node_count": 1, "current_worker_node_count": 1 if state == "DEPLOYED" else 0, "planning_worker_nodes": ["fake-node"]}
+        return 400, {"error": {"type": "illegal_argument_exception", "reason": f"unsupported {method} {path}"}}
+
+    def _bulk(self, raw):
+        c = self.cluster
+        lines = [line for line in raw.decode("utf-8").splitlines() if line.strip()]
+        items = []
+        position = 0
+        embed_needed = 0
+        while position < len(lines):
+            action = json.loads(lines[position])
+            op_type, meta = next(iter(action.items()))
+            position += 1
+            source = None
+            if op_type != "delete":
+                source = json.loads(lines[position])
+                position += 1
+            if c.reject_rate and random.random() < c.reject_rate:
+                items.append({op_type: {"_index": meta.get("_index"), "_id": meta.get("_id"), "status": 429,
+                                        "error": {"type": "es_rejected_execution_exception", "reason": "rejected"}}})
+                continue
+            state = c.index(meta["_index"])
+            if state["closed"]:
+                items.append({op_type: {"_index": meta["_index"], "_id": meta.get("_id"), "status": 400,
+                                        "error": {"type": "index_closed_exception", "reason": "closed"}}})
+                continue
+            state["indexed"] += 1
+            if op_type == "delete":
+                state["docs"].pop(meta["_id"], None)
+            elif op_type == "update":
+                state["docs"].setdefault(meta["_id"], {}).update(source.get("doc", {}))
+            else:
+                if "text" in source:
+                    source["embedding"] = embed(source["text"])
+                    embed_needed += 1
+                state["docs"][meta["_id"]] = source
+            items.append({op_type: {"_index": meta["_index"], "_id": meta.get("_id"), "status": 201, "result": "created"}})
+        c.embedded += embed_needed
+        if c.embed_latency:
+            time.sleep(c.embed_latency * embed_needed)
+        return 200, {"took": 1, "errors": any(i[next(iter(i))]["status"] >= 300 for i in items), "items": items}
+
+    def _matches(self, doc: dict, query: dict) -> bool:
+        if not query or "match_all" in query:
+            return True
+        if "term" in query:
+            field, value = next(iter(query["term"].items()))
+            value = value.get("value") if isinstance(value, dict) else value
+            return doc.get(field) == value
+        if "terms" in query:
+            field, values = next(iter(query["terms"].items()))
+            return doc.get(field) in values
+        if "bool" in query:
+            clauses = query["bool"].get("filter", []) + query["bool"].get("must", [])
+            clauses = clauses if isinstance(clauses, list) else [clauses]
+            return all(self._matches(doc, clause) for clause in clauses)
+        return True
+
+    def _search(self, index: str, body: dict, params: dict) -> dict:
+        c = self.cluster
+        docs = c.indices[index]["docs"]
+        c.indices[index]["searches"] += 1
+        query = body.get("query", {"match_all": {}})
+        size = int(body.get("size", params.get("size", 10)))
+        vector, flt = None, None
+        if "neural" in query:
+            spec = next(iter(query["neural"].values()))
+            if c.embed_latency:
+                time.sleep(c.embed_latency)
+            vector, flt = embed(spec["query_text"]), spec.get("filter")
+        elif "knn" in query:
+            spec = next(iter(query["knn"].values()))
+            vector, flt = spec["vector"], spec.get("filter")
+        elif "script_score" in query:
+            # exact scoring with the knn_score script
+            vector, flt = query["script_score"]["script"]["params"]["query_value"], query["script_score"].get("query")
+        candidates = [(doc_id, doc) for doc_id, doc in list(docs.items()) if self._matches(doc, flt or (query if vector is None else {}))]
+        if vector is not None:
+            # the first vector search loads the graphs into native memory
+            c.indices[index]["graphs_loaded"] = True
+            scored = sorted(((similarity(vector, doc.get("embedding", [0] * DIMENSION)), doc_id, doc) for doc_id, doc in candidates), reverse=True)
+        else:
+            scored = [(1.0, doc_id, doc) for doc_id, doc in candidates]
+        hits = []
+        includes = body.get("_source", True)
+        excludes = set(params.get("_source_excludes", "embedding").split(",")) | {"embedding"}
+        if isinstance(includes, dict):
+            excludes |= set(includes.get("excludes", []))
+            includes = includes.get("includes", True)
+        if "_source_includes" in params:
+            includes = params["_source_includes"].split(",")
+        for score, doc_id, doc in scored[:size]:
+            hit = {"_index": index, "_id": doc_id, "_score": score}
+            if includes is True:
+                hit["_source"] = {k: v for k, v in doc.items() if k not in excludes}
+            elif includes:
+                hit["_source"] = {k: v for k, v in doc.items() if k in includes and k not in excludes}
+            if "highlight" in body:
+                hit["highlight"] = {"text": [self._highlight(doc.get("text", ""), body["highlight"])]}
+            hits.append(hit)
+        response = {"took": 1, "timed_out": False, "hits": {"total": {"value": len(candidates), "relation": "eq"}, "hits": hits}}
+        if "aggs" in body or "aggregations" in body:
+            response["aggregations"] = self._aggregations(body.get("aggs") or body.get("aggregations"), [doc for _, doc in candidates])
+        return response
+
+    @staticmethod
+    def _highlight(text: str, highlight: dict) -> str:
+        terms = set(highlight.get("highlight_query", {}).get("match", {}).get("text", "").lower().split())
+        size = highlight["fields"]["text"].get("fragment_size", 100)
+        return " ".join(f"<em>{word}</em>" if word.lower() in terms else word for word in text.split())[:size]
+
+    def _aggregations(self, aggs: dict, docs: list[dict]) -> dict:
+        result = {}
+        for name, spec in aggs.items():
+            if "composite" in spec:
+                composite = spec["composite"]
+                field = next(iter(composite["sources"][0].values()))["terms"]["field"]
+                after = (composite.get("after") or {}).get(next(iter(composite["sources"][0])))
+                groups: dict = {}
+                for doc in docs:
+                    groups.setdefault(doc.get(field), []).append(doc)
+                keys = sorted(key for key in groups if key is not None and (after is None or key > after))
+                page = keys[:composite.get("size", 10)]
+                source_name = next(iter(composite["sources"][0]))
+                buckets = []
+                for key in page:
+                    bucket = {"key": {source_name: key}, "doc_count": len(groups[key])}
+                    bucket.update(self._aggregations(spec.get("aggs", {}), groups[key]))
+                    buckets.append(bucket)
+                result[name] = {"buckets": buckets}
+                if len(page) == composite.get("size", 10):
+                    result[name]["after_key"] = {source_name: page[-1]}
+            elif "min" in spec or "max" in spec:
+                op = "min" if "min" in spec else "max"
+                values = [doc.get(spec[op]["field"]) for doc in docs if doc.get(spec[op]["field"]) is not None]
+                result[name] = {"value": (min if op == "min" else max)(values) if values else None}
+            elif "cardinality" in spec:
+                result[name] = {"value": len({doc.get(spec["cardinality"]["field"]) for doc in docs})}
+        return result
+
+def serve(host: str = "127.0.0.1", port: int = 0, **cluster_options) -> tuple[ThreadingHTTPServer, FakeCluster]:
+    """
+    Start the fake server on a background thread. Returns the server and its cluster state.
+    """
+    cluster = FakeCluster(**cluster_options)
+    handler = type("FakeHandler", (Handler,), {"cluster": cluster})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, cluster
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9200)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--reject-rate", type=float, default=0.0, help="fraction of bulk items rejected with 429")
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="seconds per embedded text")
+    args = parser.parse_args()
+    server, _ = serve(args.host, args.port, latency=args.latency, reject_rate=args.reject_rate, embed_latency=args.embed_latency)
+    print(f"Fake OpenSearch listening on http://{args.host}:{server.server_port}")
+    threading.Event().wait()
@@ -0,0 +1,231 @@
+"""
+Offline benchmarks for the db-service API.
+
+Drives the Flask app from `app.create_app()` with its `OpenSearchClient` against the in-memory
+fake in `fake_opensearch.py` (or a real cluster with --opensearch) and reports throughput and
+p50/p95/p99 latencies for upload, search, delete and document listing at several payload sizes
+and concurrency levels. Every run is stored as JSON under --output-dir so runs can be compared.
+
+    python benchmarks/run_benchmarks.py --sizes 10,100 --concurrency 1,8 --label baseline
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/<run>.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+SRC_DIR = BENCHMARKS_DIR.parent / "src"
+SCENARIOS = ("upload", "search", "delete", "list")
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated subset of " + ", ".join(SCENARIOS))
+    parser.add_argument("--sizes", default="10,100,1000", help="chunks per uploaded document")
+    parser.add_argument("--concurrency", default="1,4,16", help="concurrent clients")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario, size and concurrency")
+    parser.add_argument("--latency", type=float, default=0.002, help="fake OpenSearch latency per request, in seconds")
+    parser.add_argument("--reject-rate", type=float, default=0.0, help="share of bulk items the fake rejects with 429")
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="fake inference cost per embedded text, in seconds")
+    parser.add_argument("--search-params", type=json.loads, default={},
+                        help='extra JSON parameters of the search requests, e.g. \'{"format": "compact", "highlight": true}\'')
+    parser.add_argument("--admission", action="store_true",
+                        help="keep admission control on, the scenarios would mostly measure its rate limits")
+    parser.add_argument("--opensearch", help="host:port of a real cluster instead of the fake, e.g. localhost:9200")
+    parser.add_argument("--label", default="run", help="name stored with the results")
+    parser.add_argument("--output-dir", default=str(BENCHMARKS_DIR / "results"))
+    parser.add_argument("--compare", help="results file to compare this run against")
+    parser.add_argument("--no-save", action="store_true", help="do not write the results file")
+    return parser.parse_args()
+
+def configure_environment(args: argparse.Namespace):
+    """
+    Point the service at the benchmark cluster. Must run before anything from src is imported,
+    settings are read from the environment at import time.
+    """
+    cluster = None
+    if args.opensearch:
+        os.environ["OPENSEARCH_HOSTS"] = args.opensearch
+    else:
+        from fake_opensearch import serve
+        server, cluster = serve(latency=args.latency, reject_rate=args.reject_rate, embed_latency=args.embed_latency)
+        os.environ["OPENSEARCH_HOSTS"] = f"127.0.0.1:{server.server_port}"
+        os.environ["OPENSEARCH_USE_SSL"] = "false"
+    os.environ.setdefault("OPENSEARCH_INITIAL_ADMIN_PASSWORD", "admin")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    if not args.admission:
+        os.environ["ADMISSION_ENABLED"] = "false"
+    sys.path.insert(0, str(SRC_DIR))
+    return cluster
+
+def percentile(ordered: list[float], fraction: float) -> float:
+    if not ordered:
+        return 0.0
+    position = min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))
+    return ordered[position]
+
+class Runner:
+    """
+    Runs one scenario at a time, every worker thread has its own Flask test client.
+    """
+    def __init__(self, app) -> None:
+        self.app = app
+        self.local = threading.local()
+
+    @property
+    def http(self):
+        if not hasattr(self.local, "client"):
+            self.local.client = self.app.test_client()
+        return self.local.client
+
+    def timed(self, call) -> tuple[float, bool, int]:
+        started = time.perf_counter()
+        response = call(self.http)
+        return time.perf_counter() - started, response.status_code < 400, len(response.get_data())
+
+    def measure(self, calls: list, concurrency: int) -> dict:
+        started = time.perf_counter()
+        cpu_started = time.process_time()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = list(pool.map(self.timed, calls))
+        elapsed = time.perf_counter() - started
+        # process CPU time, includes the fake cluster when it runs in-process
+        cpu = time.process_time() - cpu_started
+        latencies = sorted(latency for latency, _, _ in outcomes)
+        return {
+            "requests": len(outcomes),
+            "errors": sum(1 for _, ok, _ in outcomes if not ok),
+            "seconds": round(elapsed, 3),
+            "throughput_rps": round(len(outcomes) / elapsed, 1),
+            "cpu_ms_per_request": round(cpu * 1000 / max(1, len(outcomes)), 3),
+            "response_bytes": round(sum(size for _, _, size in outcomes) / max(1, len(outcomes))),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        }
+
+def chunks(filename: str, size: int) -> list[dict]:
+    return [
+        {
+            "id": f"{filename}-{page}",
+            "text": f"Page {page} of {filename}: benchmark text about invoices, contracts and reports number {page}.",
+            "filename": filename,
+            "page_number": page,
+        }
+        for page in range(size)
+    ]
+
+def upload(user: str, filename: str, size: int):
+    content = chunks(filename, size)
+    return lambda http: http.post("/db-service/upload", json={"id": user, "content": content})
+
+def preload(runner: Runner, user: str, files: int, size: int) -> None:
+    """
+    Create the user's index with a single upload first, concurrent first uploads would all try
+    to create it, then upload the remaining files in parallel.
+    """
+    runner.timed(upload(user, "file-0.pdf", size))
+    runner.measure([upload(user, f"file-{n}.pdf", size) for n in range(1, files)], concurrency=8)
+
+def scenario_upload(runner: Runner, size: int, concurrency: int, requests: int, params: dict) -> dict:
+    user = f"bench-{uuid.uuid4().hex[:8]}"
+    preload(runner, user, 1, 1)
+    result = runner.measure([upload(user, f"file-{n}.pdf", size) for n in range(requests)], concurrency)
+    result["docs_per_second"] = round(result["throughput_rps"] * size, 1)
+    return result
+
+def scenario_search(runner: Runner, size: int, concurrency: int, requests: int, params: dict) -> dict:
+    user = f"bench-{uuid.uuid4().hex[:8]}"
+    preload(runner, user, 10, size)
+    # distinct queries, repeated ones would only measure the search cache
+    calls = [
+        (lambda query: lambda http: http.get("/db-service/search", json={"id": user, "query": query} | params))(f"benchmark query {n}")
+        for n in range(requests)
+    ]
+    return runner.measure(calls, concurrency)
+
+def scenario_delete(runner: Runner, size: int, concurrency: int, requests: int, params: dict) -> dict:
+    user = f"bench-{uuid.uuid4().hex[:8]}"
+    preload(runner, user, requests, size)
+    calls = [
+        (lambda filename: lambda http: http.get("/db-service/delete", json={"id": user, "filename": filename}))(f"file-{n}.pdf")
+        for n in range(requests)
+    ]
+    return runner.measure(calls, concurrency)
+
+def scenario_list(runner: Runner, size: int, concurrency: int, requests: int, params: dict) -> dict:
+    user = f"bench-{uuid.uuid4().hex[:8]}"
+    preload(runner, user, 20, size)
+    calls = [lambda http: http.get("/db-service/get-documents", json={"id": user, "details": True})] * requests
+    return runner.measure(calls, concurrency)
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCHMARKS_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def key(result: dict) -> tuple:
+    return result["scenario"], result["size"], result["concurrency"]
+
+def print_results(results: list[dict], baseline: dict | None = None) -> None:
+    previous = {key(result): result for result in (baseline or {}).get("results", [])}
+    header = (f"{'scenario':<8} {'size':>5} {'conc':>4} {'req/s':>9} {'docs/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+              f"{'cpu ms':>7} {'bytes':>8} {'errors':>6}")
+    print(header + ("   p95 vs baseline" if previous else ""))
+    for result in results:
+        line = (f"{result['scenario']:<8} {result['size']:>5} {result['concurrency']:>4} {result['throughput_rps']:>9} "
+                f"{result.get('docs_per_second', ''):>9} {result['p50_ms']:>8} {result['p95_ms']:>8} "
+                f"{result['p99_ms']:>8} {result.get('cpu_ms_per_request', ''):>7} {result.get('response_bytes', ''):>8} "
+                f"{result['errors']:>6}")
+        before = previous.get(key(result))
+        if before and before["p95_ms"]:
+            line += f"   {(result['p95_ms'] - before['p95_ms']) / before['p95_ms']:+.1%}"
+        print(line)
+
+def main() -> None:
+    args = parse_args()
+    cluster = configure_environment(args)
+
+    from app import create_app
+    runner = Runner(create_app())
+    scenarios = {"upload": scenario_upload, "search": scenario_search, "delete": scenario_delete, "list": scenario_list}
+
+    results = []
+    for name in args.scenarios.split(","):
+        for size in (int(size) for size in args.sizes.split(",")):
+            for concurrency in (int(level) for level in args.concurrency.split(",")):
+                result = {"scenario": name, "size": size, "concurrency": concurrency}
+                result |= scenarios[name](runner, size, concurrency, args.requests, args.search_params)
+                results.append(result)
+                print(f"{name} size={size} concurrency={concurrency}: {result['throughput_rps']} req/s, "
+                      f"p95 {result['p95_ms']} ms", file=sys.stderr)
+
+    run = {
+        "label": args.label,
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_revision": git_revision(),
+        "config": {name: value for name, value in vars(args).items() if name not in ("compare", "output_dir", "no_save")},
+        "fake_requests": cluster.requests if cluster else None,
+        "results": results,
+    }
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else None
+    print_results(results, baseline)
+
+    if not args.no_save:
+        output_dir = Path(args.output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        path = output_dir / f"{datetime.now():%Y%m%d-%H%M%S}-{args.label}.json"
+        path.write_text(json.dumps(run, indent=2))
+        print(f"Results written to {path}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+""" Admission control: per-tenant and global concurrency limits and token buckets for searches and ingest """
+import asyncio
+import math
+import threading
+import time
+from collections import Counter
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator
+import settings
+from app import metrics, timing
+from cache import MISSING, TTLCache
+
+SEARCH = "search"
+INGEST = "ingest"
+
+class Rejected(Exception):
+    """
+    The request was shed, the client should retry after `retry_after` seconds.
+    """
+    def __init__(self, kind: str, reason: str, retry_after: float) -> None:
+        super().__init__(f"{kind} request rejected: {reason}")
+        self.kind = kind
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+class TokenBucket:
+    """
+    Token bucket that can go into debt: a reservation larger than the bucket is granted once
+    the bucket is full and later reservations wait until the debt is paid back. A rate of 0
+    disables the bucket.
+    """
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _wait(self, cost: float) -> float:
+        return max(0.0, (min(cost, self.burst) - self._tokens) / self.rate)
+
+    def wait_time(self, cost: float) -> float:
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._wait(cost)
+
+    def reserve(self, cost: float, max_wait: float = math.inf) -> float | None:
+        """
+        Take `cost` tokens. Returns the seconds the caller must wait before using them, or
+        None (and takes nothing) if that would be longer than `max_wait`.
+        """
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            self._refill(time.monotonic())
+            wait = self._wait(cost)
+            if wait > max_wait:
+                return None
+            self._tokens -= cost
+            return wait
+
+    def refund(self, cost: float) -> None:
+        if self.rate > 0:
+            with self._lock:
+                self._tokens = min(self.burst, self._tokens + cost)
+
+class _Slots:
+    """
+    Concurrency bookkeeping shared by the sync and async controllers, callers hold their lock.
+    Ingest never takes a slot a waiting search could use and is capped below the global limit,
+    so searches always have headroom.
+    """
+    def __init__(self, max_total: int, kind_limits: dict[str, int], tenant_limits: dict[str, int], queue_size: int) -> None:
+        self.max_total = max_total
+        self.kind_limits = kind_limits
+        self.tenant_limits = tenant_limits
+        self.queue_size = queue_size
+        self.running: Counter = Counter()
+        self.tenants: Counter = Counter()
+        self.waiting: list[tuple[str, str | None]] = []
+
+    def _tenant_free(self, kind: str, tenant: str | None) -> bool:
+        return tenant is None or self.tenants[(kind, tenant)] < self.tenant_limits[kind]
+
+    def available(self, kind: str, tenant: str | None) -> bool:
+        total = sum(self.running.values())
+        if total >= self.max_total or self.running[kind] >= self.kind_limits[kind] or not self._tenant_free(kind, tenant):
+            return False
+        if kind == INGEST:
+            ready_searches = sum(1 for waiting_kind, waiting_tenant in self.waiting
+                                 if waiting_kind == SEARCH and self._tenant_free(SEARCH, waiting_tenant))
+            return total + ready_searches < self.max_total
+        return True
+
+    def queue_full(self, kind: str) -> bool:
+        return sum(1 for waiting_kind, _ in self.waiting if waiting_kind == kind) >= self.queue_size
+
+    def enqueue(self, entry: tuple[str, str | None]) -> None:
+        self.waiting.append(entry)
+        metrics.ADMISSION_QUEUE_DEPTH.labels(kind=entry[0]).inc()
+
+    def dequeue(self, entry: tuple[str, str | None]) -> None:
+        self.waiting.remove(entry)
+        metrics.ADMISSION_QUEUE_DEPTH.labels(kind=entry[0]).dec()
+
+    def enter(self, kind: str, tenant: str | None) -> None:
+        self.running[kind] += 1
+        self.tenants[(kind, tenant)] += 1
+        metrics.ADMISSION_IN_FLIGHT.labels(kind=kind).inc()
+
+    def leave(self, kind: str, tenant: str | None) -> None:
+        self.running[kind] -= 1
+        self.tenants[(kind, tenant)] -= 1
+        if not self.tenants[(kind, tenant)]:
+            del self.tenants[(kind, tenant)]
+        metrics.ADMISSION_IN_FLIGHT.labels(kind=kind).dec()
+
+class _Controller:
+    def __init__(
+        self,
+        enabled: bool = settings.ADMISSION_ENABLED,
+        max_concurrent: int = settings.ADMISSION_MAX_CONCURRENT,
+        max_ingest: int = settings.ADMISSION_MAX_INGEST,
+        tenant_max_searches: int = settings.ADMISSION_TENANT_MAX_SEARCHES,
+        tenant_max_ingest: int = settings.ADMISSION_TENANT_MAX_INGEST,
+        queue_size: int = settings.ADMISSION_QUEUE_SIZE,
+        queue_timeout: float = settings.ADMISSION_QUEUE_TIMEOUT,
+    ) -> None:
+        self.enabled = enabled
+        self.queue_timeout = queue_timeout
+        self._slots = _Slots(
+            max_concurrent,
+            {SEARCH: max_concurrent, INGEST: min(max_ingest, max_concurrent)},
+            {SEARCH: tenant_max_searches, INGEST: tenant_max_ingest},
+            queue_size,
+        )
+        self._rates = {
+            SEARCH: (settings.ADMISSION_TENANT_SEARCH_RATE, settings.ADMISSION_TENANT_SEARCH_BURST),
+            INGEST: (settings.ADMISSION_TENANT_INGEST_RATE, settings.ADMISSION_TENANT_INGEST_BURST),
+        }
+        self._global_buckets = {
+            SEARCH: TokenBucket(settings.ADMISSION_SEARCH_RATE, settings.ADMISSION_SEARCH_BURST),
+            INGEST: TokenBucket(settings.ADMISSION_INGEST_RATE, settings.ADMISSION_INGEST_BURST),
+        }
+        # idle tenants' buckets are dropped, they would be full again by then
+        self._tenant_buckets = TTLCache(maxsize=settings.ADMISSION_MAX_TENANTS, ttl=settings.ADMISSION_BUCKET_TTL)
+        self._buckets_lock = threading.Lock()
+
+    def _tenant_bucket(self, kind: str, tenant: str) -> TokenBucket:
+        with self._buckets_lock:
+            bucket = self._tenant_buckets.get((kind, tenant))
+            if bucket is MISSING:
+                bucket = TokenBucket(*self._rates[kind])
+            self._tenant_buckets.set((kind, tenant), bucket)
+        return bucket
+
+    def _charges(
+        self, kind: str, tenant: str | None, cost: float, tenants: dict[str, float] | None = None,
+    ) -> list[tuple[TokenBucket, float]]:
+        """
+        (bucket, tokens) a request takes: `cost` from the global bucket and from the bucket of
+        `tenant`, or from the bucket of every tenant in `tenants` its own cost.
+        """
+        charges = [(self._global_buckets[kind], cost)]
+        for name, tenant_cost in (tenants or {tenant: cost}).items():
+            if name is not None:
+                charges.append((self._tenant_bucket(kind, name), tenant_cost))
+        return charges
+
+    def _reserve(self, kind: str, charges: list[tuple[TokenBucket, float]], max_wait: float) -> float:
+        """
+        Take the tokens of every charge. Returns the seconds to wait for them, raises Rejected
+        (and takes nothing) if that is longer than `max_wait`.
+        """
+        reserved, wait = [], 0.0
+        for bucket, cost in charges:
+            bucket_wait = bucket.reserve(cost, max_wait)
+            if bucket_wait is None:
+                self._refund(reserved)
+                metrics.ADMISSION_REJECTED_TOTAL.labels(kind=kind, reason="rate_limited").inc()
+                raise Rejected(kind, "rate limited", bucket.wait_time(cost))
+            reserved.append((bucket, cost))
+            wait = max(wait, bucket_wait)
+        return wait
+
+    @staticmethod
+    def _refund(charges: list[tuple[TokenBucket, float]]) -> None:
+        for bucket, cost in charges:
+            bucket.refund(cost)
+
+    def _queue_full(self, kind: str) -> Rejected:
+        metrics.ADMISSION_REJECTED_TOTAL.labels(kind=kind, reason="queue_full").inc()
+        return Rejected(kind, "queue full", self.queue_timeout)
+
+    def _queue_timeout(self, kind: str) -> Rejected:
+        metrics.ADMISSION_REJECTED_TOTAL.labels(kind=kind, reason="queue_timeout").inc()
+        return Rejected(kind, "timed out waiting for a slot", self.queue_timeout)
+
+class AdmissionController(_Controller):
+    """
+    Admits searches and uploads within global and per-tenant limits. A request first takes
+    tokens from the global and the tenant's bucket, waiting at most ADMISSION_QUEUE_TIMEOUT
+    for them, then a concurrency slot from a bounded wait queue. Requests that cannot be
+    admitted in time raise Rejected, which the app answers with 429 and Retry-After.
+    """
+    def __init__(self, **limits) -> None:
+        super().__init__(**limits)
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def admit(self, kind: str, tenant: str | None, cost: float = 1, tenants: dict[str, float] | None = None) -> Iterator[None]:
+        """
+        Hold a slot for the duration of the block. `tenant` None applies only the global limits.
+        A request on behalf of several tenants passes the tokens each of them is charged in `tenants`.
+        """
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        charges = self._charges(kind, tenant, cost, tenants)
+        wait = self._reserve(kind, charges, self.queue_timeout)
+        if wait:
+            time.sleep(wait)
+        try:
+            self._acquire(kind, tenant, self.queue_timeout - wait)
+        except Rejected:
+            # a shed request does not use its tokens
+            self._refund(charges)
+            raise
+        waited = time.perf_counter() - started
+        metrics.ADMISSION_WAIT_SECONDS.labels(kind=kind).observe(waited)
+        timing.record("admission", waited)
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._slots.leave(kind, tenant)
+                self._condition.notify_all()
+
+    def _acquire(self, kind: str, tenant: str | None, timeout: float) -> None:
+        with self._condition:
+            if self._slots.available(kind, tenant):
+                self._slots.enter(kind, tenant)
+                return
+            if self._slots.queue_full(kind):
+                raise self._queue_full(kind)
+            entry = (kind, tenant)
+            self._slots.enqueue(entry)
+            try:
+                admitted = self._condition.wait_for(lambda: self._slots.available(kind, tenant), timeout)
+            finally:
+                self._slots.dequeue(entry)
+            if not admitted:
+                # a waiting search may have held back ingest
+                self._condition.notify_all()
+                raise self._queue_timeout(kind)
+            self._slots.enter(kind, tenant)
+
+    def check(self, kind: str, tenant: str | None) -> None:
+        """
+        Raise Rejected if the tenant's tokens are owed for longer than the queue timeout.
+        """
+        if self.enabled:
+            self._reserve(kind, self._charges(kind, tenant, 0), self.queue_timeout)
+
+    def pace(self, tenant: str | None, actions: Iterable[dict]) -> Iterator[dict]:
+        """
+        Pass the actions through, waiting for an ingest token for every chunk that will be embedded.
+        """
+        for action in actions:
+            if self.enabled and action.get("_op_type", "index") in ("index", "create"):
+                wait = self._reserve(INGEST, self._charges(INGEST, tenant, 1), math.inf)
+                if wait:
+                    metrics.INGEST_THROTTLE_SECONDS_TOTAL.inc(wait)
+                    timing.record("ingest_throttle", wait)
+                    time.sleep(wait)
+            yield action
+
+class AsyncAdmissionController(_Controller):
+    """
+    asyncio counterpart of AdmissionController. Use from one event loop.
+    """
+    def __init__(self, **limits) -> None:
+        super().__init__(**limits)
+        self._condition = asyncio.Condition()
+
+    @asynccontextmanager
+    async def admit(self, kind: str, tenant: str | None, cost: float = 1, tenants: dict[str, float] | None = None) -> AsyncIterator[None]:
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        charges = self._charges(kind, tenant, cost, tenants)
+        wait = self._reserve(kind, charges, self.queue_timeout)
+        if wait:
+            await asyncio.sleep(wait)
+        try:
+            await self._acquire(kind, tenant, self.queue_timeout - wait)
+        except Rejected:
+            self._refund(charges)
+            raise
+        waited = time.perf_counter() - started
+        metrics.ADMISSION_WAIT_SECONDS.labels(kind=kind).observe(waited)
+        timing.record("admission", waited)
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self._slots.leave(kind, tenant)
+                self._condition.notify_all()
+
+    async def _acquire(self, kind: str, tenant: str | None, timeout: float) -> None:
+        async with self._condition:
+            if self._slots.available(kind, tenant):
+                self._slots.enter(kind, tenant)
+                return
+            if self._slots.queue_full(kind):
+                raise self._queue_full(kind)
+            entry = (kind, tenant)
+            self._slots.enqueue(entry)
+            try:
+                await asyncio.wait_for(self._condition.wait_for(lambda: self._slots.available(kind, tenant)), timeout)
+            except asyncio.TimeoutError:
+                self._condition.notify_all()
+                raise self._queue_timeout(kind)
+            finally:
+                self._slots.dequeue(entry)
+            self._slots.enter(kind, tenant)
+
+    def check(self, kind: str, tenant: str | None) -> None:
+        if self.enabled:
+            self._reserve(kind, self._charges(kind, tenant, 0), self.queue_timeout)
+
+    async def pace(self, tenant: str | None, actions: AsyncIterable[dict]) -> AsyncIterator[dict]:
+        async for action in actions:
+            if self.enabled and action.get("_op_type", "index") in ("index", "create"):
+                wait = self._reserve(INGEST, self._charges(INGEST, tenant, 1), math.inf)
+                if wait:
+                    metrics.INGEST_THROTTLE_SECONDS_TOTAL.inc(wait)
+                    timing.record("ingest_throttle", wait)
+                    await asyncio.sleep(wait)
+            yield action
@@ -2,14 +2,16 @@ from flask import Flask
 from flask_cors import CORS
 from dotenv import load_dotenv
 import time
-from flask import request, Response
+from flask import request, Response, jsonify
 from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
-from app import metrics
+from app import metrics, timing
+from app.json_provider import FastJSONProvider
 
 load_dotenv()
 
 def create_app(config_filename=None):
     app = Flask(__name__)
+    app.json = FastJSONProvider(app)
     cors = CORS(app)
 
     # Load configuration
@@ -17,14 +19,26 @@ def create_app(config_filename=None):
         app.config.from_pyfile(config_filename)
     else:
         app.config.from_object('config.Config')
-    
+
+    # fail at startup on an unknown INDEX_PROFILE, not at the first index creation
+    from index_profiles import get_profile
+    get_profile()
+
     # Import and register the main blueprint
     from app.routes import main as main_blueprint
+    from admission import Rejected
+    from app.handlers import InvalidRequest
     app.register_blueprint(main_blueprint, url_prefix="/db-service")
 
     @app.before_request
     def _start_timer():
         request._start_time = time.perf_counter()
+        timing.start()
+        view = app.view_functions.get(request.endpoint)
+        if request.is_json and not getattr(view, "streams_request_body", False):
+            # parsed once here, the handlers get the cached body
+            with timing.stage("parse"):
+                request.get_json(silent=True)
 
     @app.after_request
     def _record_metrics(response):
@@ -42,11 +56,37 @@ def create_app(config_filename=None):
             endpoint=endpoint,
         ).observe(elapsed)
 
+        if response.content_length is not None:
+            metrics.HTTP_RESPONSE_BYTES.labels(endpoint=endpoint).observe(response.content_length)
+
+        request_timing = timing.current()
+        if request_timing and timing.report(request_timing, response, request.method, request.path, endpoint):
+            metrics.SLOW_REQUESTS_TOTAL.labels(endpoint=endpoint).inc()
+
         return response
 
+    @app.errorhandler(Rejected)
+    def _rejected(error):
+        """Shed by admission control, the client should back off"""
+        return jsonify({'error': str(error)}), 429, {'Retry-After': str(error.retry_after)}
+
+    @app.errorhandler(InvalidRequest)
+    def _invalid_request(error):
+        return jsonify({'error': str(error)}), 400
+
     @app.route("/metrics")
     def prometheus_metrics():
         """Prometheus scrape target"""
         return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
 
+    @app.route("/livez")
+    def liveness():
+        return jsonify({"status": "alive"}), 200
+
+    @app.route("/readyz")
+    def readiness():
+        """Ready once the cluster bootstrap has deployed the model"""
+        from init import bootstrap_state
+        return jsonify(bootstrap_state.to_dict()), 200 if bootstrap_state.ready else 503
+
     return app
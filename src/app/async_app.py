@@ -0,0 +1,95 @@
+""" Quart application for the async serving mode (SERVING_MODE=async) """
+from quart import Quart, request, Response, jsonify
+from quart_cors import cors
+import time
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+from app import metrics, timing
+from app.json_provider import FastJSONProvider
+
+def create_async_app(config_filename=None):
+    app = Quart(__name__)
+    app.json = FastJSONProvider(app)
+    app = cors(app)
+
+    # Load configuration
+    if config_filename:
+        app.config.from_pyfile(config_filename)
+    else:
+        app.config.from_object('config.Config')
+
+    # fail at startup on an unknown INDEX_PROFILE, not at the first index creation
+    from index_profiles import get_profile
+    get_profile()
+
+    # Same routes as the Flask app, as async handlers
+    from app.async_routes import main as main_blueprint, client, ingest_jobs, lifecycle
+    from admission import Rejected
+    from app.handlers import InvalidRequest
+    app.register_blueprint(main_blueprint, url_prefix="/db-service")
+
+    @app.before_request
+    async def _start_timer():
+        request._start_time = time.perf_counter()
+        timing.start()
+        view = app.view_functions.get(request.endpoint)
+        if request.is_json and not getattr(view, "streams_request_body", False):
+            # parsed once here, the handlers get the cached body
+            with timing.stage("parse"):
+                await request.get_json(silent=True)
+
+    @app.after_request
+    async def _record_metrics(response):
+        elapsed = time.perf_counter() - getattr(request, "_start_time", 0)
+        endpoint = request.endpoint or "unknown"
+
+        metrics.HTTP_REQUESTS_TOTAL.labels(
+            method=request.method,
+            endpoint=endpoint,
+            http_status=response.status_code,
+        ).inc()
+
+        metrics.HTTP_REQUEST_LATENCY.labels(
+            method=request.method,
+            endpoint=endpoint,
+        ).observe(elapsed)
+
+        if response.content_length is not None:
+            metrics.HTTP_RESPONSE_BYTES.labels(endpoint=endpoint).observe(response.content_length)
+
+        request_timing = timing.current()
+        if request_timing and timing.report(request_timing, response, request.method, request.path, endpoint):
+            metrics.SLOW_REQUESTS_TOTAL.labels(endpoint=endpoint).inc()
+
+        return response
+
+    @app.after_serving
+    async def _close_client():
+        await ingest_jobs.close()
+        await lifecycle.close()
+        await client.close()
+
+    @app.errorhandler(Rejected)
+    async def _rejected(error):
+        """Shed by admission control, the client should back off"""
+        return jsonify({'error': str(error)}), 429, {'Retry-After': str(error.retry_after)}
+
+    @app.errorhandler(InvalidRequest)
+    async def _invalid_request(error):
+        return jsonify({'error': str(error)}), 400
+
+    @app.route("/metrics")
+    async def prometheus_metrics():
+        """Prometheus scrape target"""
+        return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
+
+    @app.route("/livez")
+    async def liveness():
+        return jsonify({"status": "alive"}), 200
+
+    @app.route("/readyz")
+    async def readiness():
+        """Ready once the cluster bootstrap has deployed the model"""
+        from init import bootstrap_state
+        return jsonify(bootstrap_state.to_dict()), 200 if bootstrap_state.ready else 503
+
+    return app
@@ -0,0 +1,217 @@
+""" Routes of the async serving mode, mirroring app/routes.py on top of AsyncOpenSearchClient """
+from quart import Blueprint, request, jsonify
+import asyncio
+from contextlib import nullcontext
+from functools import partial
+import sys
+if '..' not in sys.path:
+    sys.path.append('..')
+from async_opensearch_client import AsyncOpenSearchClient
+from admission import INGEST, SEARCH, AsyncAdmissionController
+from lifecycle import AsyncIndexLifecycleManager
+from jobs import AsyncIngestJobManager
+from utils import get_logger, aiter_ndjson, log_payload
+from app import handlers
+from app.decorators import require_async_request_params, streams_request_body
+
+main = Blueprint('main', __name__)
+
+client = AsyncOpenSearchClient()
+ingest_jobs = AsyncIngestJobManager(client)
+lifecycle = AsyncIndexLifecycleManager(client)
+admission = AsyncAdmissionController()
+
+logger = get_logger("async-routes", stdout=True)
+
+@main.route('/', methods=['GET'])
+async def index():
+    return jsonify({'status': 'Hello world!'}), 200
+
+@main.route('/upload', methods=['POST'])
+@require_async_request_params('id', 'content')
+async def upload():
+    data = await request.get_json()
+    id = data.get('id')
+    content = data.get('content')
+    run_async = data.get('async', False)
+    bulk_load = bool(data.get('bulk_load', False))
+
+    await lifecycle.ensure_active(id)
+    # not from the cache: a bulk request to an index deleted in the meantime would create it without the kNN mapping
+    if not await client.index_exists(index_name=id, use_cache=False):
+        await client.create_index(index_name=id)
+
+    log_payload(logger, "Content to be uploaded:", content)
+
+    # format data for ingestion
+    data = handlers.upload_actions(id, content)
+
+    log_payload(logger, "Data to be uploaded:", data)
+
+    if run_async:
+        admission.check(INGEST, id)
+        try:
+            job = ingest_jobs.submit(id, data, bulk_load, partial(admission.pace, id))
+        except asyncio.QueueFull:
+            return jsonify({'error': "Ingestion queue is full, retry later"}), 503
+        return jsonify({'status': job.status, 'job_id': job.id}), 202
+
+    async with admission.admit(INGEST, id), client.bulk_load_mode(id) if bulk_load else nullcontext():
+        response = await client.ingest_data_bulk(data, pace=partial(admission.pace, id))
+    client.invalidate_search_cache(id)
+
+    body, status = handlers.upload_response(response)
+    return jsonify(body), status
+
+@main.route('/upload-stream', methods=['POST'])
+@streams_request_body
+async def upload_stream():
+    """
+    Streaming variant of /upload. The index id is passed as a query parameter and the
+    body is NDJSON with one chunk per line, so the payload is never held in memory.
+    """
+    id, bulk_load = handlers.stream_params(request.args)
+
+    await lifecycle.ensure_active(id)
+    # not from the cache: a bulk request to an index deleted in the meantime would create it without the kNN mapping
+    if not await client.index_exists(index_name=id, use_cache=False):
+        await client.create_index(index_name=id)
+
+    actions = (handlers.upload_action(id, chunk) async for chunk in aiter_ndjson(request.body))
+    async with admission.admit(INGEST, id), client.bulk_load_mode(id) if bulk_load else nullcontext():
+        response = await client.ingest_data_bulk(actions, pace=partial(admission.pace, id))
+    client.invalidate_search_cache(id)
+
+    body, status = handlers.upload_response(response, counts=True)
+    return jsonify(body), status
+
+@main.route('/upload-jobs/<job_id>', methods=['GET'])
+async def upload_job_status(job_id):
+    job = ingest_jobs.get(job_id)
+    if not job:
+        return jsonify({'error': f'Unknown job {job_id}'}), 404
+
+    return jsonify(job.to_dict()), 200
+
+@main.route('/delete', methods=['GET'])
+@require_async_request_params('id', 'filename')
+async def delete():
+    data = await request.get_json()
+    id = data.get('id')
+    filename = data.get('filename')
+
+    await lifecycle.ensure_active(id)
+    if not await client.index_exists(index_name=id):
+        return jsonify({'error': f'User does not have an index'}), 400
+
+    response = await client.delete_document(id, filename)
+    client.invalidate_search_cache(id)
+
+    body, status = handlers.delete_response(response)
+    return jsonify(body), status
+
+@main.route('/delete-batch', methods=['POST'])
+@require_async_request_params('id', 'filenames')
+async def delete_batch():
+    """
+    Delete many files with one background delete_by_query. Answers immediately with the
+    OpenSearch task id, poll /delete-tasks/<task_id> with the same id for the progress.
+    """
+    data = await request.get_json()
+    id = data.get('id')
+    filenames = handlers.delete_filenames(data)
+
+    await lifecycle.ensure_active(id)
+    if not await client.index_exists(index_name=id):
+        return jsonify({'error': f'User does not have an index'}), 400
+
+    task_id = await client.delete_documents(id, filenames)
+    client.invalidate_search_cache(id)
+
+    body, status = handlers.delete_batch_response(task_id, filenames)
+    return jsonify(body), status
+
+@main.route('/delete-tasks/<task_id>', methods=['GET'])
+@require_async_request_params('id')
+async def delete_task_status(task_id):
+    data = await request.get_json()
+    # only the user the deletion was submitted for sees the task
+    task = await client.get_delete_task(task_id, data.get('id'))
+    body, status = handlers.delete_task_response(task_id, task)
+    return jsonify(body), status
+
+@main.route('/search', methods=['GET'])
+@require_async_request_params('id', 'query')
+async def search():
+    data = await request.get_json()
+    id = data.get('id')
+    query = data.get('query')
+    params = handlers.search_params(data)
+
+    await lifecycle.ensure_active(id)
+    async with admission.admit(SEARCH, id):
+        response = await client.semantic_search(id, query, mode=params["mode"], fields=params["fields"], highlight=params["highlight"])
+
+    body, status = handlers.search_response(response, params["format"])
+    return jsonify(body), status
+
+@main.route('/search-batch', methods=['GET'])
+@require_async_request_params('queries')
+async def search_batch():
+    """
+    Run several searches, e.g. query expansions or one query over several indices, in a
+    single OpenSearch round trip. Results are returned in the order of `queries`.
+    """
+    data = await request.get_json()
+    mode = handlers.search_mode(data)
+    searches = handlers.batch_searches(data)
+
+    for name in dict.fromkeys(search["index"] for search in searches):
+        await lifecycle.ensure_active(name)
+    async with admission.admit(SEARCH, None, **handlers.batch_admission(searches)):
+        response = await client.semantic_search_batch(searches, mode=mode)
+
+    body, status = handlers.search_batch_response(response, searches)
+    return jsonify(body), status
+
+@main.route('/get-documents', methods=['GET'])
+@require_async_request_params('id')
+async def get_documents():
+    data = await request.get_json()
+    id = data.get('id')
+    details = bool(data.get('details', False))
+    page_size = handlers.page_size_param(data)
+    after = data.get('after')
+
+    await lifecycle.ensure_active(id)
+    if not await client.index_exists(index_name=id):
+        await client.create_index(index_name=id)
+        return jsonify({"documents": []}), 200
+
+    # paginated listing: one page plus the cursor for the next one
+    if page_size:
+        page = await client.list_documents(index_name=id, page_size=page_size, after=after, with_stats=details)
+        body, status = handlers.documents_page_response(id, page)
+        return jsonify(body), status
+
+    response, code = await client.get_documents_from_index(index_name=id, with_stats=details)
+    if code == 200:
+        log_payload(logger, "Documents fetched:", response)
+
+    body, status = handlers.documents_response(id, response, code)
+    return jsonify(body), status
+
+@main.route('/index-lifecycle', methods=['GET'])
+async def index_lifecycle():
+    return jsonify(lifecycle.to_dict()), 200
+
+@main.route('/index-lifecycle/sweep', methods=['POST'])
+async def index_lifecycle_sweep():
+    """
+    Deactivate the idle indices now instead of waiting for the next periodic sweep.
+    """
+    if not lifecycle.enabled:
+        return jsonify({'error': "The index lifecycle is disabled"}), 400
+
+    deactivated = await lifecycle.sweep()
+    return jsonify({'deactivated': deactivated}), 200
@@ -6,6 +6,14 @@ from utils import get_logger
 
 logger = get_logger(__name__)
 
+def streams_request_body(f):
+    """
+    Mark a handler that reads the request body as a stream: it is not parsed ahead of the handler,
+    which would consume the stream whatever the Content-Type says.
+    """
+    f.streams_request_body = True
+    return f
+
 def require_request_params(*parameters):
     def wrapper(f):
         @wraps(f)
@@ -21,3 +29,24 @@ def require_request_params(*parameters):
             return f(*args, **kwargs)
         return decorated_function
     return wrapper
+
+def require_async_request_params(*parameters):
+    """
+    require_request_params for the Quart handlers of the async serving mode.
+    """
+    from quart import request as async_request, jsonify as async_jsonify
+
+    def wrapper(f):
+        @wraps(f)
+        async def decorated_function(*args, **kwargs):
+            data = await async_request.get_json(silent=True)
+            if not data:
+                return async_jsonify({'error': 'No JSON payload provided'}), 400
+
+            missing_params = [param for param in parameters if not data.get(param)]
+            if missing_params:
+                return async_jsonify({'error': f'Missing required field(s): {missing_params}'}), 400
+
+            return await f(*args, **kwargs)
+        return decorated_function
+    return wrapper
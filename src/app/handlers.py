@@ -0,0 +1,155 @@
+""" Request validation and response shaping shared by app/routes.py and app/async_routes.py, the routes only do the I/O """
+from collections import Counter
+import sys
+if '..' not in sys.path:
+    sys.path.append('..')
+from opensearch_client import compact_hits
+from utils import bounded_int
+import settings
+from app import metrics, timing
+
+class InvalidRequest(Exception):
+    """
+    Answered with 400 and the message by both apps.
+    """
+
+def upload_action(id: str, chunk: dict) -> dict:
+    if not chunk.get("id"):
+        raise InvalidRequest("Every chunk must have an 'id'")
+    return {"_index": id, "_id": chunk["id"]} | chunk
+
+def upload_actions(id: str, content: list[dict]) -> list[dict]:
+    with timing.stage("prepare"):
+        return [upload_action(id, chunk) for chunk in content]
+
+def stream_params(args) -> tuple[str, bool]:
+    """
+    Index id and bulk-load flag of /upload-stream, passed as query parameters.
+    """
+    id = args.get('id')
+    if not id:
+        raise InvalidRequest("Missing required query parameter: 'id'")
+    return id, args.get('bulk_load', 'false').lower() == 'true'
+
+def upload_response(summary: dict | None, counts: bool = False) -> tuple[dict, int]:
+    """
+    Counts the upload and shapes its response, with the indexed, updated and unchanged counts if `counts`.
+    """
+    metrics.PDF_UPLOAD_TOTAL.labels(status="success" if summary else "error").inc()
+    if not summary:
+        return {'error': "Failed to upload data"}, 400
+    body = {'status': 'Data uploaded successfully'}
+    if counts:
+        body |= {name: summary[name] for name in ("indexed", "updated", "unchanged")}
+    return body, 200
+
+def delete_filenames(data: dict) -> list[str]:
+    filenames = data.get('filenames')
+    if not isinstance(filenames, list) or len(filenames) > settings.DELETE_BATCH_MAX_FILENAMES:
+        raise InvalidRequest(f"'filenames' must be a list of at most {settings.DELETE_BATCH_MAX_FILENAMES} filenames")
+    return filenames
+
+def delete_response(response: dict | None) -> tuple[dict, int]:
+    metrics.PDF_DELETE_TOTAL.labels(status="success" if response else "error").inc()
+    if not response:
+        return {'error': "Failed to delete document"}, 400
+    return {'status': 'Document deleted successfully'}, 200
+
+def delete_batch_response(task_id: str | None, filenames: list[str]) -> tuple[dict, int]:
+    metrics.PDF_DELETE_TOTAL.labels(status="success" if task_id else "error").inc(len(filenames))
+    if not task_id:
+        return {'error': "Failed to submit document deletion"}, 400
+    return {'status': 'Deletion submitted', 'task_id': task_id}, 202
+
+def delete_task_response(task_id: str, task: dict | None) -> tuple[dict, int]:
+    if not task:
+        return {'error': f'Unknown task {task_id}'}, 404
+    return task, 200
+
+def search_mode(data: dict) -> str | None:
+    mode = data.get('mode')
+    if mode and mode not in settings.SEARCH_MODES:
+        raise InvalidRequest(f"Invalid search mode '{mode}', expected one of {list(settings.SEARCH_MODES)}")
+    return mode
+
+def search_params(data: dict) -> dict:
+    """
+    The keyword arguments of semantic_search and the response `format` of a /search request.
+    """
+    mode = search_mode(data)
+    fields = data.get('fields')
+    highlight = data.get('highlight', False)
+    format = data.get('format', 'full')
+    if fields is not None and (not isinstance(fields, list) or not all(isinstance(field, str) for field in fields)):
+        raise InvalidRequest("'fields' must be a list of field names")
+    if not isinstance(highlight, bool):
+        raise InvalidRequest("'highlight' must be a boolean")
+    if format not in settings.SEARCH_FORMATS:
+        raise InvalidRequest(f"Invalid format '{format}', expected one of {list(settings.SEARCH_FORMATS)}")
+    return {"mode": mode, "fields": fields, "highlight": highlight, "format": format}
+
+def search_response(hits: list[dict] | None, format: str) -> tuple[list | dict, int]:
+    metrics.SEARCH_TOTAL.labels(status="success" if hits else "error").inc()
+    if not hits:
+        return {'error': "Error occured while performing semantic search"}, 400
+    if format == 'compact':
+        with timing.stage("compact"):
+            hits = compact_hits(hits)
+    return hits, 200
+
+def batch_searches(data: dict) -> list[dict]:
+    """
+    The searches of a /search-batch request, as passed to semantic_search_batch.
+    """
+    queries = data.get('queries')
+    if not isinstance(queries, list) or len(queries) > settings.SEARCH_BATCH_MAX_QUERIES:
+        raise InvalidRequest(f"'queries' must be a list of at most {settings.SEARCH_BATCH_MAX_QUERIES} searches")
+
+    invalid = [position for position, query in enumerate(queries)
+               if not isinstance(query, dict) or not query.get('id') or not query.get('query')]
+    if invalid:
+        raise InvalidRequest(f"Queries at position(s) {invalid} need an 'id' and a 'query'")
+    invalid = [position for position, query in enumerate(queries)
+               if bounded_int(query.get('k', 3), settings.SEARCH_MAX_K) is None]
+    if invalid:
+        raise InvalidRequest(f"Queries at position(s) {invalid} need a 'k' between 1 and {settings.SEARCH_MAX_K}")
+
+    return [
+        {"index": query['id'], "query": query['query'], "k": bounded_int(query.get('k', 3), settings.SEARCH_MAX_K)}
+        for query in queries
+    ]
+
+def batch_admission(searches: list[dict]) -> dict:
+    """
+    admit() arguments of a search batch: queries may span several users, every user is charged
+    for its queries and the slot is global.
+    """
+    return {"cost": len(searches), "tenants": Counter(search["index"] for search in searches)}
+
+def search_batch_response(results: list[dict] | None, searches: list[dict]) -> tuple[dict, int]:
+    if results is None:
+        metrics.SEARCH_TOTAL.labels(status="error").inc(len(searches))
+        return {'error': "Error occured while performing semantic search"}, 400
+    for result in results:
+        metrics.SEARCH_TOTAL.labels(status="error" if "error" in result else "success").inc()
+    return {"results": results}, 200
+
+def page_size_param(data: dict) -> int | None:
+    page_size = data.get('page_size')
+    if page_size is None:
+        return None
+    page_size = bounded_int(page_size, settings.DOCUMENTS_MAX_PAGE_SIZE)
+    if page_size is None:
+        raise InvalidRequest(f"'page_size' must be an integer between 1 and {settings.DOCUMENTS_MAX_PAGE_SIZE}")
+    return page_size
+
+def documents_page_response(id: str, page: tuple[list, str | None] | None) -> tuple[dict, int]:
+    if page is None:
+        return {'error': f"Error occured while getting documents from index {id}"}, 400
+    documents, next_after = page
+    return {"documents": documents, "after": next_after}, 200
+
+def documents_response(id: str, documents: list | None, code: int) -> tuple[dict, int]:
+    if code != 200:
+        return {'error': f"Error occured while getting documents from index {id}"}, 400
+    return {"documents": documents}, 200
@@ -1,4 +1,10 @@
-from prometheus_client import Counter, Histogram
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY
+from prometheus_client.core import GaugeMetricFamily
+from app import timing
 
 # ── generic HTTP stats ────────────────────────────────────────────────────────
 HTTP_REQUESTS_TOTAL = Counter(
@@ -14,7 +20,215 @@ HTTP_REQUEST_LATENCY = Histogram(
     buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10),
 )
 
+HTTP_RESPONSE_BYTES = Histogram(
+    "http_response_bytes",
+    "Body size of HTTP responses in bytes",
+    ["endpoint"],
+    buckets=(100, 500, 1e3, 5e3, 1e4, 5e4, 1e5, 5e5, 1e6, 5e6),
+)
+
+SLOW_REQUESTS_TOTAL = Counter(
+    "slow_requests_total",
+    "Requests slower than SLOW_REQUEST_THRESHOLD",
+    ["endpoint"],
+)
+
+JSON_SERIALIZE_SECONDS = Histogram(
+    "json_serialize_duration_seconds",
+    "Time spent serializing JSON responses in seconds",
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+)
+
 # ── business specific counters ────────────────────────────────────────────────
 PDF_UPLOAD_TOTAL     = Counter("pdf_upload_total",     "Number of PDF uploads",     ["status"])
 PDF_DELETE_TOTAL     = Counter("pdf_delete_total",     "Number of PDF deletions",  ["status"])
-SEARCH_TOTAL         = Counter("search_total",         "Number of /search calls",  ["status"])
\ No newline at end of file
+SEARCH_TOTAL         = Counter("search_total",         "Number of /search calls",  ["status"])
+
+# ── admission control ─────────────────────────────────────────────────────────
+ADMISSION_IN_FLIGHT = Gauge("admission_in_flight", "Admitted requests currently running", ["kind"])
+ADMISSION_QUEUE_DEPTH = Gauge("admission_queue_depth", "Requests waiting for a concurrency slot", ["kind"])
+ADMISSION_REJECTED_TOTAL = Counter(
+    "admission_rejected_total",
+    "Requests shed with 429: rate_limited, queue_full or queue_timeout",
+    ["kind", "reason"],
+)
+ADMISSION_WAIT_SECONDS = Histogram(
+    "admission_wait_seconds",
+    "Time admitted requests waited for tokens and a slot in seconds",
+    ["kind"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+INGEST_THROTTLE_SECONDS_TOTAL = Counter(
+    "ingest_throttle_seconds_total",
+    "Seconds uploads were paused waiting for ingest tokens",
+)
+
+# ── index lifecycle ───────────────────────────────────────────────────────────
+LIFECYCLE_TRANSITIONS_TOTAL = Counter(
+    "index_lifecycle_transitions_total",
+    "Idle indices deactivated (close, evict, warm) and restored on demand (restore)",
+    ["action"],
+)
+LIFECYCLE_RECLAIMED_BYTES_TOTAL = Counter(
+    "index_lifecycle_reclaimed_bytes_total",
+    "Segment heap and kNN graph memory held by indices when they were deactivated",
+    ["action"],
+)
+LIFECYCLE_RESTORE_SECONDS = Histogram(
+    "index_lifecycle_restore_seconds",
+    "Time to reopen or restore a deactivated index on its next request in seconds",
+    ["action"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60),
+)
+LIFECYCLE_INACTIVE_INDICES = Gauge(
+    "index_lifecycle_inactive_indices",
+    "Indices deactivated by the lifecycle manager as of the last sweep",
+    ["action"],
+)
+
+# ── caches ────────────────────────────────────────────────────────────────────
+SEARCH_CACHE_HITS_TOTAL   = Counter("search_cache_hits_total",   "Semantic search result cache hits")
+SEARCH_CACHE_MISSES_TOTAL = Counter("search_cache_misses_total", "Semantic search result cache misses")
+EMBEDDING_CACHE_HITS_TOTAL   = Counter("embedding_cache_hits_total",   "Query embedding cache hits")
+EMBEDDING_CACHE_MISSES_TOTAL = Counter("embedding_cache_misses_total", "Query embedding cache misses")
+SINGLE_FLIGHT_COALESCED_TOTAL = Counter(
+    "single_flight_coalesced_total",
+    "Calls that joined an identical in-flight call instead of sending their own request",
+    ["operation"],
+)
+
+# ── search stages ─────────────────────────────────────────────────────────────
+QUERY_EMBEDDING_LATENCY = Histogram(
+    "query_embedding_duration_seconds",
+    "Latency of query embedding through the ML predict API in seconds",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+SEARCH_QUERY_LATENCY = Histogram(
+    "search_query_duration_seconds",
+    "Latency of the OpenSearch search request in seconds",
+    ["mode"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+# ── OpenSearch operations ─────────────────────────────────────────────────────
+OPENSEARCH_OPERATION_LATENCY = Histogram(
+    "opensearch_operation_duration_seconds",
+    "Client-side latency of OpenSearch operations in seconds",
+    ["operation"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+OPENSEARCH_OPERATION_ERRORS_TOTAL = Counter(
+    "opensearch_operation_errors_total",
+    "Failed OpenSearch operations by exception type",
+    ["operation", "exception"],
+)
+
+OPENSEARCH_TOOK = Histogram(
+    "opensearch_took_seconds",
+    "Server-reported `took` time of OpenSearch responses in seconds",
+    ["operation"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+KNN_HITS = Histogram(
+    "knn_hits",
+    "Number of hits returned per semantic search",
+    ["mode"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+
+BULK_BATCH_DOCS = Histogram(
+    "bulk_batch_documents",
+    "Documents per bulk request",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+
+BULK_BATCH_BYTES = Histogram(
+    "bulk_batch_bytes",
+    "Body size of bulk requests in bytes",
+    buckets=(1e3, 1e4, 1e5, 5e5, 1e6, 2.5e6, 5e6, 1e7, 2.5e7),
+)
+
+BULK_REJECTED_ITEMS_TOTAL = Counter(
+    "bulk_rejected_items_total",
+    "Bulk items rejected with 429 / rejected execution and retried",
+)
+
+INGEST_DEDUP_TOTAL = Counter(
+    "ingest_dedup_chunks_total",
+    "Uploaded chunks by deduplication outcome: indexed (embedded), updated (metadata only) or unchanged",
+    ["result"],
+)
+
+@contextmanager
+def observe_operation(operation: str):
+    """
+    Time an OpenSearch operation and count its exceptions by type. Works around `await` too.
+    The time is also recorded as a stage of the current request.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        OPENSEARCH_OPERATION_ERRORS_TOTAL.labels(operation=operation, exception=type(e).__name__).inc()
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        OPENSEARCH_OPERATION_LATENCY.labels(operation=operation).observe(elapsed)
+        timing.record(operation, elapsed)
+
+def observe_took(operation: str, response: dict | None) -> None:
+    if isinstance(response, dict) and "took" in response:
+        OPENSEARCH_TOOK.labels(operation=operation).observe(response["took"] / 1000)
+        timing.record_took(operation, response["took"])
+
+class ConnectionPoolCollector:
+    """
+    Reports, at scrape time, the connection pools of every live OpenSearch client in the
+    process: connections in use and pool size per node, and alive / dead nodes.
+    Clients register themselves and provide `connection_pool_stats()`. Every client gets its
+    own `client` label: its class name, with a number appended when another live client has it.
+    """
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # client -> label
+        self._clients = weakref.WeakKeyDictionary()
+
+    def register(self, client) -> str:
+        name = type(client).__name__
+        with self._lock:
+            taken = set(self._clients.values())
+            label, number = name, 1
+            while label in taken:
+                number += 1
+                label = f"{name}-{number}"
+            self._clients[client] = label
+        return label
+
+    def unregister(self, client) -> None:
+        with self._lock:
+            self._clients.pop(client, None)
+
+    def collect(self):
+        in_use = GaugeMetricFamily("opensearch_pool_connections_in_use", "HTTP connections currently in use per node", labels=["client", "host"])
+        size = GaugeMetricFamily("opensearch_pool_connections_max", "Max HTTP connections per node", labels=["client", "host"])
+        nodes = GaugeMetricFamily("opensearch_nodes", "OpenSearch nodes known to the connection pool", labels=["client", "state"])
+        with self._lock:
+            clients = list(self._clients.items())
+        for client, name in clients:
+            try:
+                stats = client.connection_pool_stats()
+            except Exception:
+                continue
+            for node in stats:
+                in_use.add_metric([name, node["host"]], node["in_use"])
+                size.add_metric([name, node["host"]], node["max"])
+            nodes.add_metric([name, "alive"], sum(node["alive"] for node in stats))
+            nodes.add_metric([name, "dead"], sum(not node["alive"] for node in stats))
+        yield in_use
+        yield size
+        yield nodes
+
+CONNECTION_POOLS = ConnectionPoolCollector()
+REGISTRY.register(CONNECTION_POOLS)
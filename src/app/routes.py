@@ -1,15 +1,24 @@
 from flask import Blueprint, request, jsonify
+import queue
+from contextlib import nullcontext
+from functools import partial
 import sys
 if '..' not in sys.path:
     sys.path.append('..')
 from opensearch_client import OpenSearchClient
-from utils import get_logger
-from app import metrics
-from app.decorators import require_request_params
+from admission import INGEST, SEARCH, AdmissionController
+from lifecycle import IndexLifecycleManager
+from jobs import IngestJobManager
+from utils import get_logger, iter_ndjson, log_payload
+from app import handlers
+from app.decorators import require_request_params, streams_request_body
 
 main = Blueprint('main', __name__)
 
 client = OpenSearchClient()
+ingest_jobs = IngestJobManager(client)
+lifecycle = IndexLifecycleManager(client)
+admission = AdmissionController()
 
 logger = get_logger("routes", stdout=True)
 
@@ -23,32 +32,65 @@ def upload():
     data = request.get_json()
     id = data.get('id')
     content = data.get('content')
+    run_async = data.get('async', False)
+    bulk_load = bool(data.get('bulk_load', False))
 
-    if not client.index_exists(index_name=id):
+    lifecycle.ensure_active(id)
+    # not from the cache: a bulk request to an index deleted in the meantime would create it without the kNN mapping
+    if not client.index_exists(index_name=id, use_cache=False):
         client.create_index(index_name=id)
 
-    logger.info("Content to be uploaded:")
-    logger.info(content)
+    log_payload(logger, "Content to be uploaded:", content)
 
     # format data for ingestion
-    data = [
-        {"_index": id, "_id": chunk["id"]} | chunk
-        for chunk in content
-    ]
+    data = handlers.upload_actions(id, content)
+
+    log_payload(logger, "Data to be uploaded:", data)
+
+    if run_async:
+        admission.check(INGEST, id)
+        try:
+            job = ingest_jobs.submit(id, data, bulk_load, partial(admission.pace, id))
+        except queue.Full:
+            return jsonify({'error': "Ingestion queue is full, retry later"}), 503
+        return jsonify({'status': job.status, 'job_id': job.id}), 202
+
+    with admission.admit(INGEST, id), client.bulk_load_mode(id) if bulk_load else nullcontext():
+        response = client.ingest_data_bulk(data, pace=partial(admission.pace, id))
+    client.invalidate_search_cache(id)
+
+    body, status = handlers.upload_response(response)
+    return jsonify(body), status
+
+@main.route('/upload-stream', methods=['POST'])
+@streams_request_body
+def upload_stream():
+    """
+    Streaming variant of /upload. The index id is passed as a query parameter and the
+    body is NDJSON with one chunk per line, so the payload is never held in memory.
+    """
+    id, bulk_load = handlers.stream_params(request.args)
+
+    lifecycle.ensure_active(id)
+    # not from the cache: a bulk request to an index deleted in the meantime would create it without the kNN mapping
+    if not client.index_exists(index_name=id, use_cache=False):
+        client.create_index(index_name=id)
 
-    logger.info("Data to be uploaded:")
-    logger.info(data)
+    actions = (handlers.upload_action(id, chunk) for chunk in iter_ndjson(request.stream))
+    with admission.admit(INGEST, id), client.bulk_load_mode(id) if bulk_load else nullcontext():
+        response = client.ingest_data_bulk(actions, pace=partial(admission.pace, id))
+    client.invalidate_search_cache(id)
 
-    response = client.ingest_data_bulk(data)
-    if not response:
-        return jsonify({'error': "Failed to upload data"}), 400
+    body, status = handlers.upload_response(response, counts=True)
+    return jsonify(body), status
 
-    # business metric
-    metrics.PDF_UPLOAD_TOTAL.labels(
-        status="success" if response else "error"
-    ).inc()
+@main.route('/upload-jobs/<job_id>', methods=['GET'])
+def upload_job_status(job_id):
+    job = ingest_jobs.get(job_id)
+    if not job:
+        return jsonify({'error': f'Unknown job {job_id}'}), 404
 
-    return jsonify({'status': 'Data uploaded successfully'}), 200 
+    return jsonify(job.to_dict()), 200
 
 @main.route('/delete', methods=['GET'])
 @require_request_params('id', 'filename')
@@ -57,18 +99,45 @@ def delete():
     id = data.get('id')
     filename = data.get('filename')
 
+    lifecycle.ensure_active(id)
     if not client.index_exists(index_name=id):
         return jsonify({'error': f'User does not have an index'}), 400
 
     response = client.delete_document(id, filename)
-    if not response:
-        return jsonify({'error': "Failed to delete document"}), 400
+    client.invalidate_search_cache(id)
+
+    body, status = handlers.delete_response(response)
+    return jsonify(body), status
+
+@main.route('/delete-batch', methods=['POST'])
+@require_request_params('id', 'filenames')
+def delete_batch():
+    """
+    Delete many files with one background delete_by_query. Answers immediately with the
+    OpenSearch task id, poll /delete-tasks/<task_id> with the same id for the progress.
+    """
+    data = request.get_json()
+    id = data.get('id')
+    filenames = handlers.delete_filenames(data)
+
+    lifecycle.ensure_active(id)
+    if not client.index_exists(index_name=id):
+        return jsonify({'error': f'User does not have an index'}), 400
 
-    metrics.PDF_DELETE_TOTAL.labels(
-        status="success" if response else "error"
-    ).inc()
+    task_id = client.delete_documents(id, filenames)
+    client.invalidate_search_cache(id)
 
-    return jsonify({'status': 'Document deleted successfully'}), 200
+    body, status = handlers.delete_batch_response(task_id, filenames)
+    return jsonify(body), status
+
+@main.route('/delete-tasks/<task_id>', methods=['GET'])
+@require_request_params('id')
+def delete_task_status(task_id):
+    data = request.get_json()
+    # only the user the deletion was submitted for sees the task
+    task = client.get_delete_task(task_id, data.get('id'))
+    body, status = handlers.delete_task_response(task_id, task)
+    return jsonify(body), status
 
 @main.route('/search', methods=['GET'])
 @require_request_params('id', 'query')
@@ -76,32 +145,72 @@ def search():
     data = request.get_json()
     id = data.get('id')
     query = data.get('query')
-    
-    response = client.semantic_search(id, query)
-    if not response:
-        return jsonify({'error': "Error occured while performing semantic search"}), 400
+    params = handlers.search_params(data)
+
+    lifecycle.ensure_active(id)
+    with admission.admit(SEARCH, id):
+        response = client.semantic_search(id, query, mode=params["mode"], fields=params["fields"], highlight=params["highlight"])
+
+    body, status = handlers.search_response(response, params["format"])
+    return jsonify(body), status
+
+@main.route('/search-batch', methods=['GET'])
+@require_request_params('queries')
+def search_batch():
+    """
+    Run several searches, e.g. query expansions or one query over several indices, in a
+    single OpenSearch round trip. Results are returned in the order of `queries`.
+    """
+    data = request.get_json()
+    mode = handlers.search_mode(data)
+    searches = handlers.batch_searches(data)
 
-    metrics.SEARCH_TOTAL.labels(
-        status="success" if response else "error"
-    ).inc()
+    for name in dict.fromkeys(search["index"] for search in searches):
+        lifecycle.ensure_active(name)
+    with admission.admit(SEARCH, None, **handlers.batch_admission(searches)):
+        response = client.semantic_search_batch(searches, mode=mode)
 
-    return jsonify(response), 200
+    body, status = handlers.search_batch_response(response, searches)
+    return jsonify(body), status
 
 @main.route('/get-documents', methods=['GET'])
 @require_request_params('id')
 def get_documents():
     data = request.get_json()
     id = data.get('id')
-    
+    details = bool(data.get('details', False))
+    page_size = handlers.page_size_param(data)
+    after = data.get('after')
+
+    lifecycle.ensure_active(id)
     if not client.index_exists(index_name=id):
         client.create_index(index_name=id)
         return jsonify({"documents": []}), 200
 
-    response, code = client.get_documents_from_index(index_name=id)
-    if code != 200:
-        return jsonify({'error': f"Error occured while getting documents from index {id}"}), 400
-    
-    logger.info("Documents fetched:")
-    logger.info(response)
-
-    return jsonify({"documents": response})
+    # paginated listing: one page plus the cursor for the next one
+    if page_size:
+        page = client.list_documents(index_name=id, page_size=page_size, after=after, with_stats=details)
+        body, status = handlers.documents_page_response(id, page)
+        return jsonify(body), status
+
+    response, code = client.get_documents_from_index(index_name=id, with_stats=details)
+    if code == 200:
+        log_payload(logger, "Documents fetched:", response)
+
+    body, status = handlers.documents_response(id, response, code)
+    return jsonify(body), status
+
+@main.route('/index-lifecycle', methods=['GET'])
+def index_lifecycle():
+    return jsonify(lifecycle.to_dict()), 200
+
+@main.route('/index-lifecycle/sweep', methods=['POST'])
+def index_lifecycle_sweep():
+    """
+    Deactivate the idle indices now instead of waiting for the next periodic sweep.
+    """
+    if not lifecycle.enabled:
+        return jsonify({'error': "The index lifecycle is disabled"}), 400
+
+    deactivated = lifecycle.sweep()
+    return jsonify({'deactivated': deactivated}), 200
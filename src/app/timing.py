@@ -0,0 +1,112 @@
+""" Request-scoped stage timing, reported in the Server-Timing header and the slow-request log """
+import json
+import random
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+import settings
+from utils import get_logger
+
+_current: ContextVar["RequestTiming | None"] = ContextVar("request_timing", default=None)
+_INVALID = re.compile(r"[^A-Za-z0-9_-]")
+_slow_logger = None
+
+class RequestTiming:
+    """
+    Stages of one request. A stage recorded several times (e.g. one mget per dedup batch) is
+    summed and counted. Stages may overlap: `bulk_ingest` contains the `dedup_mget` calls.
+    """
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.stages: dict[str, list] = {}      # name -> [seconds, count]
+        self._last: dict[str, float] = {}
+
+    def add(self, name: str, seconds: float) -> None:
+        stage = self.stages.setdefault(name, [0.0, 0])
+        stage[0] += seconds
+        stage[1] += 1
+        self._last[name] = seconds
+
+    def add_took(self, operation: str, took_ms: float) -> None:
+        """
+        OpenSearch's `took` for the last `operation`, and the rest of its client-side time as network.
+        """
+        took = took_ms / 1000
+        self.add(f"{operation}_took", took)
+        if operation in self._last:
+            self.add(f"{operation}_network", max(0.0, self._last[operation] - took))
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def to_dict(self) -> dict:
+        return {
+            name: {"ms": round(seconds * 1000, 2)} | ({"count": count} if count > 1 else {})
+            for name, (seconds, count) in self.stages.items()
+        }
+
+    def header(self, total: float | None = None) -> str:
+        entries = []
+        for name, (seconds, count) in self.stages.items():
+            entry = f"{_INVALID.sub('_', name)};dur={seconds * 1000:.1f}"
+            if count > 1:
+                entry += f';desc="x{count}"'
+            entries.append(entry)
+        entries.append(f"total;dur={(self.elapsed() if total is None else total) * 1000:.1f}")
+        return ", ".join(entries)
+
+def start() -> RequestTiming:
+    timing = RequestTiming()
+    _current.set(timing)
+    return timing
+
+def current() -> RequestTiming | None:
+    return _current.get()
+
+def record(name: str, seconds: float) -> None:
+    """
+    Add a stage to the current request, a no-op outside of requests (bootstrap, job workers, ...).
+    """
+    timing = _current.get()
+    if timing is not None:
+        timing.add(name, seconds)
+
+def record_took(operation: str, took_ms: float) -> None:
+    timing = _current.get()
+    if timing is not None:
+        timing.add_took(operation, took_ms)
+
+@contextmanager
+def stage(name: str):
+    """
+    Time the block as a stage of the current request. Works around `await` too.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
+
+def report(timing: RequestTiming, response, method: str, path: str, endpoint: str) -> bool:
+    """
+    Add the Server-Timing header to the response and log the stages of a slow request,
+    sampled with settings.SLOW_REQUEST_SAMPLE_RATE. Returns whether the request was slow.
+    """
+    global _slow_logger
+    total = timing.elapsed()
+    if settings.SERVER_TIMING_ENABLED:
+        response.headers["Server-Timing"] = timing.header(total)
+    if not settings.SLOW_REQUEST_THRESHOLD or total < settings.SLOW_REQUEST_THRESHOLD:
+        return False
+    if random.random() < settings.SLOW_REQUEST_SAMPLE_RATE:
+        _slow_logger = _slow_logger or get_logger("slow-requests", stdout=True)
+        _slow_logger.warning(json.dumps({
+            "method": method,
+            "path": path,
+            "endpoint": endpoint,
+            "status": response.status_code,
+            "total_ms": round(total * 1000, 2),
+            "stages": timing.to_dict(),
+        }))
+    return True
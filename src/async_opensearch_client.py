@@ -0,0 +1,699 @@
+""" asyncio counterpart of OpenSearchClient used by the async serving mode """
+import time
+from contextlib import asynccontextmanager
+from logging import Logger
+from typing import AsyncIterable, AsyncIterator, Callable, Iterable
+from opensearchpy import AsyncOpenSearch
+from opensearchpy.exceptions import ConflictError, NotFoundError
+from utils import get_logger, log_payload
+from cache import MISSING
+from bulk import BULK_LOAD_META, BULK_LOAD_SETTINGS, AsyncAdaptiveBulkIndexer, bulk_load_original, bulk_loads
+from lifecycle import CLOSE, CLOSED, EVICT, LIFECYCLE_META, WARM, index_memory_bytes, lifecycle_marker, parse_index_activity, parse_lifecycle_state
+from singleflight import AsyncSingleFlight
+from dedup import mget_body, stored_sources, with_hash, without_unchanged
+from tenancy import resolve, tenant_filter, scope_action, source_excludes
+from opensearch_client import (
+    _metadata_cache,
+    _search_cache,
+    _delete_tasks,
+    normalize_query,
+    build_search_query,
+    build_highlight,
+    search_source_params,
+    search_cache_key,
+    cached_search,
+    search_hits,
+    pending_searches,
+    msearch_results,
+    cached_embeddings,
+    cache_embeddings,
+    parse_embeddings,
+    delete_task_record_id,
+    build_delete_task_record,
+    parse_delete_task_record,
+    new_ingest_summary,
+    count_ingest_result,
+    record_ingest_summary,
+    build_model_group_query,
+    build_model_query,
+    build_embedding_request,
+    build_msearch_body,
+    build_documents_query,
+    build_delete_document_query,
+    build_delete_documents_query,
+    parse_documents_page,
+    parse_delete_task,
+    index_body,
+    index_missing,
+    search_generation,
+    next_search_generation,
+    updated_meta,
+    connection_options,
+    seed_hosts,
+)
+from app import metrics
+import settings
+
+# Identical concurrent searches and model lookups share one request
+_search_flights = AsyncSingleFlight("search")
+_model_flights = AsyncSingleFlight("model_lookup")
+
+async def _scoped_actions(data: Iterable[dict] | AsyncIterable[dict]) -> AsyncIterable[dict]:
+    if hasattr(data, "__aiter__"):
+        async for action in data:
+            yield scope_action(action)
+    else:
+        for action in data:
+            yield scope_action(action)
+
+class AsyncOpenSearchClient:
+    """
+    Exposes the request-path subset of OpenSearchClient (search, upload, listing, deletion)
+    on top of AsyncOpenSearch. The metadata, search and embedding caches are shared with the
+    synchronous client, cluster bootstrap stays with OpenSearchClient.
+    """
+    def __init__(
+        self,
+        host: str | None = None,
+        port: int = 9200,
+        pool_maxsize: int = settings.OPENSEARCH_POOL_MAXSIZE,
+        logger: Logger = None,
+    ) -> None:
+        self.hosts = seed_hosts(host, port)
+        self._logger = logger or get_logger("async-opensearch-client", stdout=True)
+        # the aiohttp session and its connection pool are created lazily on the first request
+        self.client = AsyncOpenSearch(hosts=self.hosts, **connection_options(pool_maxsize))
+        self._bulk_indexer = None
+        metrics.CONNECTION_POOLS.register(self)
+
+    def connection_pool_stats(self) -> list[dict]:
+        """
+        Connections in use and pool size per node, read from the aiohttp connectors.
+        """
+        pool = self.client.transport.connection_pool
+        stats = []
+        for connection in getattr(pool, "orig_connections", pool.connections):
+            connector = getattr(getattr(connection, "session", None), "connector", None)
+            stats.append({
+                "host": connection.host,
+                "in_use": len(getattr(connector, "_acquired", ())),
+                "max": connector.limit if connector is not None else getattr(connection, "_limit", 0),
+                "alive": connection in pool.connections,
+            })
+        return stats
+
+    @property
+    def bulk_indexer(self) -> AsyncAdaptiveBulkIndexer:
+        if self._bulk_indexer is None:
+            self._bulk_indexer = AsyncAdaptiveBulkIndexer(self.client, logger=self._logger)
+        return self._bulk_indexer
+
+    async def close(self):
+        await self.client.close()
+
+    async def _perform_request(
+        self,
+        method: str,
+        endpoint: str,
+        body: dict,
+        params: dict | None = None,
+        verbose: bool = True,
+        operation: str = "request",
+    ):
+        try:
+            with metrics.observe_operation(operation):
+                response = await self.client.transport.perform_request(method, endpoint, body=body, params=params)
+            if verbose:
+                self._logger.info(f"{method} {endpoint}")
+                if body: log_payload(self._logger, "Request body:", body)
+                log_payload(self._logger, "Response:", response)
+            return response
+        except Exception as e:
+            if verbose:
+                self._logger.error("Error during request", exc_info=True)
+            return None
+
+    def invalidate_index_cache(self, index_name: str):
+        _metadata_cache.pop(("index", index_name))
+
+    def _forget_missing_index(self, index_name: str, error: Exception) -> None:
+        # deleted outside the service: the next existence check asks the cluster again
+        if index_missing(error):
+            self.invalidate_index_cache(index_name)
+
+    def invalidate_search_cache(self, index_name: str):
+        next_search_generation(index_name)
+        dropped = _search_cache.invalidate(lambda key: key[0] == index_name)
+        if dropped:
+            self._logger.info(f"Invalidated {dropped} cached search result(s) for index {index_name}")
+
+    async def acquire_lock(self, name: str, owner: str, ttl: float) -> bool:
+        """
+        See OpenSearchClient.acquire_lock.
+        """
+        body = {"owner": owner, "expires_at": time.time() + ttl}
+        try:
+            await self.client.index(index=settings.LOCK_INDEX, id=name, body=body, op_type="create", refresh="true")
+            self._logger.info(f"Acquired lock {name}")
+            return True
+        except ConflictError:
+            pass
+        except Exception as e:
+            self._logger.error(f"Error acquiring lock {name}", exc_info=True)
+            return False
+
+        try:
+            current = await self.client.get(index=settings.LOCK_INDEX, id=name)
+            if current["_source"].get("expires_at", 0) > time.time():
+                return False
+            self._logger.warning(f"Taking over expired lock {name} held by {current['_source'].get('owner')}")
+            await self.client.index(
+                index=settings.LOCK_INDEX,
+                id=name,
+                body=body,
+                if_seq_no=current["_seq_no"],
+                if_primary_term=current["_primary_term"],
+                refresh="true",
+            )
+            return True
+        except (ConflictError, NotFoundError):
+            return False
+        except Exception as e:
+            self._logger.error(f"Error acquiring lock {name}", exc_info=True)
+            return False
+
+    async def get_model_group_id(self, group_name: str):
+        cache_key = ("model_group", group_name)
+        group_id = _metadata_cache.get(cache_key)
+        if group_id is not MISSING:
+            return group_id
+
+        endpoint = "/_plugins/_ml/model_groups/_search"
+        response = await self._perform_request("GET", endpoint, body=build_model_group_query(group_name), verbose=False, operation="model_group_lookup")
+        if response and response["hits"]["hits"]:
+            group_id = response["hits"]["hits"][0]["_id"]
+            _metadata_cache.set(cache_key, group_id)
+            return group_id
+        return None
+
+    async def get_model(self, model_name: str, group_name: str):
+        cache_key = ("model", model_name, group_name)
+        model = _metadata_cache.get(cache_key)
+        if model is not MISSING:
+            return model
+        return await _model_flights.do(cache_key, lambda: self._lookup_model(model_name, group_name))
+
+    async def _lookup_model(self, model_name: str, group_name: str):
+        cache_key = ("model", model_name, group_name)
+        model_group_id = await self.get_model_group_id(group_name)
+        if not model_group_id:
+            self._logger.error(f'No model group with name "{group_name}" found.')
+            return None
+
+        endpoint = "/_plugins/_ml/models/_search"
+        response = await self._perform_request("POST", endpoint, body=build_model_query(model_name, model_group_id), verbose=False, operation="model_lookup")
+        if response and response["hits"]["hits"]:
+            model = response["hits"]["hits"][0]
+            _metadata_cache.set(cache_key, model)
+            return model
+        return None
+
+    async def _resolve_model_id(self, model_id: str | None = None) -> str | None:
+        if model_id:
+            return model_id
+        model = await self.get_model(settings.MODEL_URL, settings.MODEL_GROUP_NAME)
+        if not model:
+            self._logger.error(f"Model {settings.MODEL_URL} not found in model group {settings.MODEL_GROUP_NAME}")
+            return None
+        return model["_id"]
+
+    async def embed_queries(self, query_texts: list[str], model_id: str) -> dict[str, list[float]]:
+        embeddings, missing = cached_embeddings(query_texts, model_id)
+        if not missing:
+            return embeddings
+
+        endpoint = f"/_plugins/_ml/_predict/text_embedding/{model_id}"
+        with metrics.QUERY_EMBEDDING_LATENCY.time():
+            response = await self._perform_request("POST", endpoint, body=build_embedding_request(missing), verbose=False, operation="embed")
+        if not response:
+            self._logger.error(f"Could not embed queries with model {model_id}")
+            return embeddings
+        return cache_embeddings(model_id, missing, parse_embeddings(response), embeddings)
+
+    async def semantic_search(
+        self,
+        index_name: str,
+        query_text: str,
+        k: int = 3,
+        model_id: str | None = None,
+        mode: str | None = None,
+        fields: list[str] | None = None,
+        highlight: bool = False,
+    ):
+        """
+        The k nearest chunks. `fields` limits the returned _source fields, `highlight` adds
+        snippets of `text` to every hit and drops the full text from the source.
+        """
+        mode = mode or settings.SEARCH_MODE
+        self._logger.info(f"Semantic search, query_text = {query_text}, mode = {mode}")
+        model_id = await self._resolve_model_id(model_id)
+        if not model_id:
+            return None
+
+        cache_key = search_cache_key(index_name, query_text, k, model_id, fields, highlight)
+        hits = cached_search(cache_key)
+        if hits is not MISSING:
+            return hits
+
+        generation = search_generation(index_name)
+        return await _search_flights.do(
+            (cache_key, mode, generation),
+            lambda: self._search(cache_key, mode, fields, highlight, generation),
+        )
+
+    async def _search(self, cache_key: tuple, mode: str, fields: list[str] | None, highlight: bool, generation: int):
+        index_name, query_text, k, model_id = cache_key[:4]
+        vector = None
+        if mode == "knn":
+            vector = (await self.embed_queries([query_text], model_id)).get(normalize_query(query_text))
+            if vector is None:
+                return None
+        target = resolve(index_name)
+        query = build_search_query(query_text, k, model_id, mode, vector, tenant_filter(target))
+        if highlight:
+            query["highlight"] = build_highlight(query_text)
+        try:
+            with metrics.SEARCH_QUERY_LATENCY.labels(mode=mode).time(), metrics.observe_operation("search"):
+                response = await self.client.search(
+                    index=target.index,
+                    body=query,
+                    routing=target.routing,
+                    **search_source_params(target, fields, highlight),
+                )
+            metrics.observe_took("search", response)
+            return search_hits(cache_key, response["hits"]["hits"], mode, generation)
+        except Exception as e:
+            self._logger.error("Error occured during semantic search", exc_info=True)
+            return None
+
+    async def semantic_search_batch(
+        self,
+        searches: list[dict],
+        model_id: str | None = None,
+        mode: str | None = None,
+    ) -> list[dict] | None:
+        mode = mode or settings.SEARCH_MODE
+        self._logger.info(f"Semantic search batch, {len(searches)} queries, mode = {mode}")
+        model_id = await self._resolve_model_id(model_id)
+        if not model_id:
+            return None
+
+        results: list[dict | None] = [None] * len(searches)
+        pending, generations = pending_searches(searches, model_id, results)
+        if not pending:
+            return results
+
+        vectors = {}
+        if mode == "knn":
+            vectors = await self.embed_queries([searches[position]["query"] for position, _ in pending], model_id)
+
+        body, sent, errors = build_msearch_body(pending, mode, vectors)
+        for position, error in errors.items():
+            results[position] = error
+        if not sent:
+            return results
+
+        try:
+            with metrics.SEARCH_QUERY_LATENCY.labels(mode=mode).time(), metrics.observe_operation("msearch"):
+                response = await self.client.msearch(body=body)
+        except Exception as e:
+            self._logger.error("Error occured during semantic search batch", exc_info=True)
+            for position, _ in sent:
+                results[position] = {"error": str(e)}
+            return results
+
+        metrics.observe_took("msearch", response)
+        msearch_results(sent, response, generations, mode, results)
+        return results
+
+    async def index_exists(self, index_name: str, use_cache: bool = True):
+        index_name = resolve(index_name).index
+        cache_key = ("index", index_name)
+        if use_cache and _metadata_cache.get(cache_key) is True:
+            return True
+
+        with metrics.observe_operation("index_exists"):
+            exists = await self.client.indices.exists(index=index_name)
+        if exists:
+            _metadata_cache.set(cache_key, True, ttl=settings.INDEX_CACHE_TTL)
+        return exists
+
+    async def create_index(self, index_name: str, body: dict | None = None, profile: str | None = None):
+        target = resolve(index_name)
+        self._logger.info(f"Create KNN index, index_name = {target.index}, profile = {profile or settings.INDEX_PROFILE}")
+        response = await self._perform_request("PUT", f"/{target.index}", body=body or index_body(target, profile), operation="create_index")
+        self.invalidate_index_cache(target.index)
+        return response
+
+    async def list_documents(
+        self,
+        index_name: str,
+        page_size: int = settings.DOCUMENTS_PAGE_SIZE,
+        after: str | None = None,
+        with_stats: bool = False,
+    ) -> tuple[list, str | None] | None:
+        target = resolve(index_name)
+        body = build_documents_query(page_size, after, with_stats, filter=tenant_filter(target))
+        try:
+            with metrics.observe_operation("list_documents"):
+                response = await self.client.search(index=target.index, body=body, routing=target.routing)
+        except Exception as e:
+            self._forget_missing_index(target.index, e)
+            self._logger.error(f"Error listing documents from index {index_name}", exc_info=True)
+            return None
+        metrics.observe_took("list_documents", response)
+        return parse_documents_page(response, page_size, with_stats)
+
+    async def get_documents_from_index(self, index_name: str, with_stats: bool = False):
+        documents = []
+        after = None
+        while True:
+            page = await self.list_documents(index_name, after=after, with_stats=with_stats)
+            if page is None:
+                return None, 404
+            docs, after = page
+            documents.extend(docs)
+            if after is None:
+                return documents, 200
+
+    async def _index_meta(self, index: str) -> dict:
+        response = await self.client.indices.get_mapping(index=index)
+        return response[index]["mappings"].get("_meta", {})
+
+    async def _set_index_meta(self, index: str, key: str, value: dict | None) -> None:
+        meta = await self._index_meta(index)
+        await self.client.indices.put_mapping(index=index, body={"_meta": updated_meta(meta, key, value)})
+
+    async def _apply_bulk_load_settings(self, index: str) -> dict | None:
+        try:
+            with metrics.observe_operation("index_settings"):
+                current = await self.client.indices.get_settings(index=index, name=",".join(BULK_LOAD_SETTINGS), flat_settings=True)
+                meta = await self._index_meta(index)
+                original = bulk_load_original(current[index]["settings"], meta)
+                if BULK_LOAD_META not in meta:
+                    await self.client.indices.put_mapping(index=index, body={"_meta": updated_meta(meta, BULK_LOAD_META, {"settings": original})})
+                await self.client.indices.put_settings(index=index, body=BULK_LOAD_SETTINGS)
+            self._logger.info(f"Index {index} is in bulk-load mode, previous settings {original}")
+            return original
+        except Exception as e:
+            self._logger.error(f"Error switching index {index} to bulk-load mode", exc_info=True)
+            return None
+
+    async def _finish_bulk_load(self, index: str, original: dict | None, force_merge_segments: int) -> None:
+        if original is not None:
+            try:
+                with metrics.observe_operation("index_settings"):
+                    await self.client.indices.put_settings(index=index, body=original)
+                    await self._set_index_meta(index, BULK_LOAD_META, None)
+                self._logger.info(f"Restored settings {original} of index {index}")
+            except Exception as e:
+                self._logger.error(f"Error restoring settings {original} of index {index}", exc_info=True)
+        try:
+            with metrics.observe_operation("refresh"):
+                await self.client.indices.refresh(index=index)
+            if force_merge_segments:
+                with metrics.observe_operation("force_merge"):
+                    await self.client.indices.forcemerge(
+                        index=index,
+                        max_num_segments=force_merge_segments,
+                        request_timeout=settings.BULK_LOAD_FORCE_MERGE_TIMEOUT,
+                    )
+        except Exception as e:
+            self._logger.error(f"Error refreshing index {index} after bulk load", exc_info=True)
+
+    @asynccontextmanager
+    async def bulk_load_mode(self, index_name: str, force_merge_segments: int = settings.BULK_LOAD_FORCE_MERGE_SEGMENTS) -> AsyncIterator[None]:
+        """
+        See OpenSearchClient.bulk_load_mode.
+        """
+        target = resolve(index_name)
+        if target.shared:
+            self._logger.info(f"Index {target.index} is shared, bulk-load mode is not used")
+            yield
+            return
+        if bulk_loads.enter(target.index):
+            bulk_loads.set_original(target.index, await self._apply_bulk_load_settings(target.index))
+        try:
+            yield
+        finally:
+            last, original = bulk_loads.leave(target.index)
+            if last:
+                await self._finish_bulk_load(target.index, original, force_merge_segments)
+
+    async def index_activity(self) -> dict[str, dict] | None:
+        """
+        See OpenSearchClient.index_activity.
+        """
+        try:
+            with metrics.observe_operation("index_activity"):
+                index_settings = await self.client.indices.get_settings(
+                    index="_all", name="index.default_pipeline", flat_settings=True, expand_wildcards="all",
+                )
+                mappings = await self.client.indices.get_mapping(index="_all", expand_wildcards="all", filter_path="*.mappings._meta")
+                stats = await self.client.indices.stats(
+                    metric="search,indexing",
+                    filter_path="indices.*.total.search.query_total,indices.*.total.indexing.index_total",
+                )
+        except Exception as e:
+            self._logger.error("Error reading the activity of the indices", exc_info=True)
+            return None
+        return parse_index_activity(index_settings, mappings or {}, stats or {})
+
+    async def index_memory(self, index: str) -> int:
+        """
+        See OpenSearchClient.index_memory.
+        """
+        try:
+            with metrics.observe_operation("index_memory"):
+                stats = await self.client.indices.stats(index=index, metric="segments")
+                knn_stats = await self.client.transport.perform_request("GET", "/_plugins/_knn/stats/indices_in_cache")
+        except Exception as e:
+            self._logger.warning(f"Could not read the memory used by index {index}", exc_info=True)
+            return 0
+        return index_memory_bytes(index, stats, knn_stats)
+
+    async def lifecycle_state(self, index: str) -> dict | None:
+        """
+        See OpenSearchClient.lifecycle_state.
+        """
+        try:
+            with metrics.observe_operation("lifecycle_state"):
+                response = await self.client.cluster.state(
+                    metric="metadata", index=index,
+                    filter_path="metadata.indices.*.state,metadata.indices.*.mappings.*._meta",
+                )
+        except NotFoundError:
+            return None
+        except Exception as e:
+            self._logger.error(f"Error reading the lifecycle state of index {index}", exc_info=True)
+            return None
+        return parse_lifecycle_state(index, response)
+
+    async def _evict_knn_graphs(self, index: str) -> None:
+        try:
+            with metrics.observe_operation("knn_clear_cache"):
+                await self.client.transport.perform_request("POST", f"/_plugins/_knn/clear_cache/{index}")
+        except Exception as e:
+            self._logger.warning(f"Could not evict the kNN graphs of index {index}", exc_info=True)
+
+    async def _warm_up_knn_graphs(self, index: str) -> None:
+        try:
+            with metrics.observe_operation("knn_warmup"):
+                await self.client.transport.perform_request(
+                    "GET", f"/_plugins/_knn/warmup/{index}", params={"request_timeout": settings.LIFECYCLE_RESTORE_TIMEOUT},
+                )
+        except Exception as e:
+            self._logger.warning(f"Could not load the kNN graphs of index {index}", exc_info=True)
+
+    async def deactivate_index(self, index: str, action: str, reclaimed_bytes: int = 0) -> bool:
+        """
+        See OpenSearchClient.deactivate_index.
+        """
+        marker = lifecycle_marker(action, reclaimed_bytes)
+        try:
+            with metrics.observe_operation("lifecycle_deactivate"):
+                if action == WARM:
+                    current = await self.client.indices.get_settings(
+                        index=index, name=",".join(settings.LIFECYCLE_WARM_SETTINGS), flat_settings=True,
+                    )
+                    marker["settings"] = {name: current[index]["settings"].get(name) for name in settings.LIFECYCLE_WARM_SETTINGS}
+                await self._set_index_meta(index, LIFECYCLE_META, marker)
+                if action == CLOSE:
+                    await self.client.indices.close(index=index)
+                elif action == WARM:
+                    await self.client.indices.put_settings(index=index, body=settings.LIFECYCLE_WARM_SETTINGS)
+        except Exception as e:
+            self._logger.error(f"Error deactivating index {index} ({action})", exc_info=True)
+            return False
+        if action in (EVICT, WARM):
+            await self._evict_knn_graphs(index)
+        return True
+
+    async def reactivate_index(self, index: str, state: dict) -> bool:
+        """
+        See OpenSearchClient.reactivate_index.
+        """
+        marker = state["lifecycle"]
+        try:
+            with metrics.observe_operation("lifecycle_restore"):
+                if state["state"] == CLOSED:
+                    await self.client.indices.open(index=index, request_timeout=settings.LIFECYCLE_RESTORE_TIMEOUT)
+                if marker.get("settings"):
+                    await self.client.indices.put_settings(index=index, body=marker["settings"])
+                await self._set_index_meta(index, LIFECYCLE_META, None)
+        except Exception as e:
+            self._logger.error(f"Error restoring index {index}", exc_info=True)
+            return False
+        await self._warm_up_knn_graphs(index)
+        return True
+
+    async def _stored_sources(self, actions: list[dict]) -> list[dict | None]:
+        keyed = [action for action in actions if action.get("_id")]
+        response = None
+        if keyed:
+            try:
+                with metrics.observe_operation("dedup_mget"):
+                    response = await self.client.mget(body=mget_body(keyed), _source_excludes=["embedding"])
+            except Exception as e:
+                self._logger.warning("Could not fetch stored chunks, indexing all of them", exc_info=True)
+        return stored_sources(actions, response)
+
+    async def _deduplicated(
+        self,
+        actions: AsyncIterable[dict],
+        summary: dict,
+        progress: Callable[[bool, dict], None] | None,
+    ) -> AsyncIterable[dict]:
+        """
+        See OpenSearchClient._deduplicated.
+        """
+        batch = []
+        async for action in actions:
+            batch.append(with_hash(action))
+            if len(batch) < settings.DEDUP_BATCH_SIZE:
+                continue
+            for kept in without_unchanged(batch, await self._stored_sources(batch), summary, progress):
+                yield kept
+            batch = []
+        if batch:
+            for kept in without_unchanged(batch, await self._stored_sources(batch), summary, progress):
+                yield kept
+
+    async def ingest_data_bulk(
+        self,
+        data: Iterable[dict] | AsyncIterable[dict],
+        raise_on_error: bool = True,
+        progress: Callable[[bool, dict], None] | None = None,
+        deduplicate: bool = settings.INGEST_DEDUP,
+        pace: Callable[[AsyncIterable[dict]], AsyncIterable[dict]] | None = None,
+    ):
+        """
+        See OpenSearchClient.ingest_data_bulk, `data` may also be an async iterable.
+        """
+        self._logger.info("Ingest data bulk")
+        if isinstance(data, list):
+            log_payload(self._logger, "Data to be uploaded:", data)
+        try:
+            summary = new_ingest_summary()
+            actions = _scoped_actions(data)
+            if deduplicate:
+                actions = self._deduplicated(actions, summary, progress)
+            if pace:
+                actions = pace(actions)
+            with metrics.observe_operation("bulk_ingest"):
+                async for ok, item in self.bulk_indexer.index(actions, raise_on_error=raise_on_error):
+                    count_ingest_result(summary, ok, item)
+                    if progress:
+                        progress(ok, item)
+            record_ingest_summary(summary)
+            self._logger.info(f"Performed bulk ingestion, {summary}, {self.bulk_indexer.stats()}")
+            return summary
+        except Exception as e:
+            self._logger.error("Error during bulk ingestion", exc_info=True)
+            return None
+
+    async def delete_document(self, index: str, filename: str):
+        self._logger.info(f"Delete document {filename}")
+        target = resolve(index)
+        try:
+            with metrics.observe_operation("delete_by_query"):
+                response = await self.client.delete_by_query(
+                    index=target.index,
+                    body=build_delete_document_query(target, filename),
+                    routing=target.routing,
+                )
+            metrics.observe_took("delete_by_query", response)
+            return response
+        except Exception as e:
+            self._forget_missing_index(target.index, e)
+            self._logger.error(f"Error deleting document {filename}", exc_info=True)
+            return None
+
+    async def delete_documents(self, index: str, filenames: list[str]) -> str | None:
+        self._logger.info(f"Delete {len(filenames)} documents from {index}")
+        target = resolve(index)
+        try:
+            with metrics.observe_operation("delete_by_query_submit"):
+                response = await self.client.delete_by_query(
+                    index=target.index,
+                    body=build_delete_documents_query(target, filenames),
+                    routing=target.routing,
+                    conflicts="proceed",
+                    slices="auto",
+                    wait_for_completion=False,
+                )
+            task_id = response["task"]
+            _delete_tasks.set(task_id, {"index": index, "completed": False})
+        except Exception as e:
+            self._forget_missing_index(target.index, e)
+            self._logger.error(f"Error submitting deletion of {filenames}", exc_info=True)
+            return None
+        try:
+            await self.client.index(index=settings.LOCK_INDEX, id=delete_task_record_id(task_id), body=build_delete_task_record(index))
+        except Exception as e:
+            self._logger.error(f"Error recording deletion task {task_id}, only this process can report it", exc_info=True)
+        return task_id
+
+    async def _issued_delete_task(self, task_id: str) -> dict | None:
+        issued = _delete_tasks.get(task_id)
+        if issued is not MISSING:
+            return issued
+        try:
+            response = await self.client.get(index=settings.LOCK_INDEX, id=delete_task_record_id(task_id))
+        except NotFoundError:
+            return None
+        except Exception as e:
+            self._logger.error(f"Error reading deletion task {task_id}", exc_info=True)
+            return None
+        issued = parse_delete_task_record(response)
+        if issued is not None:
+            _delete_tasks.set(task_id, issued)
+        return issued
+
+    async def get_delete_task(self, task_id: str, index: str) -> dict | None:
+        issued = await self._issued_delete_task(task_id)
+        if issued is None or issued["index"] != index:
+            return None
+        try:
+            with metrics.observe_operation("task_status"):
+                response = await self.client.tasks.get(task_id=task_id)
+        except NotFoundError:
+            return None
+        except Exception as e:
+            self._logger.error(f"Error getting task {task_id}", exc_info=True)
+            return None
+        summary = parse_delete_task(task_id, response)
+        if summary["completed"] and not issued["completed"]:
+            issued["completed"] = True
+            self.invalidate_search_cache(index)
+        return summary
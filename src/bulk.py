@@ -0,0 +1,417 @@
+""" Adaptive bulk indexing """
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from logging import Logger
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator
+from opensearchpy import AsyncOpenSearch, OpenSearch
+from opensearchpy.exceptions import ConnectionTimeout, TransportError
+from opensearchpy.helpers import BulkIndexError, expand_action
+from utils import get_logger
+from app import metrics, timing
+import settings
+
+# bulk item errors that mean "node is overloaded, try again later"
+REJECTED_ERROR_TYPES = {"es_rejected_execution_exception", "rejected_execution_exception"}
+# index settings while an index is in bulk-load mode: no refreshes (every refresh writes new
+# segments and HNSW graphs) and no replicas to copy every document to
+BULK_LOAD_SETTINGS = {"index.refresh_interval": "-1", "index.number_of_replicas": 0}
+# key in the _meta of the index mapping holding the settings to restore while any process bulk loads
+BULK_LOAD_META = "db_service_bulk_load"
+
+def bulk_load_original(current: dict, meta: dict) -> dict:
+    """
+    Settings to restore after a bulk load: the ones saved in the index _meta by a bulk load that is still
+    running in another process, otherwise the current ones. A current value equal to its bulk-load value is
+    left over from another bulk load and never taken as the original, it is restored to the default.
+    """
+    marker = meta.get(BULK_LOAD_META)
+    if marker:
+        return marker["settings"]
+    return {
+        name: None if str(current.get(name)) == str(value) else current.get(name)
+        for name, value in BULK_LOAD_SETTINGS.items()
+    }
+
+class BulkLoadTracker:
+    """
+    Counts the callers holding an index in bulk-load mode in this process, so the first one
+    changes the settings and the last one restores them, even when bulk loads overlap.
+    """
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # index -> [number of callers, settings before the first caller changed them]
+        self._entries: dict[str, list] = {}
+
+    def enter(self, index: str) -> bool:
+        """
+        Register a caller. Returns True for the first one, which has to apply the settings.
+        """
+        with self._lock:
+            entry = self._entries.setdefault(index, [0, None])
+            entry[0] += 1
+            return entry[0] == 1
+
+    def set_original(self, index: str, original: dict | None) -> None:
+        with self._lock:
+            self._entries[index][1] = original
+
+    def leave(self, index: str) -> tuple[bool, dict | None]:
+        """
+        Unregister a caller. Returns (last caller, original settings), the last one restores them.
+        """
+        with self._lock:
+            entry = self._entries[index]
+            entry[0] -= 1
+            if entry[0]:
+                return False, None
+            del self._entries[index]
+            return True, entry[1]
+
+bulk_loads = BulkLoadTracker()
+
+class _Batch:
+    def __init__(self) -> None:
+        # (action, data, serialized lines) per document
+        self.items: list[tuple[dict, dict | None, list[str]]] = []
+        self.bytes = 0
+        self.serialize_seconds = 0.0
+
+    def add(self, action: dict, data: dict | None, lines: list[str], size: int, serialize_seconds: float = 0.0) -> None:
+        self.items.append((action, data, lines))
+        self.bytes += size
+        self.serialize_seconds += serialize_seconds
+
+    def body(self) -> str:
+        return "".join(line + "\n" for _, _, lines in self.items for line in lines)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+class _AdaptiveBulk:
+    """
+    Batching, response handling and tuning shared by AdaptiveBulkIndexer and
+    AsyncAdaptiveBulkIndexer, the subclasses only send the requests.
+    """
+    def __init__(
+        self,
+        client: OpenSearch | AsyncOpenSearch,
+        initial_batch_docs: int = settings.BULK_INITIAL_BATCH_DOCS,
+        min_batch_docs: int = settings.BULK_MIN_BATCH_DOCS,
+        max_batch_docs: int = settings.BULK_MAX_BATCH_DOCS,
+        max_batch_bytes: int = settings.BULK_MAX_BATCH_BYTES,
+        initial_parallelism: int = settings.BULK_INITIAL_PARALLELISM,
+        max_parallelism: int = settings.BULK_MAX_PARALLELISM,
+        target_latency: float = settings.BULK_TARGET_LATENCY,
+        max_retries: int = settings.BULK_MAX_RETRIES,
+        initial_backoff: float = settings.BULK_INITIAL_BACKOFF,
+        max_backoff: float = settings.BULK_MAX_BACKOFF,
+        request_timeout: int = settings.BULK_REQUEST_TIMEOUT,
+        logger: Logger = None,
+    ) -> None:
+        self.client = client
+        self.batch_docs = initial_batch_docs
+        self.min_batch_docs = min_batch_docs
+        self.max_batch_docs = max_batch_docs
+        self.max_batch_bytes = max_batch_bytes
+        self.parallelism = min(initial_parallelism, max_parallelism)
+        self.max_parallelism = max_parallelism
+        self.target_latency = target_latency
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.request_timeout = request_timeout
+        self._logger = logger or get_logger("bulk-indexer", stdout=True)
+        self._in_flight = 0
+        self._fast_batches = 0
+
+    def stats(self) -> dict:
+        return {
+            "batch_docs": self.batch_docs,
+            "parallelism": self.parallelism,
+            "in_flight": self._in_flight,
+        }
+
+    def _serialize(self, action: dict) -> tuple[dict, dict | None, list[str], int, float]:
+        started = time.perf_counter()
+        serializer = self.client.transport.serializer
+        action, data = expand_action(action)
+        lines = [serializer.dumps(action)]
+        if data is not None:
+            lines.append(serializer.dumps(data))
+        size = sum(len(line.encode("utf-8")) + 1 for line in lines)
+        return action, data, lines, size, time.perf_counter() - started
+
+    def _full(self, batch: _Batch, size: int) -> bool:
+        return bool(batch) and (len(batch) >= self.batch_docs or batch.bytes + size > self.max_batch_bytes)
+
+    @staticmethod
+    def _completed(batch: _Batch) -> _Batch:
+        metrics.OPENSEARCH_OPERATION_LATENCY.labels(operation="bulk_serialize").observe(batch.serialize_seconds)
+        timing.record("bulk_serialize", batch.serialize_seconds)
+        return batch
+
+    @staticmethod
+    def _request_body(batch: _Batch) -> str:
+        metrics.BULK_BATCH_DOCS.observe(len(batch))
+        metrics.BULK_BATCH_BYTES.observe(batch.bytes)
+        return batch.body()
+
+    @staticmethod
+    def _checked(results: list[tuple[bool, dict]], raise_on_error: bool) -> list[tuple[bool, dict]]:
+        if raise_on_error:
+            errors = [item for ok, item in results if not ok]
+            if errors:
+                raise BulkIndexError(f"{len(errors)} document(s) failed to index.", errors)
+        return results
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self.max_backoff, self.initial_backoff * 2 ** attempt)
+        return delay * random.uniform(0.5, 1.0)
+
+    def _retry_request(self, batch: _Batch, error: TransportError, attempt: int, latency: float) -> bool:
+        """
+        Whether a bulk request that failed as a whole is sent again: only 429 and timeouts, while retries are left.
+        """
+        retryable = error.status_code == 429 or isinstance(error, ConnectionTimeout)
+        self._adjust(latency, rejected=retryable)
+        if retryable and attempt < self.max_retries:
+            self._logger.warning(f"Bulk request of {len(batch)} documents rejected ({error.status_code}), retrying")
+            return True
+        return False
+
+    def _collect(self, batch: _Batch, response: dict, attempt: int, latency: float) -> tuple[list[tuple[bool, dict]], _Batch]:
+        """
+        (ok, item) for every document of the bulk response, and the batch of rejected documents to retry.
+        """
+        metrics.observe_took("bulk", response)
+        results = []
+        retry = _Batch()
+        for (action, data, lines), response_item in zip(batch.items, response["items"]):
+            op_type, item = response_item.popitem()
+            status = item.get("status", 500)
+            if self._is_rejected(item) and attempt < self.max_retries:
+                retry.add(action, data, lines, sum(len(line.encode("utf-8")) + 1 for line in lines))
+                continue
+            ok = 200 <= status < 300
+            if not ok and data is not None:
+                item["data"] = data
+            results.append((ok, {op_type: item}))
+
+        self._adjust(latency, rejected=bool(retry))
+        if retry:
+            metrics.BULK_REJECTED_ITEMS_TOTAL.inc(len(retry))
+            self._logger.warning(f"{len(retry)} of {len(batch)} bulk items rejected, retrying")
+        return results, retry
+
+    @staticmethod
+    def _is_rejected(item: dict) -> bool:
+        error = item.get("error")
+        error_type = error.get("type") if isinstance(error, dict) else None
+        return item.get("status") == 429 or error_type in REJECTED_ERROR_TYPES
+
+    def _batch_error(self, batch: _Batch, error: TransportError) -> list[tuple[bool, dict]]:
+        self._logger.error(f"Bulk request of {len(batch)} documents failed: {error}")
+        results = []
+        for action, data, _ in batch.items:
+            op_type, meta = action.copy().popitem()
+            info = {"error": str(error), "status": error.status_code, "exception": error}
+            if data is not None:
+                info["data"] = data
+            info.update(meta)
+            results.append((False, {op_type: info}))
+        return results
+
+    def _adjust(self, latency: float, rejected: bool) -> None:
+        if rejected:
+            self.batch_docs = max(self.min_batch_docs, self.batch_docs // 2)
+            self.parallelism = max(1, self.parallelism - 1)
+            self._fast_batches = 0
+        elif latency > self.target_latency:
+            self.batch_docs = max(self.min_batch_docs, int(self.batch_docs * 0.75))
+            self._fast_batches = 0
+        else:
+            self.batch_docs = min(self.max_batch_docs, self.batch_docs + max(1, self.batch_docs // 4))
+            self._fast_batches += 1
+            # only add a concurrent request after a streak of fast batches
+            if self._fast_batches >= 4 and self.parallelism < self.max_parallelism:
+                self.parallelism += 1
+                self._fast_batches = 0
+
+class AdaptiveBulkIndexer(_AdaptiveBulk):
+    """
+    Bulk indexer that sizes batches by document count and bytes and adapts batch size and
+    the number of concurrent bulk requests to the observed latency and rejections.
+
+    Batch size grows additively while requests stay under the target latency and is halved
+    (together with the parallelism) on 429 / rejected execution. Rejected documents are retried
+    with exponential backoff. The limits are shared by every caller of the same indexer, so
+    concurrent uploads in one process cannot overload the ML node together.
+    """
+    def __init__(self, client: OpenSearch, **options) -> None:
+        super().__init__(client, **options)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_parallelism, thread_name_prefix="bulk")
+        self._slots = threading.Condition()
+
+    def index(self, actions: Iterable[dict], raise_on_error: bool = True) -> Iterator[tuple[bool, dict]]:
+        """
+        Index the actions and yield (ok, item) for every one of them, like helpers.streaming_bulk.
+        Actions are consumed lazily, at most `parallelism` batches are held in memory.
+        """
+        pending: set[Future] = set()
+        try:
+            for batch in self._batches(actions):
+                self._acquire_slot()
+                try:
+                    future = self._executor.submit(self._send_batch, batch)
+                except BaseException:
+                    self._release_slot()
+                    raise
+                pending.add(future)
+                done = {future for future in pending if future.done()}
+                pending -= done
+                for future in done:
+                    yield from self._checked(future.result(), raise_on_error)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from self._checked(future.result(), raise_on_error)
+        finally:
+            for future in pending:
+                # a batch cancelled before it started never reaches _send_batch to release its slot
+                if future.cancel():
+                    self._release_slot()
+
+    def _batches(self, actions: Iterable[dict]) -> Iterator[_Batch]:
+        batch = _Batch()
+        for action in actions:
+            item = self._serialize(action)
+            if self._full(batch, item[3]):
+                yield self._completed(batch)
+                batch = _Batch()
+            batch.add(*item)
+        if batch:
+            yield self._completed(batch)
+
+    def _acquire_slot(self) -> None:
+        with self._slots:
+            while self._in_flight >= self.parallelism:
+                self._slots.wait()
+            self._in_flight += 1
+
+    def _release_slot(self) -> None:
+        with self._slots:
+            self._in_flight -= 1
+            self._slots.notify_all()
+
+    def _send_batch(self, batch: _Batch) -> list[tuple[bool, dict]]:
+        try:
+            return self._send_with_retries(batch)
+        finally:
+            self._release_slot()
+
+    def _send_with_retries(self, batch: _Batch) -> list[tuple[bool, dict]]:
+        results: list[tuple[bool, dict]] = []
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(self._backoff(attempt - 1))
+            started = time.perf_counter()
+            try:
+                with metrics.observe_operation("bulk"):
+                    response = self.client.bulk(body=self._request_body(batch), request_timeout=self.request_timeout)
+            except TransportError as e:
+                if self._retry_request(batch, e, attempt, time.perf_counter() - started):
+                    continue
+                return results + self._batch_error(batch, e)
+            done, batch = self._collect(batch, response, attempt, time.perf_counter() - started)
+            results += done
+            if not batch:
+                break
+        return results
+
+    def _adjust(self, latency: float, rejected: bool) -> None:
+        with self._slots:
+            super()._adjust(latency, rejected)
+            self._slots.notify_all()
+
+class AsyncAdaptiveBulkIndexer(_AdaptiveBulk):
+    """
+    asyncio counterpart of AdaptiveBulkIndexer: the batches are sent by tasks instead of threads,
+    with the same batching, retries and limits. Use from one event loop.
+    """
+    def __init__(self, client: AsyncOpenSearch, **options) -> None:
+        super().__init__(client, **options)
+        self._slot_freed = asyncio.Event()
+
+    async def index(self, actions: AsyncIterable[dict], raise_on_error: bool = True) -> AsyncIterator[tuple[bool, dict]]:
+        """
+        See AdaptiveBulkIndexer.index.
+        """
+        pending: set[asyncio.Task] = set()
+        try:
+            async for batch in self._batches(actions):
+                await self._acquire_slot()
+                task = asyncio.ensure_future(self._send_with_retries(batch))
+                # released by a callback, a task cancelled before it started never runs a finally block
+                task.add_done_callback(self._release_slot)
+                pending.add(task)
+                done = {task for task in pending if task.done()}
+                pending -= done
+                for task in done:
+                    for result in self._checked(task.result(), raise_on_error):
+                        yield result
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    for result in self._checked(task.result(), raise_on_error):
+                        yield result
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _batches(self, actions: AsyncIterable[dict]) -> AsyncIterator[_Batch]:
+        batch = _Batch()
+        async for action in actions:
+            item = self._serialize(action)
+            if self._full(batch, item[3]):
+                yield self._completed(batch)
+                batch = _Batch()
+            batch.add(*item)
+        if batch:
+            yield self._completed(batch)
+
+    async def _acquire_slot(self) -> None:
+        while self._in_flight >= self.parallelism:
+            self._slot_freed.clear()
+            await self._slot_freed.wait()
+        self._in_flight += 1
+
+    def _release_slot(self, task: asyncio.Task | None = None) -> None:
+        self._in_flight -= 1
+        self._slot_freed.set()
+
+    async def _send_with_retries(self, batch: _Batch) -> list[tuple[bool, dict]]:
+        results: list[tuple[bool, dict]] = []
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                await asyncio.sleep(self._backoff(attempt - 1))
+            started = time.perf_counter()
+            try:
+                with metrics.observe_operation("bulk"):
+                    response = await self.client.bulk(body=self._request_body(batch), request_timeout=self.request_timeout)
+            except TransportError as e:
+                if self._retry_request(batch, e, attempt, time.perf_counter() - started):
+                    continue
+                return results + self._batch_error(batch, e)
+            done, batch = self._collect(batch, response, attempt, time.perf_counter() - started)
+            results += done
+            if not batch:
+                break
+        return results
+
+    def _adjust(self, latency: float, rejected: bool) -> None:
+        super()._adjust(latency, rejected)
+        # a grown parallelism admits waiting batches
+        self._slot_freed.set()
@@ -0,0 +1,102 @@
+""" Content-hash deduplication of bulk actions, so only new or modified chunks reach the embedding model """
+import hashlib
+from typing import Callable, Iterable, Iterator
+from tenancy import TENANT_FIELD
+
+HASH_FIELD = "text_hash"
+# stored fields the service adds itself, not part of the uploaded chunk
+INTERNAL_FIELDS = {HASH_FIELD, TENANT_FIELD, "embedding"}
+# OpenSearch reports updates that change nothing with this result, unchanged chunks reuse it
+NOOP = "noop"
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def action_source(action: dict) -> dict:
+    if isinstance(action.get("_source"), dict):
+        return action["_source"]
+    return {key: value for key, value in action.items() if not key.startswith("_")}
+
+def with_hash(action: dict) -> dict:
+    """
+    The action with the hash of its text added to the document, actions without text are returned as is.
+    """
+    text = action_source(action).get("text")
+    if not isinstance(text, str) or action.get("_op_type", "index") not in ("index", "create"):
+        return action
+    if isinstance(action.get("_source"), dict):
+        return action | {"_source": action["_source"] | {HASH_FIELD: content_hash(text)}}
+    return action | {HASH_FIELD: content_hash(text)}
+
+def batched(actions: Iterable[dict], size: int) -> Iterator[list[dict]]:
+    batch = []
+    for action in actions:
+        batch.append(action)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def mget_body(actions: list[dict]) -> dict:
+    return {
+        "docs": [
+            {"_index": action["_index"], "_id": action["_id"]}
+            | ({"routing": action["_routing"]} if action.get("_routing") else {})
+            for action in actions
+        ]
+    }
+
+def stored_sources(actions: list[dict], response: dict | None) -> list[dict | None]:
+    """
+    The stored source of every action's document from the mget response, None if missing or if there is no response.
+    """
+    found = {(doc["_index"], doc["_id"]): doc["_source"] for doc in (response or {}).get("docs", []) if doc.get("found")}
+    return [found.get((action["_index"], action.get("_id"))) for action in actions]
+
+def plan(actions: list[dict], existing: list[dict | None]) -> Iterator[tuple[str, dict]]:
+    """
+    Compare hashed actions with the stored documents (same order, None if missing) and yield
+    ("index", action) for new or modified text, ("update", partial update) when only metadata
+    changed and (NOOP, action) when nothing changed. A chunk that drops a stored field is indexed
+    again, a partial update would keep the old value.
+    """
+    for action, stored in zip(actions, existing):
+        source = action_source(action)
+        if stored is None or HASH_FIELD not in source or stored.get(HASH_FIELD) != source[HASH_FIELD]:
+            yield "index", action
+            continue
+        if set(stored) - set(source) - INTERNAL_FIELDS:
+            yield "index", action
+            continue
+        changed = {key: value for key, value in source.items() if stored.get(key) != value and key != TENANT_FIELD}
+        if not changed:
+            yield NOOP, action
+            continue
+        update = {"_op_type": "update", "_index": action["_index"], "_id": action["_id"], "doc": changed}
+        if action.get("_routing"):
+            update["_routing"] = action["_routing"]
+        yield "update", update
+
+def noop_item(action: dict) -> dict:
+    """
+    Bulk-style result item for a chunk that was not sent, for progress callbacks.
+    """
+    return {NOOP: {"_index": action["_index"], "_id": action["_id"], "result": NOOP, "status": 200}}
+
+def without_unchanged(
+    actions: list[dict],
+    existing: list[dict | None],
+    summary: dict,
+    progress: Callable[[bool, dict], None] | None,
+) -> Iterator[dict]:
+    """
+    The planned actions to send. Unchanged chunks are counted in summary["unchanged"] and reported to `progress`.
+    """
+    for kind, action in plan(actions, existing):
+        if kind == NOOP:
+            summary["unchanged"] += 1
+            if progress:
+                progress(True, noop_item(action))
+            continue
+        yield action
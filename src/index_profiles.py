@@ -0,0 +1,79 @@
+""" Named kNN index profiles: engine, space, HNSW parameters, quantization and on-disk mode """
+import json
+from functools import lru_cache
+from typing import NamedTuple
+import settings
+
+ENGINES = ("lucene", "faiss", "nmslib")
+# quantization type -> engine that supports it
+QUANTIZATION_ENGINES = {"byte": "lucene", "fp16": "faiss"}
+
+class IndexProfile(NamedTuple):
+    name: str
+    engine: str
+    space_type: str
+    m: int | None = None
+    ef_construction: int | None = None
+    ef_search: int | None = None
+    quantization: str | None = None       # "byte" (lucene int7) or "fp16" (faiss)
+    mode: str | None = None               # "on_disk" keeps full precision vectors out of memory
+    compression_level: str | None = None
+    description: str = ""
+
+    def validate(self) -> "IndexProfile":
+        if self.engine not in ENGINES:
+            raise ValueError(f"Profile {self.name}: unknown engine {self.engine}")
+        if self.quantization and QUANTIZATION_ENGINES.get(self.quantization) != self.engine:
+            raise ValueError(f"Profile {self.name}: {self.quantization} quantization needs the "
+                             f"{QUANTIZATION_ENGINES.get(self.quantization, 'a supported')} engine")
+        if self.mode == "on_disk" and self.engine != "faiss":
+            raise ValueError(f"Profile {self.name}: on_disk mode needs the faiss engine")
+        if self.ef_search and self.engine == "lucene":
+            # lucene sizes the candidate queue from k at query time, there is no index setting
+            raise ValueError(f"Profile {self.name}: ef_search is not an index setting for lucene")
+        return self
+
+    def embedding_mapping(self) -> dict:
+        parameters = {}
+        if self.m:
+            parameters["m"] = self.m
+        if self.ef_construction:
+            parameters["ef_construction"] = self.ef_construction
+        if self.quantization == "byte":
+            parameters["encoder"] = {"name": "sq"}
+        elif self.quantization == "fp16":
+            parameters["encoder"] = {"name": "sq", "parameters": {"type": "fp16"}}
+
+        mapping = {
+            "type": "knn_vector",
+            "dimension": settings.EMBEDDING_DIMENSION,
+            "method": {
+                "engine": self.engine,
+                "space_type": self.space_type,
+                "name": "hnsw",
+                "parameters": parameters,
+            },
+        }
+        if self.mode:
+            mapping["mode"] = self.mode
+        if self.compression_level:
+            mapping["compression_level"] = self.compression_level
+        return mapping
+
+@lru_cache(maxsize=1)
+def load_profiles() -> dict[str, IndexProfile]:
+    filepath = settings.OPENSEARCH_CONFIG_DIR / "index-profiles.json"
+    return {
+        name: IndexProfile(name=name, **options).validate()
+        for name, options in json.loads(filepath.read_text()).items()
+    }
+
+def get_profile(name: str | None = None) -> IndexProfile:
+    """
+    The named profile, settings.INDEX_PROFILE by default. Raises KeyError for unknown names.
+    """
+    name = name or settings.INDEX_PROFILE
+    profiles = load_profiles()
+    if name not in profiles:
+        raise KeyError(f"Unknown index profile {name}, expected one of {list(profiles)}")
+    return profiles[name]
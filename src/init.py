@@ -1,25 +1,211 @@
 """ OpenSearch setup """
-from opensearch_client import OpenSearchClient
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from opensearch_client import OpenSearchClient, model_deployed_on_all_nodes
+from utils import get_logger
+from app import metrics
 import settings
 
-def setup_opensearch():
-    client = OpenSearchClient()
+BOOTSTRAP_LOCK = "bootstrap"
 
-    # Update ML-related cluster settings
-    cluster_settings_filepath = (settings.OPENSEARCH_CONFIG_DIR / "cluster-settings.json").as_posix()
-    cluster_settings = client._load_json_config(cluster_settings_filepath)
-    client._update_cluster_settings(cluster_settings)
+logger = get_logger("bootstrap", stdout=True)
 
-    # Register a model group
-    model_group_id = client.register_model_group("Model group", "NLP model group")
+class BootstrapState:
+    """
+    Progress of the cluster bootstrap in this process, reported by the readiness endpoint.
+    """
+    def __init__(self) -> None:
+        self.status = "pending"
+        self.model_id = None
+        self.error = None
+        self.attempts = 0
+        self.started_at = None
+        self.ready_at = None
+        self.warmup = None
 
-    # Register a model to the model group
-    model_id = client.register_model(settings.MODEL_URL, "1.0.1", "Model group")
-    settings.MODEL_ID = model_id
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
 
-    # # Deploy the model
-    client.deploy_model(model_id)
+    def to_dict(self) -> dict:
+        return {
+            "status": self.status,
+            "model_id": self.model_id,
+            "error": self.error,
+            "attempts": self.attempts,
+            "startup_seconds": self.ready_at - self.started_at if self.ready_at else None,
+            "warmup": self.warmup,
+        }
 
-    # Create an ingest pipeline
-    client.create_ingest_pipeline(settings.PIPELINE_NAME, "NLP ingest pipeline", model_id)
+bootstrap_state = BootstrapState()
 
+def _apply_cluster_settings(client: OpenSearchClient) -> None:
+    filepath = (settings.OPENSEARCH_CONFIG_DIR / "cluster-settings.json").as_posix()
+    desired = json.loads(client._load_json_config(filepath))
+    current = client.get_cluster_settings()
+    if all(current.get(key) == value for key, value in desired["persistent"].items()):
+        logger.info("Cluster settings are up to date")
+        return
+    client._update_cluster_settings(desired)
+
+def _pipeline_uses_model(client: OpenSearchClient, model_id: str) -> bool:
+    pipeline = client.get_ingest_pipeline(settings.PIPELINE_NAME)
+    if not pipeline:
+        return False
+    return any(
+        processor.get("text_embedding", {}).get("model_id") == model_id
+        for processor in pipeline.get("processors", [])
+    )
+
+def _bootstrapped_model_id(client: OpenSearchClient) -> str | None:
+    """
+    The model id if the model is deployed and the ingest pipeline uses it, i.e. nothing is left to do.
+    """
+    model = client.get_model(settings.MODEL_URL, settings.MODEL_GROUP_NAME, verbose=False, use_cache=False)
+    if not model or not model_deployed_on_all_nodes(model["_source"]):
+        return None
+    if not _pipeline_uses_model(client, model["_id"]):
+        return None
+    return model["_id"]
+
+def setup_opensearch(client: OpenSearchClient | None = None) -> str | None:
+    """
+    Bring the cluster into the state the service needs and return the deployed model id, or None.
+    Steps whose state already matches are skipped. Only one process per cluster runs the
+    steps, the others wait for it to finish.
+    """
+    client = client or OpenSearchClient()
+
+    model_id = _bootstrapped_model_id(client)
+    if model_id:
+        logger.info(f"Cluster is already bootstrapped, model id {model_id}")
+        return model_id
+
+    owner = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    if not client.acquire_lock(BOOTSTRAP_LOCK, owner, settings.BOOTSTRAP_LOCK_TTL):
+        logger.info("Another process is bootstrapping the cluster, waiting for it")
+        return client._poll(lambda: _bootstrapped_model_id(client), "cluster bootstrap by another process")
+
+    try:
+        # Update ML-related cluster settings
+        _apply_cluster_settings(client)
+
+        # Register a model group
+        client.register_model_group(settings.MODEL_GROUP_NAME, "NLP model group")
+
+        # Register a model to the model group
+        model_id = client.register_model(settings.MODEL_URL, "1.0.1", settings.MODEL_GROUP_NAME)
+        if not model_id:
+            return None
+
+        # Deploy the model
+        if not client.ensure_model_deployed(model_id):
+            return None
+
+        # Create an ingest pipeline
+        if _pipeline_uses_model(client, model_id):
+            logger.info(f"Ingest pipeline {settings.PIPELINE_NAME} is up to date")
+        elif not client.create_ingest_pipeline(settings.PIPELINE_NAME, "NLP ingest pipeline", model_id):
+            return None
+        return model_id
+    finally:
+        client.release_lock(BOOTSTRAP_LOCK, owner)
+
+def _latency_summary(latencies: list[float]) -> dict | None:
+    if not latencies:
+        return None
+    ordered = sorted(latencies)
+    return {
+        "count": len(latencies),
+        "first_ms": round(latencies[0] * 1000, 1),
+        "last_ms": round(latencies[-1] * 1000, 1),
+        "p50_ms": round(ordered[len(ordered) // 2] * 1000, 1),
+        "max_ms": round(ordered[-1] * 1000, 1),
+    }
+
+def warm_up(client: OpenSearchClient, model_id: str) -> dict | None:
+    """
+    Send the warm-up queries through the predict API and as neural queries, so the model and
+    the search path are hot before the first user request. Returns the observed latencies,
+    or None if an inference failed.
+    """
+    model = client.get_model_by_id(model_id) or {}
+    rounds = settings.WARMUP_ROUNDS_PER_NODE * max(1, model.get("current_worker_node_count") or 1)
+    if settings.WARMUP_INDEX and not client.index_exists(settings.WARMUP_INDEX):
+        client.create_index(settings.WARMUP_INDEX)
+
+    predict, neural = [], []
+    for _ in range(rounds):
+        for query in settings.WARMUP_QUERIES:
+            started = time.perf_counter()
+            if client.predict_embeddings([query], model_id) is None:
+                logger.error(f"Warm-up inference failed for model {model_id}")
+                return None
+            predict.append(time.perf_counter() - started)
+
+            if settings.WARMUP_INDEX:
+                started = time.perf_counter()
+                if not client.warm_up_search(settings.WARMUP_INDEX, query, model_id):
+                    return None
+                neural.append(time.perf_counter() - started)
+
+    report = {"rounds": rounds, "predict": _latency_summary(predict), "neural": _latency_summary(neural)}
+    logger.info(f"Model warm-up finished: {report}")
+    return report
+
+def run_bootstrap() -> None:
+    """
+    Retry setup_opensearch with exponential backoff until the cluster is ready.
+    """
+    bootstrap_state.started_at = time.monotonic()
+    delay = settings.ML_POLL_INITIAL_INTERVAL
+    while True:
+        bootstrap_state.status = "running"
+        bootstrap_state.attempts += 1
+        client = None
+        try:
+            client = OpenSearchClient()
+            model_id = setup_opensearch(client)
+            bootstrap_state.error = None if model_id else "Bootstrap did not complete"
+            if model_id and settings.WARMUP_ENABLED and settings.WARMUP_QUERIES:
+                bootstrap_state.status = "warming_up"
+                bootstrap_state.warmup = warm_up(client, model_id)
+                if bootstrap_state.warmup is None:
+                    model_id = None
+                    bootstrap_state.error = "Model warm-up failed"
+        except Exception as e:
+            logger.error("Bootstrap failed", exc_info=True)
+            model_id = None
+            bootstrap_state.error = str(e)
+        finally:
+            # the pool metrics only report the clients that keep serving
+            if client is not None:
+                metrics.CONNECTION_POOLS.unregister(client)
+
+        if model_id:
+            settings.MODEL_ID = model_id
+            bootstrap_state.model_id = model_id
+            bootstrap_state.ready_at = time.monotonic()
+            bootstrap_state.status = "ready"
+            logger.info(f"OpenSearch is ready after {bootstrap_state.ready_at - bootstrap_state.started_at:.1f} seconds")
+            return
+
+        bootstrap_state.status = "failed"
+        logger.warning(f"Bootstrap attempt {bootstrap_state.attempts} failed, retrying in {delay:.1f} seconds")
+        time.sleep(delay)
+        delay = min(delay * 2, settings.BOOTSTRAP_MAX_RETRY_INTERVAL)
+
+def start_bootstrap() -> threading.Thread:
+    """
+    Run the bootstrap on a background thread so the app can serve liveness checks meanwhile.
+    """
+    thread = threading.Thread(target=run_bootstrap, name="opensearch-bootstrap", daemon=True)
+    thread.start()
+    return thread
+
+if __name__ == "__main__":
+    run_bootstrap()
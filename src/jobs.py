@@ -0,0 +1,238 @@
+""" Background ingestion jobs """
+import asyncio
+import contextvars
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import nullcontext
+from logging import Logger
+from typing import Callable
+from dedup import NOOP
+from opensearch_client import OpenSearchClient
+from utils import get_logger
+import settings
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+class IngestJob:
+    def __init__(self, index_name: str, actions: list[dict], bulk_load: bool = False, pace: Callable | None = None) -> None:
+        self.id = uuid.uuid4().hex
+        self.index_name = index_name
+        self.actions = actions
+        self.bulk_load = bulk_load
+        self.pace = pace
+        self.total = len(actions)
+        self.indexed = 0
+        self.unchanged = 0
+        self.failed = 0
+        self.status = QUEUED
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (COMPLETED, FAILED)
+
+    def record(self, ok: bool, item: dict) -> None:
+        if ok and NOOP in item:
+            self.unchanged += 1
+        elif ok:
+            self.indexed += 1
+        else:
+            self.failed += 1
+
+    def to_dict(self) -> dict:
+        elapsed = None
+        if self.started_at:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+        return {
+            "job_id": self.id,
+            "index": self.index_name,
+            "status": self.status,
+            "total": self.total,
+            "indexed": self.indexed,
+            "unchanged": self.unchanged,
+            "failed": self.failed,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed_seconds": elapsed,
+            "docs_per_second": self.indexed / elapsed if elapsed else None,
+        }
+
+class _JobHistory:
+    def __init__(self, history_size: int, logger: Logger = None) -> None:
+        self.history_size = history_size
+        self._logger = logger or get_logger("ingest-jobs", stdout=True)
+        self._jobs: OrderedDict[str, IngestJob] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, job_id: str) -> IngestJob | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _register(self, job: IngestJob) -> None:
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        self._logger.info(f"Queued ingest job {job.id} with {job.total} chunks for index {job.index_name}")
+
+    def _prune(self) -> None:
+        # forget the oldest finished jobs once the history is full, unfinished jobs are always kept
+        excess = len(self._jobs) - self.history_size
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished][:max(excess, 0)]:
+            del self._jobs[job_id]
+
+    def _finish(self, job: IngestJob, response: dict | None, error: Exception | None = None) -> None:
+        if error is not None:
+            self._logger.error(f"Ingest job {job.id} failed", exc_info=error)
+            job.status = FAILED
+            job.error = str(error)
+        elif response is None:
+            job.status = FAILED
+            job.error = "Bulk ingestion failed"
+        else:
+            job.status = COMPLETED
+        job.finished_at = time.time()
+        # release the payload, only the counters are needed for status reporting
+        job.actions = []
+        self._logger.info(f"Ingest job {job.id} {job.status}: {job.indexed} indexed, {job.failed} failed")
+
+class IngestJobManager(_JobHistory):
+    """
+    Bounded queue of ingestion jobs drained by a fixed pool of worker threads.
+    """
+    def __init__(
+        self,
+        client: OpenSearchClient,
+        workers: int = settings.INGEST_WORKERS,
+        queue_size: int = settings.INGEST_QUEUE_SIZE,
+        history_size: int = settings.INGEST_JOB_HISTORY,
+        logger: Logger = None,
+    ) -> None:
+        super().__init__(history_size, logger)
+        self.client = client
+        self.workers = workers
+        self._queue: queue.Queue[IngestJob] = queue.Queue(maxsize=queue_size)
+        self._threads: list[threading.Thread] = []
+
+    def _start_workers(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"ingest-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, index_name: str, actions: list[dict], bulk_load: bool = False, pace: Callable | None = None) -> IngestJob:
+        """
+        Enqueue the actions for ingestion, with `bulk_load` in the index's bulk-load mode.
+        `pace` is passed on to ingest_data_bulk. Raises queue.Full when the queue is at capacity.
+        """
+        self._start_workers()
+        job = IngestJob(index_name, actions, bulk_load, pace)
+        self._queue.put_nowait(job)
+        self._register(job)
+        return job
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def _work(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                self._run(job)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job: IngestJob) -> None:
+        job.status = RUNNING
+        job.started_at = time.time()
+        self._logger.info(f"Running ingest job {job.id}")
+        response, error = None, None
+        try:
+            with self.client.bulk_load_mode(job.index_name) if job.bulk_load else nullcontext():
+                response = self.client.ingest_data_bulk(job.actions, raise_on_error=False, progress=job.record, pace=job.pace)
+        except Exception as e:
+            error = e
+        finally:
+            self.client.invalidate_search_cache(job.index_name)
+            self._finish(job, response, error)
+
+class AsyncIngestJobManager(_JobHistory):
+    """
+    asyncio counterpart of IngestJobManager: a bounded asyncio.Queue drained by worker tasks.
+    Must be used from a single event loop.
+    """
+    def __init__(
+        self,
+        client,
+        workers: int = settings.INGEST_WORKERS,
+        queue_size: int = settings.INGEST_QUEUE_SIZE,
+        history_size: int = settings.INGEST_JOB_HISTORY,
+        logger: Logger = None,
+    ) -> None:
+        super().__init__(history_size, logger)
+        self.client = client
+        self.workers = workers
+        self.queue_size = queue_size
+        self._queue: asyncio.Queue[IngestJob] | None = None
+        self._tasks: list[asyncio.Task] = []
+
+    def _start_workers(self) -> None:
+        # the queue and the tasks belong to the running loop, so they are created on first use
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            # with a fresh context, not the one of the request that happened to start them
+            self._tasks = [asyncio.create_task(self._work(), context=contextvars.Context()) for _ in range(self.workers)]
+
+    def submit(self, index_name: str, actions: list[dict], bulk_load: bool = False, pace: Callable | None = None) -> IngestJob:
+        """
+        Enqueue the actions for ingestion, with `bulk_load` in the index's bulk-load mode.
+        `pace` is passed on to ingest_data_bulk. Raises asyncio.QueueFull when the queue is at capacity.
+        """
+        self._start_workers()
+        job = IngestJob(index_name, actions, bulk_load, pace)
+        self._queue.put_nowait(job)
+        self._register(job)
+        return job
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _work(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: IngestJob) -> None:
+        job.status = RUNNING
+        job.started_at = time.time()
+        self._logger.info(f"Running ingest job {job.id}")
+        response, error = None, None
+        try:
+            async with self.client.bulk_load_mode(job.index_name) if job.bulk_load else nullcontext():
+                response = await self.client.ingest_data_bulk(job.actions, raise_on_error=False, progress=job.record, pace=job.pace)
+        except Exception as e:
+            error = e
+        finally:
+            self.client.invalidate_search_cache(job.index_name)
+            self._finish(job, response, error)
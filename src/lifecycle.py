@@ -0,0 +1,344 @@
+""" Lifecycle of idle per-user indices: deactivated by a periodic sweep, restored on their next request """
+import asyncio
+import contextvars
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import deque
+from logging import Logger
+import settings
+from app import metrics
+from cache import TTLCache
+from singleflight import AsyncSingleFlight, SingleFlight
+from utils import get_logger
+
+NONE = "none"
+CLOSE = "close"
+EVICT = "evict"
+WARM = "warm"
+RESTORE = "restore"
+# key of the marker in the _meta of the index mapping, present while the index is deactivated
+LIFECYCLE_META = "db_service_lifecycle"
+# state of a closed index in the cluster metadata
+CLOSED = "close"
+# lock document in LOCK_INDEX taken for every periodic sweep, so one instance per cluster sweeps
+SWEEP_LOCK = "index-lifecycle-sweep"
+
+def lifecycle_marker(action: str, reclaimed_bytes: int) -> dict:
+    return {"action": action, "since": time.time(), "reclaimed_bytes": reclaimed_bytes}
+
+def parse_index_activity(index_settings: dict, mappings: dict, stats: dict) -> dict[str, dict]:
+    """
+    Every index that uses the service's ingest pipeline, i.e. the per-user indices, except the
+    warm-up index: {"operations": searches + indexed documents (None when closed), "lifecycle": marker or None}.
+    """
+    activity = {}
+    for index, body in index_settings.items():
+        if body.get("settings", {}).get("index.default_pipeline") != settings.PIPELINE_NAME or index == settings.WARMUP_INDEX:
+            continue
+        totals = stats.get("indices", {}).get(index, {}).get("total")
+        activity[index] = {
+            "operations": totals["search"]["query_total"] + totals["indexing"]["index_total"] if totals else None,
+            "lifecycle": mappings.get(index, {}).get("mappings", {}).get("_meta", {}).get(LIFECYCLE_META),
+        }
+    return activity
+
+def parse_lifecycle_state(index: str, response: dict) -> dict | None:
+    """
+    {"state": "open" or "close", "lifecycle": marker or None} from the cluster state metadata of the index.
+    """
+    metadata = response.get("metadata", {}).get("indices", {}).get(index)
+    if metadata is None:
+        return None
+    # the cluster state keeps the mapping under its type name
+    mappings = metadata.get("mappings", {})
+    mappings = mappings.get("_doc", mappings)
+    return {"state": metadata.get("state", "open"), "lifecycle": mappings.get("_meta", {}).get(LIFECYCLE_META)}
+
+def index_memory_bytes(index: str, stats: dict, knn_stats: dict) -> int:
+    """
+    Segment heap of the index plus the native memory of its kNN graphs on every node (reported in KB).
+    """
+    segments = stats.get("indices", {}).get(index, {}).get("total", {}).get("segments", {})
+    graphs = sum(
+        node.get("indices_in_cache", {}).get(index, {}).get("graph_memory_usage", 0)
+        for node in knn_stats.get("nodes", {}).values()
+    )
+    return segments.get("memory_in_bytes", 0) + int(graphs * 1024)
+
+class _IndexLifecycle:
+    """
+    An open index is cold when its search and indexing counters did not move, and no request of this
+    instance touched it, for `idle_after` seconds. An index seen for the first time counts as active,
+    so nothing is deactivated before an instance has watched the cluster for `idle_after` seconds.
+    The state lives in the index mapping, a deactivated index is restored by any instance.
+
+    An index is trusted to be open for at most half of `idle_after` without looking it up. Every
+    request sent to the index moves its counters, so an index another instance may close has
+    expired from the local state long before.
+    """
+    def __init__(
+        self,
+        client,
+        action: str = settings.LIFECYCLE_ACTION,
+        idle_after: float = settings.LIFECYCLE_IDLE_AFTER,
+        sweep_interval: float = settings.LIFECYCLE_SWEEP_INTERVAL,
+        max_per_sweep: int = settings.LIFECYCLE_MAX_PER_SWEEP,
+        logger: Logger = None,
+    ) -> None:
+        if action not in settings.LIFECYCLE_ACTIONS:
+            raise ValueError(f"Invalid lifecycle action '{action}', expected one of {list(settings.LIFECYCLE_ACTIONS)}")
+        self.client = client
+        self.action = action
+        self.idle_after = idle_after
+        self.sweep_interval = sweep_interval
+        self.max_per_sweep = max_per_sweep
+        self._logger = logger or get_logger("index-lifecycle", stdout=True)
+        self._last_access: dict[str, float] = {}
+        # index -> (operation count, time it last changed)
+        self._operations: dict[str, tuple[int, float]] = {}
+        # indices known to be open and restored, not looked up again until the entry expires
+        self._active = TTLCache(maxsize=settings.METADATA_CACHE_SIZE, ttl=min(settings.LIFECYCLE_STATE_TTL, idle_after / 2))
+        self._owner = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._events: deque[dict] = deque(maxlen=settings.LIFECYCLE_HISTORY)
+        self._lock = threading.Lock()
+        self.deactivated = 0
+        self.restored = 0
+        self.reclaimed_bytes = 0
+        self.inactive: dict[str, int] = {}
+        self.last_sweep: float | None = None
+
+    @property
+    def enabled(self) -> bool:
+        # shared indices hold many tenants and are never idle
+        return self.action != NONE and settings.TENANCY_MODE != "shared"
+
+    def touch(self, index: str) -> None:
+        self._last_access[index] = time.time()
+
+    def _cold(self, activity: dict[str, dict], now: float) -> list[str]:
+        """
+        Open, not yet deactivated indices idle for `idle_after` seconds, least recently active first.
+        """
+        cold = []
+        for index, state in activity.items():
+            operations = state["operations"]
+            if operations is None:
+                continue
+            previous = self._operations.get(index)
+            if previous is None or previous[0] != operations:
+                self._operations[index] = (operations, now)
+            last_active = max(self._operations[index][1], self._last_access.get(index, 0))
+            if state["lifecycle"] is None and now - last_active >= self.idle_after:
+                cold.append((last_active, index))
+        # deleted and closed indices start over when they show up again
+        for index in [index for index in self._operations if activity.get(index, {}).get("operations") is None]:
+            del self._operations[index]
+        return [index for _, index in sorted(cold)][:self.max_per_sweep]
+
+    def _idle(self, index: str) -> bool:
+        # a request may have touched the index since the counters were read
+        return time.time() - self._last_access.get(index, 0) >= self.idle_after
+
+    def _deactivated(self, index: str, reclaimed: int) -> None:
+        self._active.pop(index)
+        self.deactivated += 1
+        self.reclaimed_bytes += reclaimed
+        metrics.LIFECYCLE_TRANSITIONS_TOTAL.labels(action=self.action).inc()
+        metrics.LIFECYCLE_RECLAIMED_BYTES_TOTAL.labels(action=self.action).inc(reclaimed)
+        self._events.append({"index": index, "action": self.action, "reclaimed_bytes": reclaimed, "at": time.time()})
+        self._logger.info(f"Index {index} is idle, {self.action}: {reclaimed} bytes reclaimed")
+
+    def _restored(self, index: str, marker: dict, ok: bool, elapsed: float) -> None:
+        action = marker.get("action", CLOSE)
+        event = {"index": index, "action": RESTORE, "from": action, "ok": ok, "seconds": round(elapsed, 3), "at": time.time()}
+        if "since" in marker:
+            event["inactive_seconds"] = round(time.time() - marker["since"])
+        self._events.append(event)
+        if not ok:
+            self._logger.error(f"Could not restore index {index} ({action})")
+            return
+        self._active.set(index, True)
+        self.restored += 1
+        metrics.LIFECYCLE_TRANSITIONS_TOTAL.labels(action=RESTORE).inc()
+        metrics.LIFECYCLE_RESTORE_SECONDS.labels(action=action).observe(elapsed)
+        self._logger.info(f"Restored index {index} ({action}) in {elapsed:.2f}s")
+
+    @property
+    def _sweep_lock_ttl(self) -> float:
+        # expires before the next sweep of the instance that holds it
+        return self.sweep_interval * 0.9
+
+    def _swept(self, activity: dict[str, dict], deactivated: list[str]) -> None:
+        inactive = dict.fromkeys(settings.LIFECYCLE_ACTIONS[1:], 0)
+        for index, state in activity.items():
+            action = (state["lifecycle"] or {}).get("action") or (self.action if index in deactivated else None)
+            if action in inactive:
+                inactive[action] += 1
+        for action, count in inactive.items():
+            metrics.LIFECYCLE_INACTIVE_INDICES.labels(action=action).set(count)
+        self.inactive = inactive
+        self.last_sweep = time.time()
+
+    def to_dict(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "action": self.action,
+            "idle_after": self.idle_after,
+            "sweep_interval": self.sweep_interval,
+            "last_sweep": self.last_sweep,
+            "tracked_indices": len(self._operations),
+            "inactive_indices": self.inactive,
+            "deactivated": self.deactivated,
+            "restored": self.restored,
+            "reclaimed_bytes": self.reclaimed_bytes,
+            "events": list(self._events),
+        }
+
+class IndexLifecycleManager(_IndexLifecycle):
+    """
+    Sweeps from a daemon thread started by the first request, the periodic sweep is skipped while
+    another instance holds the sweep lock. Concurrent requests for a deactivated index share one restore.
+    """
+    def __init__(self, client, **kwargs) -> None:
+        super().__init__(client, **kwargs)
+        self._flights = SingleFlight("lifecycle_restore")
+        self._thread: threading.Thread | None = None
+
+    def ensure_active(self, index_name: str) -> None:
+        """
+        Record the access and, if the index was deactivated, reopen and restore it before the request uses it.
+        """
+        if not self.enabled:
+            return
+        self.touch(index_name)
+        self._start_sweeper()
+        if self._active.get(index_name) is True:
+            return
+        self._flights.do(index_name, lambda: self._activate(index_name))
+
+    def _activate(self, index: str) -> None:
+        state = self.client.lifecycle_state(index)
+        # a missing index is created by the request, it is looked up again next time
+        if state is None:
+            return
+        if state["lifecycle"] is None:
+            self._active.set(index, True)
+            return
+        started = time.perf_counter()
+        ok = self.client.reactivate_index(index, state)
+        self._restored(index, state["lifecycle"], ok, time.perf_counter() - started)
+
+    def sweep(self) -> list[str]:
+        """
+        Deactivate the cold indices, returns their names.
+        """
+        activity = self.client.index_activity()
+        if activity is None:
+            return []
+        deactivated = []
+        for index in self._cold(activity, time.time()):
+            if not self._idle(index):
+                continue
+            reclaimed = self.client.index_memory(index)
+            if self.client.deactivate_index(index, self.action, reclaimed):
+                self._deactivated(index, reclaimed)
+                deactivated.append(index)
+        self._swept(activity, deactivated)
+        return deactivated
+
+    def periodic_sweep(self) -> list[str] | None:
+        """
+        sweep() unless another instance swept within the sweep interval, None then.
+        """
+        if not self.client.acquire_lock(SWEEP_LOCK, self._owner, self._sweep_lock_ttl):
+            return None
+        return self.sweep()
+
+    def _start_sweeper(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="index-lifecycle", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.periodic_sweep()
+            except Exception:
+                self._logger.error("Index lifecycle sweep failed", exc_info=True)
+
+class AsyncIndexLifecycleManager(_IndexLifecycle):
+    """
+    asyncio counterpart of IndexLifecycleManager, sweeping from a task. Use from one event loop.
+    """
+    def __init__(self, client, **kwargs) -> None:
+        super().__init__(client, **kwargs)
+        self._flights = AsyncSingleFlight("lifecycle_restore")
+        self._task: asyncio.Task | None = None
+
+    async def ensure_active(self, index_name: str) -> None:
+        """
+        See IndexLifecycleManager.ensure_active.
+        """
+        if not self.enabled:
+            return
+        self.touch(index_name)
+        self._start_sweeper()
+        if self._active.get(index_name) is True:
+            return
+        await self._flights.do(index_name, lambda: self._activate(index_name))
+
+    async def _activate(self, index: str) -> None:
+        state = await self.client.lifecycle_state(index)
+        if state is None:
+            return
+        if state["lifecycle"] is None:
+            self._active.set(index, True)
+            return
+        started = time.perf_counter()
+        ok = await self.client.reactivate_index(index, state)
+        self._restored(index, state["lifecycle"], ok, time.perf_counter() - started)
+
+    async def sweep(self) -> list[str]:
+        activity = await self.client.index_activity()
+        if activity is None:
+            return []
+        deactivated = []
+        for index in self._cold(activity, time.time()):
+            if not self._idle(index):
+                continue
+            reclaimed = await self.client.index_memory(index)
+            if await self.client.deactivate_index(index, self.action, reclaimed):
+                self._deactivated(index, reclaimed)
+                deactivated.append(index)
+        self._swept(activity, deactivated)
+        return deactivated
+
+    async def periodic_sweep(self) -> list[str] | None:
+        if not await self.client.acquire_lock(SWEEP_LOCK, self._owner, self._sweep_lock_ttl):
+            return None
+        return await self.sweep()
+
+    def _start_sweeper(self) -> None:
+        if self._task is None:
+            # with a fresh context, not the one of the request that happened to start it
+            self._task = asyncio.create_task(self._run(), context=contextvars.Context())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await self.periodic_sweep()
+            except Exception:
+                self._logger.error("Index lifecycle sweep failed", exc_info=True)
@@ -1,51 +1,571 @@
 import json
+import threading
+from contextlib import contextmanager
 from logging import Logger
-from utils import get_logger
+from typing import Any, Callable, Iterable, Iterator
+from utils import get_logger, log_payload
+from cache import TTLCache, MISSING
+from bulk import BULK_LOAD_META, BULK_LOAD_SETTINGS, AdaptiveBulkIndexer, bulk_load_original, bulk_loads
+from lifecycle import CLOSE, CLOSED, EVICT, LIFECYCLE_META, WARM, index_memory_bytes, lifecycle_marker, parse_index_activity, parse_lifecycle_state
+from index_profiles import get_profile
+from singleflight import SingleFlight
+from dedup import HASH_FIELD, batched, mget_body, stored_sources, with_hash, without_unchanged
+from tenancy import TenantIndex, resolve, tenant_filter, scope_query, scope_action, source_excludes, unscope_hits
 import settings
-from opensearchpy import OpenSearch, helpers
-from opensearchpy.exceptions import TransportError
+from app import metrics
+from opensearchpy import OpenSearch
+from opensearchpy.exceptions import ConflictError, ConnectionError, NotFoundError, TransportError
 from jinja2 import Template
 import time
 
 MODEL_ID = None
 
+# Shared by every client in the process: model/group ids and index existence
+_metadata_cache = TTLCache(maxsize=settings.METADATA_CACHE_SIZE, ttl=settings.MODEL_CACHE_TTL)
+# Semantic search hits keyed by (index, query_text, k, model_id)
+_search_cache = TTLCache(maxsize=settings.SEARCH_CACHE_SIZE, ttl=settings.SEARCH_CACHE_TTL)
+# Query vectors keyed by (model_id, normalized query text)
+_embedding_cache = TTLCache(maxsize=settings.EMBEDDING_CACHE_SIZE, ttl=settings.EMBEDDING_CACHE_TTL)
+# Bumped whenever the search cache of an index is invalidated: searches started before a write
+# are not joined by later callers and do not fill the cache
+_search_generations: dict[str, int] = {}
+_search_generations_lock = threading.Lock()
+# time.monotonic() of the last invalidation per index
+_search_writes: dict[str, float] = {}
+# Identical concurrent searches and model lookups share one request
+_search_flights = SingleFlight("search")
+_model_flights = SingleFlight("model_lookup")
+# Background deletions seen by this process, keyed by OpenSearch task id: {"index": user index,
+# "completed": search cache invalidated after the deletion}. The owner of a task is recorded in
+# LOCK_INDEX, so any process can answer a poll, only the user of the index may poll a task
+_delete_tasks = TTLCache(maxsize=settings.METADATA_CACHE_SIZE, ttl=settings.DELETE_TASK_TTL)
+
+def data_node_host_info(node_info: dict, host: dict) -> dict | None:
+    """
+    Sniffing callback that only keeps nodes holding data, so requests are spread across data nodes.
+    """
+    if not any(role.startswith("data") for role in node_info.get("roles", [])):
+        return None
+    return host
+
+def connection_options(pool_maxsize: int = settings.OPENSEARCH_POOL_MAXSIZE) -> dict:
+    """
+    Transport options shared by the sync and async clients.
+    """
+    return {
+        "http_compress": True, # enables gzip compression for request bodies
+        "http_auth": ('admin', settings.ADMIN_PASSWD),
+        "use_ssl": settings.OPENSEARCH_USE_SSL,
+        "verify_certs": False,
+        "ssl_assert_hostname": False,
+        "ssl_show_warn": False,
+        "pool_maxsize": pool_maxsize,
+        "timeout": settings.OPENSEARCH_TIMEOUT,
+        "max_retries": settings.OPENSEARCH_MAX_RETRIES,
+        "retry_on_timeout": settings.OPENSEARCH_RETRY_ON_TIMEOUT,
+        "dead_timeout": settings.OPENSEARCH_DEAD_TIMEOUT,
+        "sniff_on_start": settings.OPENSEARCH_SNIFF_ON_START,
+        "sniff_on_connection_fail": settings.OPENSEARCH_SNIFF_ON_CONNECTION_FAIL,
+        "sniffer_timeout": settings.OPENSEARCH_SNIFFER_TIMEOUT,
+        "sniff_timeout": settings.OPENSEARCH_SNIFF_TIMEOUT,
+        "host_info_callback": data_node_host_info,
+    }
+
+def model_deployed_on_all_nodes(model: dict) -> bool:
+    """
+    True once the model is DEPLOYED and loaded on every worker node it is planned on.
+    """
+    if model.get('model_state') != 'DEPLOYED':
+        return False
+    planned = model.get('planning_worker_node_count')
+    return planned is None or model.get('current_worker_node_count', 0) >= planned
+
+def seed_hosts(host: str | None = None, port: int = 9200) -> list[str]:
+    if host:
+        return [f"{host}:{port}"]
+    return settings.OPENSEARCH_HOSTS
+
+def normalize_query(query_text: str) -> str:
+    return " ".join(query_text.split())
+
+# Request bodies and response parsing shared with the asyncio client (async_opensearch_client.py)
+def build_search_query(
+    query_text: str,
+    k: int,
+    model_id: str,
+    mode: str,
+    vector: list[float] | None = None,
+    filter: dict | None = None,
+) -> dict:
+    """
+    `filter` is applied inside the kNN search (efficient filtering), so k hits are returned
+    from the matching documents rather than filtering the global top k afterwards.
+    """
+    if mode == "knn":
+        embedding = {
+            "vector": vector,
+            "k": k
+        }
+        query = {"knn": {"embedding": embedding}}
+    else:
+        embedding = {
+            "query_text": query_text,
+            "model_id": model_id,
+            "k": k
+        }
+        query = {"neural": {"embedding": embedding}}
+    if filter:
+        embedding["filter"] = filter
+
+    return {
+        "size": k,
+        "query": query
+    }
+
+def build_highlight(query_text: str) -> dict:
+    """
+    Highlight snippets of `text`. Neural and knn queries have no terms to highlight, so the
+    snippets come from a match query on the same text. `no_match_size` returns the start of
+    the text for hits without a matching term.
+    """
+    return {
+        "fields": {
+            "text": {
+                "fragment_size": settings.SEARCH_HIGHLIGHT_FRAGMENT_SIZE,
+                "number_of_fragments": settings.SEARCH_HIGHLIGHT_FRAGMENTS,
+                "no_match_size": settings.SEARCH_HIGHLIGHT_FRAGMENT_SIZE,
+            }
+        },
+        "highlight_query": {"match": {"text": query_text}},
+    }
+
+def search_source_filter(target: TenantIndex, fields: list[str] | None, highlight: bool) -> dict:
+    """
+    _source filtering of a search: only `fields` when given, never the content hash, and no
+    full `text` when highlight snippets replace it (unless `text` was asked for explicitly).
+    """
+    excludes = source_excludes(target) + [HASH_FIELD]
+    if highlight and not (fields and "text" in fields):
+        excludes = excludes + ["text"]
+    source = {"excludes": excludes}
+    if fields:
+        source["includes"] = fields
+    return source
+
+def search_source_params(target: TenantIndex, fields: list[str] | None, highlight: bool) -> dict:
+    """
+    search_source_filter as query parameters of the search API.
+    """
+    return {f"_source_{name}": value for name, value in search_source_filter(target, fields, highlight).items()}
+
+def search_cache_key(index_name: str, query_text: str, k: int, model_id: str, fields: list[str] | None, highlight: bool) -> tuple:
+    key = (index_name, query_text, k, model_id)
+    if fields or highlight:
+        key += (tuple(fields or ()), highlight)
+    return key
+
+def build_msearch_body(
+    pending: list[tuple[int, tuple]],
+    mode: str,
+    vectors: dict[str, list[float]],
+) -> tuple[list[dict], list[tuple[int, tuple]], dict[int, dict]]:
+    """
+    _msearch lines for the (position, search cache key) pairs, with the same _source filtering as
+    a single search. Returns the lines, the pairs that were sent and an error per position whose
+    query could not be built (no query vector in knn mode).
+    """
+    body, sent, errors = [], [], {}
+    for position, cache_key in pending:
+        index_name, query_text, k, model_id = cache_key[:4]
+        vector = vectors.get(normalize_query(query_text))
+        if mode == "knn" and vector is None:
+            errors[position] = {"error": "Could not embed query"}
+            continue
+        target = resolve(index_name)
+        header = {"index": target.index}
+        if target.shared:
+            header["routing"] = target.routing
+        body.append(header)
+        body.append(build_search_query(query_text, k, model_id, mode, vector, tenant_filter(target))
+                    | {"_source": search_source_filter(target, None, False)})
+        sent.append((position, cache_key))
+    return body, sent, errors
+
+def compact_hits(hits: list[dict]) -> list[dict]:
+    """
+    Flat results: id, score, the returned source fields and the highlight snippets.
+    """
+    results = []
+    for hit in hits:
+        result = {"id": hit["_id"], "score": hit["_score"]}
+        result.update((key, value) for key, value in hit.get("_source", {}).items() if key not in result)
+        if "highlight" in hit:
+            result["highlights"] = hit["highlight"].get("text", [])
+        results.append(result)
+    return results
+
+def build_model_group_query(group_name: str) -> dict:
+    return {
+        "query": {
+            "match": {
+                "name": group_name
+            }
+        }
+    }
+
+def build_model_query(model_name: str, model_group_id: str) -> dict:
+    return {
+        "query": {
+            "bool": {
+            "must": [
+                {
+                "match": { "name": model_name }
+                },
+                {
+                "match": { "model_group_id": model_group_id }
+                }
+            ]
+            }
+        }
+    }
+
+def build_embedding_request(query_texts: list[str]) -> dict:
+    return {
+        "text_docs": query_texts,
+        "return_number": True,
+        "target_response": ["sentence_embedding"]
+    }
+
+def build_documents_query(page_size: int, after: str | None = None, with_stats: bool = False, filter: dict | None = None) -> dict:
+    composite = {
+        "size": page_size,
+        "sources": [{"filename": {"terms": {"field": "filename"}}}]
+    }
+    if after is not None:
+        composite["after"] = {"filename": after}
+    aggregation = {"composite": composite}
+    if with_stats:
+        aggregation["aggs"] = {
+            "first_page": {"min": {"field": "page_number"}},
+            "last_page": {"max": {"field": "page_number"}}
+        }
+    body = {
+        "size": 0,
+        "track_total_hits": False,
+        "aggs": {"documents": aggregation}
+    }
+    if filter:
+        body["query"] = {"bool": {"filter": [filter]}}
+    return body
+
+def parse_documents_page(response: dict, page_size: int, with_stats: bool = False) -> tuple[list, str | None]:
+    buckets = response["aggregations"]["documents"]["buckets"]
+    if with_stats:
+        documents = [
+            {
+                "filename": bucket["key"]["filename"],
+                "chunks": bucket["doc_count"],
+                "first_page": bucket["first_page"]["value"],
+                "last_page": bucket["last_page"]["value"],
+            }
+            for bucket in buckets
+        ]
+    else:
+        documents = [bucket["key"]["filename"] for bucket in buckets]
+
+    after_key = response["aggregations"]["documents"].get("after_key")
+    next_after = after_key["filename"] if after_key and len(buckets) == page_size else None
+    return documents, next_after
+
+def parse_msearch_item(item: dict) -> dict:
+    if "error" in item:
+        error = item["error"]
+        if isinstance(error, dict):
+            error = error.get("reason") or error.get("type")
+        return {"error": str(error)}
+    return {"hits": item["hits"]["hits"]}
+
+def build_delete_document_query(target: TenantIndex, filename: str) -> dict:
+    return {"query": scope_query(target, {"term": {"filename": filename}})}
+
+def build_delete_documents_query(target: TenantIndex, filenames: list[str]) -> dict:
+    return {"query": scope_query(target, {"terms": {"filename": filenames}})}
+
+def parse_delete_task(task_id: str, response: dict) -> dict:
+    """
+    Summary of a delete_by_query task as returned by the tasks API.
+    """
+    status = response.get("task", {}).get("status", {})
+    result = response.get("response", {})
+    failures = result.get("failures", [])
+    summary = {
+        "task_id": task_id,
+        "completed": bool(response.get("completed")),
+        "total": status.get("total", 0),
+        "deleted": status.get("deleted", 0),
+        "version_conflicts": status.get("version_conflicts", 0),
+        "failures": len(failures),
+    }
+    if "error" in response:
+        summary["error"] = response["error"].get("reason") or response["error"].get("type")
+    elif failures:
+        summary["error"] = failures[0].get("cause", {}).get("reason", "delete_by_query failure")
+    return summary
+
+def updated_meta(meta: dict, key: str, value: dict | None) -> dict:
+    """
+    The _meta of an index mapping with one entry set, or removed when `value` is None. A mapping
+    update replaces the whole _meta, so the other entries have to be sent along.
+    """
+    meta = {name: entry for name, entry in meta.items() if name != key}
+    if value is not None:
+        meta[key] = value
+    return meta
+
+def index_missing(error: Exception) -> bool:
+    return isinstance(error, NotFoundError) and error.error == "index_not_found_exception"
+
+def search_generation(index_name: str) -> int | None:
+    """
+    None for SEARCH_CACHE_REFRESH_WINDOW seconds after a write: until a refresh makes the write
+    visible, searches may still return the old documents and their results are not cached.
+    """
+    written = _search_writes.get(index_name)
+    if written is not None and time.monotonic() - written < settings.SEARCH_CACHE_REFRESH_WINDOW:
+        return None
+    return _search_generations.get(index_name, 0)
+
+def search_cacheable(index_name: str, generation: int | None) -> bool:
+    """
+    Whether hits of a search started at `generation` may be cached: no write since, nor just before.
+    """
+    return generation is not None and search_generation(index_name) == generation
+
+def next_search_generation(index_name: str) -> None:
+    with _search_generations_lock:
+        _search_generations[index_name] = _search_generations.get(index_name, 0) + 1
+        _search_writes[index_name] = time.monotonic()
+
+def cached_search(cache_key: tuple) -> Any:
+    hits = _search_cache.get(cache_key)
+    if hits is not MISSING:
+        metrics.SEARCH_CACHE_HITS_TOTAL.inc()
+    else:
+        metrics.SEARCH_CACHE_MISSES_TOTAL.inc()
+    return hits
+
+def search_hits(cache_key: tuple, hits: list[dict], mode: str, generation: int | None) -> list[dict]:
+    """
+    Hits of a search for the caller, cached unless a write raced the search.
+    """
+    index_name = cache_key[0]
+    hits = unscope_hits(resolve(index_name), hits)
+    metrics.KNN_HITS.labels(mode=mode).observe(len(hits))
+    # a write during the search may not be reflected in the hits
+    if search_cacheable(index_name, generation):
+        _search_cache.set(cache_key, hits)
+    return hits
+
+def pending_searches(searches: list[dict], model_id: str, results: list[dict | None]) -> tuple[list[tuple[int, tuple]], dict[int, int | None]]:
+    """
+    Fill `results` with the cached hits of a search batch. Returns the (position, cache key) of
+    the searches left to send and the search generation each of them started at.
+    """
+    pending = []
+    generations = {}
+    for position, search in enumerate(searches):
+        cache_key = search_cache_key(search["index"], search["query"], search.get("k", 3), model_id, None, False)
+        hits = cached_search(cache_key)
+        if hits is not MISSING:
+            results[position] = {"hits": hits}
+        else:
+            pending.append((position, cache_key))
+            generations[position] = search_generation(search["index"])
+    return pending, generations
+
+def msearch_results(
+    sent: list[tuple[int, tuple]],
+    response: dict,
+    generations: dict[int, int | None],
+    mode: str,
+    results: list[dict | None],
+) -> None:
+    for (position, cache_key), item in zip(sent, response["responses"]):
+        result = parse_msearch_item(item)
+        if "hits" in result:
+            result["hits"] = search_hits(cache_key, result["hits"], mode, generations[position])
+        results[position] = result
+
+def cached_embeddings(query_texts: list[str], model_id: str) -> tuple[dict[str, list[float]], list[str]]:
+    """
+    The cached vectors keyed by normalized text, and the normalized texts that still have to be embedded.
+    """
+    embeddings = {}
+    missing = []
+    for query_text in dict.fromkeys(normalize_query(text) for text in query_texts):
+        embedding = _embedding_cache.get((model_id, query_text))
+        if embedding is not MISSING:
+            metrics.EMBEDDING_CACHE_HITS_TOTAL.inc()
+            embeddings[query_text] = embedding
+        else:
+            metrics.EMBEDDING_CACHE_MISSES_TOTAL.inc()
+            missing.append(query_text)
+    return embeddings, missing
+
+def cache_embeddings(model_id: str, query_texts: list[str], vectors: list[list[float]], embeddings: dict[str, list[float]]) -> dict[str, list[float]]:
+    for query_text, embedding in zip(query_texts, vectors):
+        _embedding_cache.set((model_id, query_text), embedding)
+        embeddings[query_text] = embedding
+    return embeddings
+
+def parse_embeddings(response: dict) -> list[list[float]]:
+    return [result["output"][0]["data"] for result in response["inference_results"]]
+
+def delete_task_record_id(task_id: str) -> str:
+    return f"delete-task:{task_id}"
+
+def build_delete_task_record(index: str) -> dict:
+    return {"index": index, "expires_at": time.time() + settings.DELETE_TASK_TTL}
+
+def parse_delete_task_record(response: dict) -> dict | None:
+    """
+    The deletion recorded in LOCK_INDEX by the process that submitted it, None once expired.
+    """
+    record = response["_source"]
+    if record.get("expires_at", 0) <= time.time():
+        return None
+    return {"index": record["index"], "completed": False}
+
+def new_ingest_summary() -> dict:
+    return {"indexed": 0, "updated": 0, "unchanged": 0, "failed": 0}
+
+def count_ingest_result(summary: dict, ok: bool, item: dict) -> None:
+    if not ok:
+        summary["failed"] += 1
+    elif "update" in item:
+        summary["updated"] += 1
+    else:
+        summary["indexed"] += 1
+
+def record_ingest_summary(summary: dict) -> None:
+    for result in ("indexed", "updated", "unchanged"):
+        metrics.INGEST_DEDUP_TOTAL.labels(result=result).inc(summary[result])
+
+def default_index_body(
+    shards: int | None = None,
+    profile: str | None = None,
+    pipeline: str | None = settings.PIPELINE_NAME,
+) -> str:
+    """
+    knn-index.json rendered with the embedding mapping of the given index profile.
+    Without a pipeline, documents must bring their own embedding.
+    """
+    index_profile = get_profile(profile)
+    filepath = settings.OPENSEARCH_CONFIG_DIR / "knn-index.json"
+    return Template(filepath.read_text()).render(
+        pipeline=pipeline,
+        shards=shards,
+        ef_search=index_profile.ef_search,
+        embedding=json.dumps(index_profile.embedding_mapping()),
+    )
+
+def index_body(target: TenantIndex, profile: str | None = None) -> str:
+    # shared indices hold many tenants, so they get more primary shards than a per-user index
+    return default_index_body(settings.SHARED_INDEX_SHARDS if target.shared else None, profile)
+
 class OpenSearchClient:
-    def __init__(self, host: str = settings.OPENSEARCH_ADDRESS, port: int = 9200, logger: Logger = None) -> None:
-        self.host = host
-        self.port = port
+    def __init__(self, host: str | None = None, port: int = 9200, logger: Logger = None) -> None:
+        """
+        Connects to `host:port` when given, otherwise to the seed nodes in settings.OPENSEARCH_HOSTS.
+        """
+        self.hosts = seed_hosts(host, port)
         self._logger = logger or get_logger("opensearch-client", stdout=True)
-        self.client: OpenSearch = self._connect_to_opensearch()
+        self._client: OpenSearch | None = None
+        self._connect_lock = threading.Lock()
+        self._last_connect_attempt = float("-inf")
+        self._bulk_indexer: AdaptiveBulkIndexer | None = None
+        self._reconnect()
+        metrics.CONNECTION_POOLS.register(self)
+
+    @property
+    def client(self) -> OpenSearch:
+        """
+        The underlying OpenSearch client. If it could not be created yet, creation is retried
+        at most every OPENSEARCH_RECONNECT_INTERVAL seconds instead of failing forever.
+        """
+        if self._client is None:
+            self._reconnect()
+            if self._client is None:
+                raise ConnectionError("N/A", "Not connected to OpenSearch", None)
+        return self._client
+
+    def connection_pool_stats(self) -> list[dict]:
+        """
+        Connections in use and pool size per node, read from the urllib3 pools.
+        """
+        if self._client is None:
+            return []
+        pool = self._client.transport.connection_pool
+        stats = []
+        for connection in getattr(pool, "orig_connections", pool.connections):
+            slots = getattr(getattr(connection, "pool", None), "pool", None)
+            size = slots.maxsize if slots is not None else 0
+            stats.append({
+                "host": connection.host,
+                "in_use": size - slots.qsize() if slots is not None else 0,
+                "max": size,
+                "alive": connection in pool.connections,
+            })
+        return stats
 
-    def _connect_to_opensearch(self) -> None:
-        if hasattr(self, 'client') and self.client:
-            return self.client
+    @property
+    def bulk_indexer(self) -> AdaptiveBulkIndexer:
+        if self._bulk_indexer is None:
+            self._bulk_indexer = AdaptiveBulkIndexer(self.client, logger=self._logger)
+        return self._bulk_indexer
+
+    def _reconnect(self) -> None:
+        with self._connect_lock:
+            if self._client is not None:
+                return
+            if time.monotonic() - self._last_connect_attempt < settings.OPENSEARCH_RECONNECT_INTERVAL:
+                return
+            self._last_connect_attempt = time.monotonic()
+            self._client = self._connect_to_opensearch()
+
+    def _connect_to_opensearch(self) -> OpenSearch | None:
         try:
             # Create the client with SSL/TLS and hostname verification disabled.
-            self._logger.info(f"Connecting to OpenSearch at {self.host}:{self.port}")
-            client = OpenSearch(
-                hosts = [{'host': self.host, 'port': self.port}],
-                http_compress = True, # enables gzip compression for request bodies
-                http_auth = ('admin', settings.ADMIN_PASSWD),
-                use_ssl = True,
-                verify_certs = False,
-                ssl_assert_hostname = False,
-                ssl_show_warn = False,
-            )
-            if client:
-                self._logger.info(json.dumps(client.info(), indent=4))
-            self._logger.info(f"Connected to OpenSearch")
-            return client
+            self._logger.info(f"Connecting to OpenSearch at {', '.join(self.hosts)}")
+            client = OpenSearch(hosts=self.hosts, **connection_options())
         except Exception as e:
             self._logger.error(f"Could not connect to Opensearch: {e}")
             return None
 
-    def _perform_request(self, method: str, endpoint: str, body: dict, params: dict | None = None, verbose: bool = True):
+        # Unreachable nodes are only marked dead, the transport retries them after the dead timeout
+        try:
+            log_payload(self._logger, "Cluster info:", client.info())
+            self._logger.info(f"Connected to OpenSearch")
+        except Exception as e:
+            self._logger.warning(f"OpenSearch is not reachable yet, requests will be retried: {e}")
+        return client
+
+    def _perform_request(
+        self,
+        method: str,
+        endpoint: str,
+        body: dict,
+        params: dict | None = None,
+        verbose: bool = True,
+        operation: str = "request",
+    ):
         try:
-            response = self.client.transport.perform_request(method, endpoint, body=body, params=params)
+            with metrics.observe_operation(operation):
+                response = self.client.transport.perform_request(method, endpoint, body=body, params=params)
             if verbose:
                 self._logger.info(f"{method} {endpoint}")
-                if body: self._logger.info(json.dumps(body, indent=4, ensure_ascii=False))
-                self._logger.info(f"Response:\n{json.dumps(response, indent=4, ensure_ascii=False)}")
+                if body: log_payload(self._logger, "Request body:", body)
+                log_payload(self._logger, "Response:", response)
             return response
         except Exception as e:
             if verbose:
@@ -55,7 +575,7 @@ class OpenSearchClient:
     def _update_cluster_settings(self, settings: json):
         self._logger.info(f"Update ML-related cluster settings")
         endpoint = "/_cluster/settings"
-        return self._perform_request("PUT", endpoint, body=settings)
+        return self._perform_request("PUT", endpoint, body=settings, operation="cluster_settings")
     
     def _load_json_config(self, filepath: str, **kwargs):
         with open(filepath, 'r') as file:
@@ -63,68 +583,167 @@ class OpenSearchClient:
         json_config = template.render(**kwargs)
         return json_config
 
-    def _wait_for_task_to_finish(self, task_id, timeout=60000, wait_time=5):
+    def invalidate_model_cache(self):
+        _metadata_cache.invalidate(lambda key: key[0] in ("model", "model_group"))
+
+    def invalidate_index_cache(self, index_name: str):
+        _metadata_cache.pop(("index", index_name))
+
+    def _forget_missing_index(self, index_name: str, error: Exception) -> None:
+        # deleted outside the service: the next existence check asks the cluster again
+        if index_missing(error):
+            self.invalidate_index_cache(index_name)
+
+    def invalidate_search_cache(self, index_name: str):
+        next_search_generation(index_name)
+        dropped = _search_cache.invalidate(lambda key: key[0] == index_name)
+        if dropped:
+            self._logger.info(f"Invalidated {dropped} cached search result(s) for index {index_name}")
+
+    def _poll(
+        self,
+        check: Callable[[], Any],
+        description: str,
+        timeout: float = settings.ML_TASK_TIMEOUT,
+        initial_interval: float = settings.ML_POLL_INITIAL_INTERVAL,
+        max_interval: float = settings.ML_POLL_MAX_INTERVAL,
+    ) -> Any:
         """
-        Waits for a task to complete, with retries.
+        Call `check` until it returns something other than None, sleeping with exponential
+        backoff in between. Transport errors count as "not yet". Returns None on timeout.
         """
-        start_time = time.time()
-        
+        deadline = time.monotonic() + timeout
+        interval = initial_interval
         while True:
             try:
-                response = self.get_task(task_id)
-                task_status = response.get('state')
-                
-                if task_status == 'COMPLETED':
-                    self._logger.info(f"Task {task_id} completed successfully.")
-                    return response
-                else:
-                    self._logger.info(f"Task {task_id} is still in progress. Waiting...")
-                    
-                    # Check if timeout has been reached
-                    if time.time() - start_time > timeout:
-                        self._logger.error(f"Task {task_id} did not complete within the timeout period of {timeout} seconds.")
-                        break
-                    
-                    time.sleep(wait_time)
+                result = check()
+                if result is not None:
+                    return result
             except TransportError as e:
-                self._logger.error(f"Error while checking task {task_id}: {e}")
-                time.sleep(10)
-    
-    def _wait_for_model_to_register(self, model_name, group_name: str, timeout=60000, wait_time=5):
+                self._logger.warning(f"Error while waiting for {description}: {e}")
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._logger.error(f"Timed out after {timeout} seconds waiting for {description}")
+                return None
+            time.sleep(min(interval, remaining))
+            interval = min(interval * 2, max_interval)
+
+    def _wait_for_task_to_finish(self, task_id, timeout: float = settings.ML_TASK_TIMEOUT):
         """
-        Waits for a task to complete, with retries.
+        Waits for an ML task to complete. Returns the task, or None if it failed or timed out.
         """
-        start_time = time.time()
-        
-        while True:
-            try:
-                response = self.get_model(model_name, group_name, verbose=False)
-                # self._logger.info(json.dumps(response, indent=4))
-                task_status = response['_source'].get('model_state')
-                
-                if task_status == 'REGISTERED':
-                    self._logger.info(f"Model {model_name} registered successfully.")
-                    return response
-                elif task_status == 'DEPLOYED':
-                    self._logger.info(f"Model {model_name} is already deployed.")
-                    return response
-                else:
-                    self._logger.info(f"Model is still registering. Waiting...")
-                    
-                    # Check if timeout has been reached
-                    if time.time() - start_time > timeout:
-                        self._logger.error(f"Model did not register within the timeout period of {timeout} seconds.")
-                        break
-                    
-                    time.sleep(wait_time)
-            except TransportError as e:
-                self._logger.error(f"Error occured while waiting for model to register", exc_info=True)
-                time.sleep(10)
+        def finished():
+            response = self.get_task(task_id)
+            if response and response.get('state') in ('COMPLETED', 'FAILED', 'COMPLETED_WITH_ERROR'):
+                return response
+            return None
+
+        response = self._poll(finished, f"task {task_id}", timeout)
+        if response is None:
+            return None
+        if response.get('state') != 'COMPLETED':
+            self._logger.error(f"Task {task_id} ended in state {response.get('state')}: {response.get('error')}")
+            return None
+        self._logger.info(f"Task {task_id} completed successfully.")
+        return response
+
+    def _wait_for_model_to_register(self, model_name, group_name: str, timeout: float = settings.ML_TASK_TIMEOUT):
+        """
+        Waits until the model is registered (or already deployed). Returns the model, or None.
+        """
+        def registered():
+            model = self.get_model(model_name, group_name, verbose=False, use_cache=False)
+            if model and model['_source'].get('model_state') in ('REGISTERED', 'DEPLOYED', 'DEPLOYING', 'DEPLOY_FAILED'):
+                return model
+            return None
+
+        model = self._poll(registered, f"model {model_name} to register", timeout)
+        if model:
+            self._logger.info(f"Model {model_name} is {model['_source'].get('model_state')}.")
+        return model
+
+    def _wait_for_model_to_deploy(self, model_id: str, timeout: float = settings.ML_TASK_TIMEOUT):
+        """
+        Waits until the model is DEPLOYED on every node it is planned on.
+        Returns the model, or None if deployment failed or timed out.
+        """
+        def deployed():
+            model = self.get_model_by_id(model_id)
+            if not model:
+                return None
+            if model.get('model_state') == 'DEPLOY_FAILED' or model_deployed_on_all_nodes(model):
+                return model
+            self._logger.info(
+                f"Model {model_id} is {model.get('model_state')} on "
+                f"{model.get('current_worker_node_count', 0)}/{model.get('planning_worker_node_count', '?')} nodes"
+            )
+            return None
+
+        model = self._poll(deployed, f"model {model_id} to deploy", timeout)
+        if model is None or not model_deployed_on_all_nodes(model):
+            self._logger.error(f"Model {model_id} was not deployed")
+            return None
+        self._logger.info(f"Model {model_id} deployed on {model.get('current_worker_node_count')} node(s)")
+        return model
+
+    def acquire_lock(self, name: str, owner: str, ttl: float) -> bool:
+        """
+        Cluster-wide lock: a document created with op_type=create in LOCK_INDEX, so exactly one
+        process gets it. A lock that was not released within `ttl` seconds is taken over.
+        """
+        body = {"owner": owner, "expires_at": time.time() + ttl}
+        try:
+            self.client.index(index=settings.LOCK_INDEX, id=name, body=body, op_type="create", refresh="true")
+            self._logger.info(f"Acquired lock {name}")
+            return True
+        except ConflictError:
+            pass
+        except Exception as e:
+            self._logger.error(f"Error acquiring lock {name}", exc_info=True)
+            return False
+
+        try:
+            current = self.client.get(index=settings.LOCK_INDEX, id=name)
+            if current["_source"].get("expires_at", 0) > time.time():
+                return False
+            self._logger.warning(f"Taking over expired lock {name} held by {current['_source'].get('owner')}")
+            self.client.index(
+                index=settings.LOCK_INDEX,
+                id=name,
+                body=body,
+                if_seq_no=current["_seq_no"],
+                if_primary_term=current["_primary_term"],
+                refresh="true",
+            )
+            return True
+        except (ConflictError, NotFoundError):
+            # released or taken over by someone else in the meantime
+            return False
+        except Exception as e:
+            self._logger.error(f"Error acquiring lock {name}", exc_info=True)
+            return False
+
+    def release_lock(self, name: str, owner: str) -> None:
+        try:
+            current = self.client.get(index=settings.LOCK_INDEX, id=name)
+            if current["_source"].get("owner") != owner:
+                self._logger.warning(f"Lock {name} is no longer held by {owner}")
+                return
+            self.client.delete(
+                index=settings.LOCK_INDEX,
+                id=name,
+                if_seq_no=current["_seq_no"],
+                if_primary_term=current["_primary_term"],
+                refresh="true",
+            )
+            self._logger.info(f"Released lock {name}")
+        except Exception as e:
+            self._logger.error(f"Error releasing lock {name}", exc_info=True)
 
     def get_task(self, task_id: str):
         self._logger.info(f"Get task, task_id={task_id}")
         endpoint = f"/_plugins/_ml/tasks/{task_id}"
-        return self._perform_request("GET", endpoint, body={})
+        return self._perform_request("GET", endpoint, body={}, operation="ml_task")
 
     def register_model_group(self, group_name: str, description: str = "", access_mode: str = "public"):
         self._logger.info("Register model group")
@@ -139,7 +758,8 @@ class OpenSearchClient:
             "description": description,
             "access_mode": access_mode,
         }
-        response = self._perform_request("POST", endpoint, body)
+        response = self._perform_request("POST", endpoint, body, operation="model_group_register")
+        self.invalidate_model_cache()
         if response:
             settings.MODEL_GROUP_ID = response.get("model_group_id")
             return response.get("model_group_id")
@@ -148,25 +768,27 @@ class OpenSearchClient:
     def get_model_groups(self):
         self._logger.info("Get all model groups")
         endpoint = "/_plugins/_ml/model_groups/_search"
-        response = self._perform_request("POST", endpoint, body={})
+        response = self._perform_request("POST", endpoint, body={}, operation="model_group_lookup")
         if response:
             return response["hits"]["hits"]
         return []
     
-    def get_model_group_id(self, group_name: str, verbose: bool = True):
+    def get_model_group_id(self, group_name: str, verbose: bool = True, use_cache: bool = True):
+        cache_key = ("model_group", group_name)
+        if use_cache:
+            group_id = _metadata_cache.get(cache_key)
+            if group_id is not MISSING:
+                return group_id
+
         if verbose:
             self._logger.info(f"Get model group id, group_name={group_name}")
         endpoint = "/_plugins/_ml/model_groups/_search"
-        body = {
-            "query": {
-                "match": {
-                    "name": group_name
-                }
-            }
-        }
-        response = self._perform_request("GET", endpoint, body=body, verbose=verbose)
+        body = build_model_group_query(group_name)
+        response = self._perform_request("GET", endpoint, body=body, verbose=verbose, operation="model_group_lookup")
         if response and response["hits"]["hits"]:
-            return response["hits"]["hits"][0]["_id"]
+            group_id = response["hits"]["hits"][0]["_id"]
+            _metadata_cache.set(cache_key, group_id)
+            return group_id
         return None
 
     def delete_model_group(self, group_name: str):
@@ -174,7 +796,9 @@ class OpenSearchClient:
         if group_id:
             self._logger.info(f"Delete model group, group_name={group_name}")
             endpoint = f"/_plugins/_ml/model_groups/{group_id}"
-            return self._perform_request("DELETE", endpoint, body={})
+            response = self._perform_request("DELETE", endpoint, body={}, operation="model_group_delete")
+            self.invalidate_model_cache()
+            return response
         return None
 
     def register_model(self, model_name: str, version: str, group_name: str) -> str:
@@ -182,7 +806,8 @@ class OpenSearchClient:
         Register model to the model group. Wait for task to finish. Return model_id.
         """
         self._logger.info(f"Register model, model_name={model_name}, group_name={group_name}")
-        model = self.get_model(model_name, group_name)
+        self.invalidate_model_cache()
+        model = self.get_model(model_name, group_name, use_cache=False)
         if model:
             self._logger.info(f"Model already exists in model group {group_name}")
             self._wait_for_model_to_register(model_name, group_name)
@@ -199,42 +824,46 @@ class OpenSearchClient:
                 "model_group_id": group_id,
                 "model_format": "TORCH_SCRIPT"
             }
-            response = self._perform_request("POST", endpoint, body=body)
+            response = self._perform_request("POST", endpoint, body=body, operation="model_register")
             task_id = response["task_id"]
             response = self._wait_for_task_to_finish(task_id=task_id)
-            self._logger.info(f"Response:\n{json.dumps(response, indent=4, ensure_ascii=False)}")
-            self._logger.info(f"model_id={response["model_id"]}")
+            self.invalidate_model_cache()
+            if not response:
+                self._logger.error(f"Model {model_name} could not be registered")
+                return None
+            log_payload(self._logger, "Response:", response)
+            self._logger.info(f"model_id={response['model_id']}")
             MODEL_ID = response["model_id"]
             return MODEL_ID
         self._logger.error(f"Model group {group_name} not found")
 
         return None
     
-    def get_model(self, model_name: str, group_name: str, verbose: bool = True) -> str:
-        model_group_id = self.get_model_group_id(group_name, verbose)
+    def get_model(self, model_name: str, group_name: str, verbose: bool = True, use_cache: bool = True) -> str:
+        cache_key = ("model", model_name, group_name)
+        if not use_cache:
+            return self._lookup_model(model_name, group_name, verbose, use_cache)
+
+        model = _metadata_cache.get(cache_key)
+        if model is not MISSING:
+            return model
+        # on a cache miss, e.g. after the TTL expired, concurrent requests share one lookup
+        return _model_flights.do(cache_key, lambda: self._lookup_model(model_name, group_name, verbose, use_cache))
+
+    def _lookup_model(self, model_name: str, group_name: str, verbose: bool, use_cache: bool):
+        cache_key = ("model", model_name, group_name)
+        model_group_id = self.get_model_group_id(group_name, verbose, use_cache)
         if not model_group_id:
             if verbose: self._logger.error(f'No model group with name "{group_name}" found.')
             return False
 
         endpoint = "/_plugins/_ml/models/_search"
-        body = {
-            "query": {
-                "bool": {
-                "must": [
-                    {
-                    "match": { "name": model_name }
-                    },
-                    {
-                    "match": { "model_group_id": model_group_id }
-                    }
-                ]
-                }
-            }
-        }
-        
-        response = self._perform_request("POST", endpoint, body=body, verbose=verbose)
+        body = build_model_query(model_name, model_group_id)
+        response = self._perform_request("POST", endpoint, body=body, verbose=verbose, operation="model_lookup")
         if response and response["hits"]["hits"]:
-            return response["hits"]["hits"][0]
+            model = response["hits"]["hits"][0]
+            _metadata_cache.set(cache_key, model)
+            return model
         return None
 
     def get_model_id(self, task_id: str):
@@ -249,7 +878,7 @@ class OpenSearchClient:
             },
             "size": 1000
         }
-        response = self._perform_request("POST", endpoint, body=body)
+        response = self._perform_request("POST", endpoint, body=body, operation="model_lookup")
         if response:
             return response["hits"]["hits"]
         return response
@@ -257,7 +886,39 @@ class OpenSearchClient:
     def deploy_model(self, model_id: str):
         self._logger.info(f"Deploy model, model_id = {model_id}")
         endpoint = f"/_plugins/_ml/models/{model_id}/_deploy"
-        return self._perform_request("POST", endpoint, body={})
+        response = self._perform_request("POST", endpoint, body={}, operation="model_deploy")
+        self.invalidate_model_cache()
+        return response
+
+    def get_model_by_id(self, model_id: str) -> dict | None:
+        endpoint = f"/_plugins/_ml/models/{model_id}"
+        return self._perform_request("GET", endpoint, body=None, verbose=False, operation="model_lookup")
+
+    def ensure_model_deployed(self, model_id: str, timeout: float = settings.ML_TASK_TIMEOUT) -> dict | None:
+        """
+        Deploy the model unless it is already deployed or deploying, then wait until it is DEPLOYED.
+        Returns the model, or None if it could not be deployed in time.
+        """
+        model = self.get_model_by_id(model_id)
+        state = model.get('model_state') if model else None
+        if model and model_deployed_on_all_nodes(model):
+            self._logger.info(f"Model {model_id} is already deployed")
+            return model
+        if state != 'DEPLOYING':
+            response = self.deploy_model(model_id)
+            if not response:
+                return None
+            # a failed deploy task ends the wait right away instead of at the timeout
+            if response.get('task_id') and not self._wait_for_task_to_finish(response['task_id'], timeout):
+                return None
+        return self._wait_for_model_to_deploy(model_id, timeout)
+
+    def get_cluster_settings(self) -> dict:
+        """
+        Persistent cluster settings, flattened to dotted keys.
+        """
+        response = self._perform_request("GET", "/_cluster/settings", body=None, params={"flat_settings": "true"}, verbose=False, operation="cluster_settings")
+        return response.get("persistent", {}) if response else {}
 
     def create_ingest_pipeline(
         self, 
@@ -282,104 +943,321 @@ class OpenSearchClient:
             "description": description,
             "processors": processors
         }
-        return self._perform_request("PUT", endpoint, body=body)
+        return self._perform_request("PUT", endpoint, body=body, operation="pipeline")
 
     def get_ingest_pipelines(self):
         endpoint = "/_ingest/pipeline"
-        return self._perform_request("GET", endpoint, body={})
+        return self._perform_request("GET", endpoint, body={}, operation="pipeline")
+
+    def get_ingest_pipeline(self, pipeline_id: str) -> dict | None:
+        response = self._perform_request("GET", f"/_ingest/pipeline/{pipeline_id}", body=None, verbose=False, operation="pipeline")
+        return response.get(pipeline_id) if response else None
     
     def get_elements_count(self, index_name: str):
         self._logger.info(f"Get elements count, index_name = {index_name}")
-        response = self.client.count(index=index_name)
+        target = resolve(index_name)
+        body = {"query": scope_query(target, {"match_all": {}})}
+        with metrics.observe_operation("count"):
+            response = self.client.count(index=target.index, body=body, routing=target.routing)
         return response['count']
 
     def get_all_elements(self, index_name: str):
         self._logger.info(f"Get all elements, index_name = {index_name}")
-        query = {"query": {"match_all": {}}}
+        target = resolve(index_name)
+        query = {"query": scope_query(target, {"match_all": {}})}
         return self.client.search(
-            index=index_name,
+            index=target.index,
             body=query,
-            _source_excludes=["embedding"],  # exclude text embedding from the response
+            routing=target.routing,
+            _source_excludes=source_excludes(target),  # exclude text embedding from the response
             explain=True,
         )
 
-    def semantic_search(self, index_name: str, query_text: str, k: int = 3, model_id: str | None = None):
-        self._logger.info(f"Semantic search, query_text = {query_text}")
+    def embed_query(self, query_text: str, model_id: str) -> list[float] | None:
+        """
+        Embed the query text with the ML predict API. Vectors are cached per (model, text).
+        """
+        return self.embed_queries([query_text], model_id).get(normalize_query(query_text))
+
+    def embed_queries(self, query_texts: list[str], model_id: str) -> dict[str, list[float]]:
+        """
+        Embed several query texts, uncached ones in a single predict call.
+        Returns the vectors keyed by normalized text, texts that could not be embedded are missing.
+        """
+        embeddings, missing = cached_embeddings(query_texts, model_id)
+        if not missing:
+            return embeddings
+
+        vectors = self.predict_embeddings(missing, model_id)
+        if vectors is None:
+            self._logger.error(f"Could not embed queries with model {model_id}")
+            return embeddings
+        return cache_embeddings(model_id, missing, vectors, embeddings)
+
+    def predict_embeddings(self, texts: list[str], model_id: str) -> list[list[float]] | None:
+        """
+        Embed the texts with the ML predict API, bypassing the embedding cache.
+        """
+        endpoint = f"/_plugins/_ml/_predict/text_embedding/{model_id}"
+        body = build_embedding_request(texts)
+        with metrics.QUERY_EMBEDDING_LATENCY.time():
+            response = self._perform_request("POST", endpoint, body=body, verbose=False, operation="embed")
+        if not response:
+            return None
+        return parse_embeddings(response)
+
+    def warm_up_search(self, index_name: str, query_text: str, model_id: str, k: int = 3) -> bool:
+        """
+        Run a neural query outside the search cache so the query embedding path is exercised.
+        """
+        target = resolve(index_name)
+        query = build_search_query(query_text, k, model_id, "neural", filter=tenant_filter(target))
+        try:
+            with metrics.observe_operation("search"):
+                response = self.client.search(index=target.index, body=query, routing=target.routing, _source_excludes=source_excludes(target))
+            metrics.observe_took("search", response)
+            return True
+        except Exception as e:
+            self._logger.error(f"Warm-up search on {index_name} failed", exc_info=True)
+            return False
+
+    def _resolve_model_id(self, model_id: str | None = None) -> str | None:
+        if model_id:
+            return model_id
         model = self.get_model(settings.MODEL_URL, settings.MODEL_GROUP_NAME)
         if not model:
             self._logger.error(f"Model {settings.MODEL_URL} not found in model group {settings.MODEL_GROUP_NAME}")
             return None
-        model_id = model["_id"] if not model_id else model_id
+        return model["_id"]
+
+    def _build_search_query(
+        self,
+        query_text: str,
+        k: int,
+        model_id: str,
+        mode: str,
+        vector: list[float] | None = None,
+        filter: dict | None = None,
+    ) -> dict | None:
+        if mode == "knn":
+            vector = vector or self.embed_query(query_text, model_id)
+            if vector is None:
+                return None
+        return build_search_query(query_text, k, model_id, mode, vector, filter)
+
+    def semantic_search(
+        self,
+        index_name: str,
+        query_text: str,
+        k: int = 3,
+        model_id: str | None = None,
+        mode: str | None = None,
+        fields: list[str] | None = None,
+        highlight: bool = False,
+    ):
+        """
+        The k nearest chunks. `fields` limits the returned _source fields, `highlight` adds
+        snippets of `text` to every hit and drops the full text from the source.
+        """
+        mode = mode or settings.SEARCH_MODE
+        self._logger.info(f"Semantic search, query_text = {query_text}, mode = {mode}")
+        model_id = self._resolve_model_id(model_id)
+        if not model_id:
+            return None
         self._logger.info(f"Model id = {model_id}")
-        query = {
-            "size": k,
-            "query": {
-                "neural": {
-                        "embedding": {
-                            "query_text": query_text,
-                            "model_id": model_id,
-                            "k": k
-                        }
-                    }
-            }
-        }
+
+        cache_key = search_cache_key(index_name, query_text, k, model_id, fields, highlight)
+        hits = cached_search(cache_key)
+        if hits is not MISSING:
+            return hits
+
+        # identical concurrent searches share one request, one embedding on the ML node
+        generation = search_generation(index_name)
+        return _search_flights.do(
+            (cache_key, mode, generation),
+            lambda: self._search(cache_key, mode, fields, highlight, generation),
+        )
+
+    def _search(self, cache_key: tuple, mode: str, fields: list[str] | None, highlight: bool, generation: int):
+        index_name, query_text, k, model_id = cache_key[:4]
+        target = resolve(index_name)
+        query = self._build_search_query(query_text, k, model_id, mode, filter=tenant_filter(target))
+        if not query:
+            return None
+        if highlight:
+            query["highlight"] = build_highlight(query_text)
         try:
-            response = self.client.search(
-                index=index_name,
-                body=query,
-                _source_excludes=["embedding"],
-            )
+            with metrics.SEARCH_QUERY_LATENCY.labels(mode=mode).time(), metrics.observe_operation("search"):
+                response = self.client.search(
+                    index=target.index,
+                    body=query,
+                    routing=target.routing,
+                    **search_source_params(target, fields, highlight),
+                )
             self._logger.info("Semantic search performed successfully")
-            return response["hits"]["hits"]
+            metrics.observe_took("search", response)
+            return search_hits(cache_key, response["hits"]["hits"], mode, generation)
         except Exception as e:
             self._logger.error("Error occured during semantic search", exc_info=True)
             return None
 
-    def index_exists(self, index_name: str):
+    def semantic_search_batch(
+        self,
+        searches: list[dict],
+        model_id: str | None = None,
+        mode: str | None = None,
+    ) -> list[dict] | None:
+        """
+        Run several semantic searches with a single _msearch request. Every search is a dict
+        with `index`, `query` and an optional `k`. Returns {"hits": [...]} or {"error": "..."}
+        per search, in the order of `searches`.
+        """
+        mode = mode or settings.SEARCH_MODE
+        self._logger.info(f"Semantic search batch, {len(searches)} queries, mode = {mode}")
+        model_id = self._resolve_model_id(model_id)
+        if not model_id:
+            return None
+
+        results: list[dict | None] = [None] * len(searches)
+        pending, generations = pending_searches(searches, model_id, results)
+        if not pending:
+            return results
+
+        vectors = {}
+        if mode == "knn":
+            vectors = self.embed_queries([searches[position]["query"] for position, _ in pending], model_id)
+
+        body, sent, errors = build_msearch_body(pending, mode, vectors)
+        for position, error in errors.items():
+            results[position] = error
+        if not sent:
+            return results
+
+        try:
+            with metrics.SEARCH_QUERY_LATENCY.labels(mode=mode).time(), metrics.observe_operation("msearch"):
+                response = self.client.msearch(body=body)
+        except Exception as e:
+            self._logger.error("Error occured during semantic search batch", exc_info=True)
+            for position, _ in sent:
+                results[position] = {"error": str(e)}
+            return results
+
+        metrics.observe_took("msearch", response)
+        msearch_results(sent, response, generations, mode, results)
+        self._logger.info("Semantic search batch performed successfully")
+        return results
+
+    def index_exists(self, index_name: str, use_cache: bool = True):
+        """
+        In shared tenancy mode this checks the shared index that holds the user's documents.
+        """
+        index_name = resolve(index_name).index
+        cache_key = ("index", index_name)
+        if use_cache and _metadata_cache.get(cache_key) is True:
+            return True
+
         self._logger.info(f"Check if index exists, index_name = {index_name}")
-        return self.client.indices.exists(index=index_name)
+        with metrics.observe_operation("index_exists"):
+            exists = self.client.indices.exists(index=index_name)
+        # only positive answers are cached, a missing index is created on first write. Requests that
+        # find the index deleted drop the entry, uploads do not use it
+        if exists:
+            _metadata_cache.set(cache_key, True, ttl=settings.INDEX_CACHE_TTL)
+        return exists
 
     def get_indices(self):
         self._logger.info(f"Get all indices")
         endpoint = "/_cat/indices"
-        response = self._perform_request("GET", endpoint, body={})
+        response = self._perform_request("GET", endpoint, body={}, operation="cat_indices")
         return [] if not response else response.split('\n')
 
-    def create_index(self, index_name: str, body: dict | None = None):
-        self._logger.info(f"Create KNN index, index_name = {index_name}")      
-        endpoint = f"/{index_name}"
+    def create_index(self, index_name: str, body: dict | None = None, profile: str | None = None):
+        """
+        Create the kNN index from knn-index.json with the given index profile, settings.INDEX_PROFILE
+        by default, unless an explicit body is passed.
+        """
+        target = resolve(index_name)
+        self._logger.info(f"Create KNN index, index_name = {target.index}, profile = {profile or settings.INDEX_PROFILE}")
+        endpoint = f"/{target.index}"
 
         # get default knn-index template config
         if not body:
-            filepath = (settings.OPENSEARCH_CONFIG_DIR / "knn-index.json").as_posix()
-            body = self._load_json_config(filepath, pipeline=settings.PIPELINE_NAME)
+            body = index_body(target, profile)
 
-        return self._perform_request("PUT", endpoint, body=body)
+        response = self._perform_request("PUT", endpoint, body=body, operation="create_index")
+        self.invalidate_index_cache(target.index)
+        return response
+
+    def list_documents(
+        self,
+        index_name: str,
+        page_size: int = settings.DOCUMENTS_PAGE_SIZE,
+        after: str | None = None,
+        with_stats: bool = False,
+    ) -> tuple[list, str | None] | None:
+        """
+        One page of the distinct filenames in the index, sorted, from a composite aggregation
+        on `filename`. With `with_stats` every document is a dict with its chunk count and page range.
+        Returns (documents, cursor for the next page or None), or None on error.
+        """
+        self._logger.info(f"List documents from index {index_name}, after = {after}")
+        target = resolve(index_name)
+        body = build_documents_query(page_size, after, with_stats, filter=tenant_filter(target))
+        try:
+            with metrics.observe_operation("list_documents"):
+                response = self.client.search(index=target.index, body=body, routing=target.routing)
+        except Exception as e:
+            self._forget_missing_index(target.index, e)
+            self._logger.error(f"Error listing documents from index {index_name}", exc_info=True)
+            return None
+        metrics.observe_took("list_documents", response)
+        return parse_documents_page(response, page_size, with_stats)
 
-    def get_documents_from_index(self, index_name: str) -> list[str]:
+    def get_documents_from_index(self, index_name: str, with_stats: bool = False) -> list[str]:
+        """
+        All distinct documents of the index, paging through list_documents.
+        """
         self._logger.info(f"Get documents from index {index_name}")
-        query = {"query": {"match_all": {}}}
-        response = self.client.search(
-            index=index_name,
-            body=query,
-            _source_includes=["filename"],
-            explain=True
-        )
-        if response:
-            self._logger.info(f"Documents retrieved from index {index_name}")
-            self._logger.info(json.dumps(response, indent=4, ensure_ascii=False))
-            docs = response["hits"]["hits"]
-            doc_names = sorted(list(set([doc["_source"]["filename"] for doc in docs])))
-            return doc_names, 200
+        documents = []
+        after = None
+        while True:
+            page = self.list_documents(index_name, after=after, with_stats=with_stats)
+            if page is None:
+                self._logger.info(f"Error retrieving documents from index {index_name}")
+                return None, 404
+            docs, after = page
+            documents.extend(docs)
+            if after is None:
+                break
 
-        self._logger.info(f"Error retrieving documents from index {index_name}")
-        return None, 404
+        self._logger.info(f"{len(documents)} documents retrieved from index {index_name}")
+        return documents, 200
 
     def delete_index(self, index_name: str):
         self._logger.info(f"Delete index {index_name}")
-        if self.check_index_exists(index_name):
+        target = resolve(index_name)
+        if target.shared:
+            # the index is shared with other users, only this user's documents are removed
             try:
-                response = self.client.indices.delete(index=index_name)
+                with metrics.observe_operation("delete_by_query"):
+                    response = self.client.delete_by_query(
+                        index=target.index,
+                        body={"query": scope_query(target, {"match_all": {}})},
+                        routing=target.routing,
+                        conflicts="proceed",
+                    )
+                metrics.observe_took("delete_by_query", response)
+                self.invalidate_search_cache(index_name)
+                return response
+            except Exception as e:
+                self._logger.error(f"Error deleting documents of {index_name}", exc_info=True)
+                return None
+        if self.index_exists(index_name, use_cache=False):
+            try:
+                with metrics.observe_operation("delete_index"):
+                    response = self.client.indices.delete(index=index_name)
+                self.invalidate_index_cache(index_name)
+                self.invalidate_search_cache(index_name)
                 self._logger.info(f"Index {index_name} successfully deleted")
                 return response
             except Exception as e:
@@ -387,43 +1265,341 @@ class OpenSearchClient:
         else:
             self._logger.info(f"Index {index_name} does not exist.")
 
-    def ingest_data_bulk(self, data):
+    def delete_documents(self, index: str, filenames: list[str]) -> str | None:
+        """
+        Delete every chunk of the given files with one background delete_by_query, sliced across
+        shards. Version conflicts with concurrent writes are skipped instead of aborting the task.
+        Returns the OpenSearch task id to poll with get_delete_task.
+        """
+        self._logger.info(f"Delete {len(filenames)} documents from {index}")
+        target = resolve(index)
+        try:
+            with metrics.observe_operation("delete_by_query_submit"):
+                response = self.client.delete_by_query(
+                    index=target.index,
+                    body=build_delete_documents_query(target, filenames),
+                    routing=target.routing,
+                    conflicts="proceed",
+                    slices="auto",
+                    wait_for_completion=False,
+                )
+            task_id = response["task"]
+            _delete_tasks.set(task_id, {"index": index, "completed": False})
+            self._logger.info(f"Submitted deletion of {len(filenames)} documents from {index}, task {task_id}")
+        except Exception as e:
+            self._forget_missing_index(target.index, e)
+            self._logger.error(f"Error submitting deletion of {filenames}", exc_info=True)
+            return None
+        try:
+            # the poll may reach another process
+            self.client.index(index=settings.LOCK_INDEX, id=delete_task_record_id(task_id), body=build_delete_task_record(index))
+        except Exception as e:
+            self._logger.error(f"Error recording deletion task {task_id}, only this process can report it", exc_info=True)
+        return task_id
+
+    def _issued_delete_task(self, task_id: str) -> dict | None:
+        """
+        The deletion submitted as `task_id` by any process, None if it is unknown or expired.
+        """
+        issued = _delete_tasks.get(task_id)
+        if issued is not MISSING:
+            return issued
+        try:
+            response = self.client.get(index=settings.LOCK_INDEX, id=delete_task_record_id(task_id))
+        except NotFoundError:
+            return None
+        except Exception as e:
+            self._logger.error(f"Error reading deletion task {task_id}", exc_info=True)
+            return None
+        issued = parse_delete_task_record(response)
+        if issued is not None:
+            _delete_tasks.set(task_id, issued)
+        return issued
+
+    def get_delete_task(self, task_id: str, index: str) -> dict | None:
+        """
+        Progress of a deletion submitted with delete_documents for `index`, None if no process
+        submitted the task or it was submitted for another index. Every process invalidates its
+        search cache when it first sees the deletion completed.
+        """
+        issued = self._issued_delete_task(task_id)
+        if issued is None or issued["index"] != index:
+            return None
+        try:
+            with metrics.observe_operation("task_status"):
+                response = self.client.tasks.get(task_id=task_id)
+        except NotFoundError:
+            return None
+        except Exception as e:
+            self._logger.error(f"Error getting task {task_id}", exc_info=True)
+            return None
+        summary = parse_delete_task(task_id, response)
+        if summary["completed"] and not issued["completed"]:
+            issued["completed"] = True
+            self.invalidate_search_cache(index)
+        return summary
+
+    def _index_meta(self, index: str) -> dict:
+        response = self.client.indices.get_mapping(index=index)
+        return response[index]["mappings"].get("_meta", {})
+
+    def _set_index_meta(self, index: str, key: str, value: dict | None) -> None:
+        """
+        Set, or remove with None, one entry of the _meta of the index mapping and keep the others.
+        """
+        meta = self._index_meta(index)
+        self.client.indices.put_mapping(index=index, body={"_meta": updated_meta(meta, key, value)})
+
+    def _apply_bulk_load_settings(self, index: str) -> dict | None:
+        """
+        Switch the index to BULK_LOAD_SETTINGS. Returns the explicit settings it had before
+        (None for defaults), or None if they could not be read or changed. The originals are kept
+        in the index _meta, so bulk loads of other processes that overlap restore them too.
+        """
+        try:
+            with metrics.observe_operation("index_settings"):
+                current = self.client.indices.get_settings(index=index, name=",".join(BULK_LOAD_SETTINGS), flat_settings=True)
+                meta = self._index_meta(index)
+                original = bulk_load_original(current[index]["settings"], meta)
+                if BULK_LOAD_META not in meta:
+                    self.client.indices.put_mapping(index=index, body={"_meta": updated_meta(meta, BULK_LOAD_META, {"settings": original})})
+                self.client.indices.put_settings(index=index, body=BULK_LOAD_SETTINGS)
+            self._logger.info(f"Index {index} is in bulk-load mode, previous settings {original}")
+            return original
+        except Exception as e:
+            self._logger.error(f"Error switching index {index} to bulk-load mode", exc_info=True)
+            return None
+
+    def _finish_bulk_load(self, index: str, original: dict | None, force_merge_segments: int) -> None:
+        if original is not None:
+            try:
+                with metrics.observe_operation("index_settings"):
+                    self.client.indices.put_settings(index=index, body=original)
+                    self._set_index_meta(index, BULK_LOAD_META, None)
+                self._logger.info(f"Restored settings {original} of index {index}")
+            except Exception as e:
+                self._logger.error(f"Error restoring settings {original} of index {index}", exc_info=True)
+        try:
+            with metrics.observe_operation("refresh"):
+                self.client.indices.refresh(index=index)
+            if force_merge_segments:
+                with metrics.observe_operation("force_merge"):
+                    self.client.indices.forcemerge(
+                        index=index,
+                        max_num_segments=force_merge_segments,
+                        request_timeout=settings.BULK_LOAD_FORCE_MERGE_TIMEOUT,
+                    )
+                self._logger.info(f"Force merged index {index} to {force_merge_segments} segment(s)")
+        except Exception as e:
+            self._logger.error(f"Error refreshing index {index} after bulk load", exc_info=True)
+
+    @contextmanager
+    def bulk_load_mode(self, index_name: str, force_merge_segments: int = settings.BULK_LOAD_FORCE_MERGE_SEGMENTS) -> Iterator[None]:
+        """
+        Turn off refreshes and replicas of the index for a large ingest. On exit, also when the
+        ingest fails, the previous settings are restored, the index is refreshed and optionally
+        force merged. Shared indices are left alone, other tenants would stop seeing their writes.
+        """
+        target = resolve(index_name)
+        if target.shared:
+            self._logger.info(f"Index {target.index} is shared, bulk-load mode is not used")
+            yield
+            return
+        if bulk_loads.enter(target.index):
+            bulk_loads.set_original(target.index, self._apply_bulk_load_settings(target.index))
+        try:
+            yield
+        finally:
+            last, original = bulk_loads.leave(target.index)
+            if last:
+                self._finish_bulk_load(target.index, original, force_merge_segments)
+
+    def index_activity(self) -> dict[str, dict] | None:
+        """
+        Operation counters and lifecycle marker of the per-user indices, see lifecycle.parse_index_activity.
+        """
+        try:
+            with metrics.observe_operation("index_activity"):
+                index_settings = self.client.indices.get_settings(
+                    index="_all", name="index.default_pipeline", flat_settings=True, expand_wildcards="all",
+                )
+                mappings = self.client.indices.get_mapping(index="_all", expand_wildcards="all", filter_path="*.mappings._meta")
+                stats = self.client.indices.stats(
+                    metric="search,indexing",
+                    filter_path="indices.*.total.search.query_total,indices.*.total.indexing.index_total",
+                )
+        except Exception as e:
+            self._logger.error("Error reading the activity of the indices", exc_info=True)
+            return None
+        return parse_index_activity(index_settings, mappings or {}, stats or {})
+
+    def index_memory(self, index: str) -> int:
+        """
+        Bytes of segment heap and loaded kNN graphs held by the index, 0 if unknown.
+        """
+        try:
+            with metrics.observe_operation("index_memory"):
+                stats = self.client.indices.stats(index=index, metric="segments")
+                knn_stats = self.client.transport.perform_request("GET", "/_plugins/_knn/stats/indices_in_cache")
+        except Exception as e:
+            self._logger.warning(f"Could not read the memory used by index {index}", exc_info=True)
+            return 0
+        return index_memory_bytes(index, stats, knn_stats)
+
+    def lifecycle_state(self, index: str) -> dict | None:
+        """
+        {"state": "open" or "close", "lifecycle": marker or None} of the index, None if it does not exist or on error.
+        """
+        try:
+            with metrics.observe_operation("lifecycle_state"):
+                response = self.client.cluster.state(
+                    metric="metadata", index=index,
+                    filter_path="metadata.indices.*.state,metadata.indices.*.mappings.*._meta",
+                )
+        except NotFoundError:
+            return None
+        except Exception as e:
+            self._logger.error(f"Error reading the lifecycle state of index {index}", exc_info=True)
+            return None
+        return parse_lifecycle_state(index, response)
+
+    def _evict_knn_graphs(self, index: str) -> None:
+        try:
+            with metrics.observe_operation("knn_clear_cache"):
+                self.client.transport.perform_request("POST", f"/_plugins/_knn/clear_cache/{index}")
+        except Exception as e:
+            self._logger.warning(f"Could not evict the kNN graphs of index {index}", exc_info=True)
+
+    def _warm_up_knn_graphs(self, index: str) -> None:
+        try:
+            with metrics.observe_operation("knn_warmup"):
+                self.client.transport.perform_request(
+                    "GET", f"/_plugins/_knn/warmup/{index}", params={"request_timeout": settings.LIFECYCLE_RESTORE_TIMEOUT},
+                )
+        except Exception as e:
+            self._logger.warning(f"Could not load the kNN graphs of index {index}", exc_info=True)
+
+    def deactivate_index(self, index: str, action: str, reclaimed_bytes: int = 0) -> bool:
+        """
+        Close the idle index (CLOSE), evict its kNN graphs from native memory (EVICT), or switch it to
+        LIFECYCLE_WARM_SETTINGS and evict them (WARM). The marker in the mapping's _meta, with the
+        settings to restore, is written first: it is how the next request knows to restore the index.
+        """
+        marker = lifecycle_marker(action, reclaimed_bytes)
+        try:
+            with metrics.observe_operation("lifecycle_deactivate"):
+                if action == WARM:
+                    current = self.client.indices.get_settings(
+                        index=index, name=",".join(settings.LIFECYCLE_WARM_SETTINGS), flat_settings=True,
+                    )
+                    marker["settings"] = {name: current[index]["settings"].get(name) for name in settings.LIFECYCLE_WARM_SETTINGS}
+                self._set_index_meta(index, LIFECYCLE_META, marker)
+                if action == CLOSE:
+                    self.client.indices.close(index=index)
+                elif action == WARM:
+                    self.client.indices.put_settings(index=index, body=settings.LIFECYCLE_WARM_SETTINGS)
+        except Exception as e:
+            self._logger.error(f"Error deactivating index {index} ({action})", exc_info=True)
+            return False
+        if action in (EVICT, WARM):
+            self._evict_knn_graphs(index)
+        return True
+
+    def reactivate_index(self, index: str, state: dict) -> bool:
+        """
+        Undo deactivate_index: reopen the index, restore its settings, drop the marker and load its kNN graphs.
+        """
+        marker = state["lifecycle"]
+        try:
+            with metrics.observe_operation("lifecycle_restore"):
+                if state["state"] == CLOSED:
+                    self.client.indices.open(index=index, request_timeout=settings.LIFECYCLE_RESTORE_TIMEOUT)
+                if marker.get("settings"):
+                    self.client.indices.put_settings(index=index, body=marker["settings"])
+                self._set_index_meta(index, LIFECYCLE_META, None)
+        except Exception as e:
+            self._logger.error(f"Error restoring index {index}", exc_info=True)
+            return False
+        self._warm_up_knn_graphs(index)
+        return True
+
+    def _stored_sources(self, actions: list[dict]) -> list[dict | None]:
+        """
+        The stored source of every action's document (None if missing), fetched with one mget.
+        If the lookup fails every chunk is treated as new, deduplication must never lose data.
+        """
+        keyed = [action for action in actions if action.get("_id")]
+        response = None
+        if keyed:
+            try:
+                with metrics.observe_operation("dedup_mget"):
+                    response = self.client.mget(body=mget_body(keyed), _source_excludes=["embedding"])
+            except Exception as e:
+                self._logger.warning("Could not fetch stored chunks, indexing all of them", exc_info=True)
+        return stored_sources(actions, response)
+
+    def _deduplicated(self, actions: Iterable[dict], summary: dict, progress: Callable[[bool, dict], None] | None) -> Iterable[dict]:
+        """
+        Hash every chunk's text and drop chunks that are stored unchanged. Chunks whose text is
+        unchanged but whose metadata changed become partial updates, which skip the ingest pipeline.
+        """
+        for batch in batched(map(with_hash, actions), settings.DEDUP_BATCH_SIZE):
+            yield from without_unchanged(batch, self._stored_sources(batch), summary, progress)
+
+    def ingest_data_bulk(
+        self,
+        data: Iterable[dict],
+        raise_on_error: bool = True,
+        progress: Callable[[bool, dict], None] | None = None,
+        deduplicate: bool = settings.INGEST_DEDUP,
+        pace: Callable[[Iterable[dict]], Iterable[dict]] | None = None,
+    ):
+        """
+        Index the given actions with adaptive bulk requests. `data` may be a list or any
+        iterable (e.g. a generator over a request stream), it is consumed lazily.
+        With `deduplicate`, chunks whose text is already stored are not embedded again.
+        `pace` wraps the actions that are left after deduplication, e.g. to throttle them.
+        `progress` is called with (ok, item) for every processed action.
+        Returns a summary with the number of indexed, updated, unchanged and failed documents.
+        """
         self._logger.info("Ingest data bulk")
-        self._logger.info(f"Data to be uploaded:")
-        self._logger.info(json.dumps(data, indent=4, ensure_ascii=False))
+        if isinstance(data, list):
+            log_payload(self._logger, "Data to be uploaded:", data)
         try:
-            ret = helpers.parallel_bulk(
-                self.client, 
-                actions=data, 
-                chunk_size=10, 
-                raise_on_error=True,
-                raise_on_exception=False,
-                # max_chunk_bytes=20 * 1024 * 1024,
-                request_timeout=60
-            )
-            self._logger.info("Successfully performed parallel bulk ingestion")
-            self._logger.info(f"Response:\n{list(ret)}")
-            return ret
+            summary = new_ingest_summary()
+            actions = map(scope_action, data)
+            if deduplicate:
+                actions = self._deduplicated(actions, summary, progress)
+            if pace:
+                actions = pace(actions)
+            ret = self.bulk_indexer.index(actions, raise_on_error=raise_on_error)
+            # count results instead of materialising them so memory stays flat for streamed input
+            with metrics.observe_operation("bulk_ingest"):
+                for ok, item in ret:
+                    count_ingest_result(summary, ok, item)
+                    if progress:
+                        progress(ok, item)
+            record_ingest_summary(summary)
+            self._logger.info(f"Performed bulk ingestion, {summary}, {self.bulk_indexer.stats()}")
+            return summary
         except Exception as e:
-            self._logger.error("Error during parallel bulk ingestion", exc_info=True)
+            self._logger.error("Error during bulk ingestion", exc_info=True)
             return None
 
     def delete_document(self, index: str, filename: str):
         self._logger.info(f"Delete document {filename}")
+        target = resolve(index)
         try:
-            body = {
-                "query": {
-                    "term": {
-                        "filename": filename
-                    }
-                }
-            }
-            ret = self.client.delete_by_query(
-                index=index,
-                body=body
-            )
+            with metrics.observe_operation("delete_by_query"):
+                ret = self.client.delete_by_query(
+                    index=target.index,
+                    body=build_delete_document_query(target, filename),
+                    routing=target.routing,
+                )
+            metrics.observe_took("delete_by_query", ret)
             self._logger.info(f"Successfully deleted document {filename}", exc_info=True)
             return ret
         except Exception as e:
+            self._forget_missing_index(target.index, e)
             self._logger.error(f"Error deleting document {filename}", exc_info=True)
             return None
@@ -1,13 +1,31 @@
 from app import create_app
 import os
-from init import setup_opensearch
+from init import run_bootstrap, start_bootstrap
+import settings
 
-setup_opensearch()
+# readiness (/readyz) reports when the model is deployed, liveness (/livez) is served meanwhile
+if settings.BOOTSTRAP_IN_BACKGROUND:
+    start_bootstrap()
+else:
+    run_bootstrap()
 
-app = create_app()
+if settings.SERVING_MODE == "async":
+    from app.async_app import create_async_app
+    app = create_async_app()
+else:
+    app = create_app()
 
 HOSTNAME = os.environ.get('HOSTNAME', '0.0.0.0')
 PORT = int(os.environ.get('PORT', '5700'))
 
 if __name__ == '__main__':
-    app.run(host=HOSTNAME, port=PORT, debug=True)
+    if settings.SERVING_MODE == "async":
+        import asyncio
+        from hypercorn.asyncio import serve
+        from hypercorn.config import Config as HypercornConfig
+
+        config = HypercornConfig()
+        config.bind = [f"{HOSTNAME}:{PORT}"]
+        asyncio.run(serve(app, config))
+    else:
+        app.run(host=HOSTNAME, port=PORT, debug=True)
@@ -1,4 +1,5 @@
 from pathlib import Path
+import json
 import os
 from dotenv import load_dotenv
 
@@ -9,11 +10,189 @@ ADMIN_PASSWD = os.environ.get('OPENSEARCH_INITIAL_ADMIN_PASSWORD')
 INDEX_NAME = 'knn-index'
 PIPELINE_NAME = "ingest-pipeline"
 MODEL_URL = "huggingface/sentence-transformers/multi-qa-MiniLM-L6-cos-v1"
+EMBEDDING_DIMENSION = 384
 MODEL_NAME = "sentence-transformers/multi-qa-MiniLM-L6-cos-v1"
 MODEL_GROUP_NAME = "Model group"
 MODEL_GROUP_ID = None
 MODEL_ID = None
 OPENSEARCH_ADDRESS=os.environ.get('OPENSEARCH_ADDRESS')
+# Comma separated seed nodes ("host", "host:port" or "https://host:port"), defaults to OPENSEARCH_ADDRESS
+OPENSEARCH_HOSTS = [host.strip() for host in os.environ.get('OPENSEARCH_HOSTS', OPENSEARCH_ADDRESS or '').split(',') if host.strip()]
+OPENSEARCH_USE_SSL = os.environ.get('OPENSEARCH_USE_SSL', 'true').lower() == 'true'
+# Max open connections per OpenSearch node
+OPENSEARCH_POOL_MAXSIZE = int(os.environ.get('OPENSEARCH_POOL_MAXSIZE', '100'))
+OPENSEARCH_TIMEOUT = float(os.environ.get('OPENSEARCH_TIMEOUT', '10'))
+OPENSEARCH_MAX_RETRIES = int(os.environ.get('OPENSEARCH_MAX_RETRIES', '3'))
+OPENSEARCH_RETRY_ON_TIMEOUT = os.environ.get('OPENSEARCH_RETRY_ON_TIMEOUT', 'true').lower() == 'true'
+# Seconds a failed node is kept out of rotation before it is retried (doubles on repeated failures)
+OPENSEARCH_DEAD_TIMEOUT = float(os.environ.get('OPENSEARCH_DEAD_TIMEOUT', '60'))
+# Sniffing discovers the cluster's data nodes from the seeds and spreads requests across them
+OPENSEARCH_SNIFF_ON_START = os.environ.get('OPENSEARCH_SNIFF_ON_START', 'false').lower() == 'true'
+OPENSEARCH_SNIFF_ON_CONNECTION_FAIL = os.environ.get('OPENSEARCH_SNIFF_ON_CONNECTION_FAIL', 'false').lower() == 'true'
+OPENSEARCH_SNIFFER_TIMEOUT = float(os.environ.get('OPENSEARCH_SNIFFER_TIMEOUT', '0')) or None
+OPENSEARCH_SNIFF_TIMEOUT = float(os.environ.get('OPENSEARCH_SNIFF_TIMEOUT', '1'))
+# Minimum seconds between attempts to recreate a client that could not be created
+OPENSEARCH_RECONNECT_INTERVAL = float(os.environ.get('OPENSEARCH_RECONNECT_INTERVAL', '5'))
+
+# "sync" serves the Flask app, "async" the Quart app on Hypercorn with AsyncOpenSearch
+SERVING_MODE = os.environ.get('SERVING_MODE', 'sync').lower()
+
+# Logging: payloads (request bodies, responses, uploaded content) are only serialized when
+# LOG_PAYLOAD_LEVEL is enabled, a sampled fraction of them is logged and each is truncated
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_PAYLOAD_LEVEL = os.environ.get('LOG_PAYLOAD_LEVEL', 'DEBUG').upper()
+LOG_PAYLOAD_MAX_CHARS = int(os.environ.get('LOG_PAYLOAD_MAX_CHARS', '2000'))
+LOG_PAYLOAD_SAMPLE_RATE = float(os.environ.get('LOG_PAYLOAD_SAMPLE_RATE', '1.0'))
+LOG_ASYNC = os.environ.get('LOG_ASYNC', 'true').lower() == 'true'
+
+# Per-request stage timing: reported in the Server-Timing response header, and requests slower than
+# SLOW_REQUEST_THRESHOLD seconds (0 disables) are logged with their stages, a sampled fraction of them
+SERVER_TIMING_ENABLED = os.environ.get('SERVER_TIMING_ENABLED', 'true').lower() == 'true'
+SLOW_REQUEST_THRESHOLD = float(os.environ.get('SLOW_REQUEST_THRESHOLD', '1'))
+SLOW_REQUEST_SAMPLE_RATE = float(os.environ.get('SLOW_REQUEST_SAMPLE_RATE', '1.0'))
+
+# Metadata cache (model lookups and index existence), TTLs in seconds
+METADATA_CACHE_SIZE = int(os.environ.get('METADATA_CACHE_SIZE', '4096'))
+MODEL_CACHE_TTL = float(os.environ.get('MODEL_CACHE_TTL', '300'))
+INDEX_CACHE_TTL = float(os.environ.get('INDEX_CACHE_TTL', '60'))
+
+# Semantic search result cache, invalidated per index on writes. Invalidation only reaches the
+# cache of the process that served the write, other workers serve stale results for up to the TTL.
+# Results of searches started within SEARCH_CACHE_REFRESH_WINDOW seconds of a write (the index
+# refresh interval) are not cached, they may not see the write yet
+SEARCH_CACHE_SIZE = int(os.environ.get('SEARCH_CACHE_SIZE', '10000'))
+SEARCH_CACHE_TTL = float(os.environ.get('SEARCH_CACHE_TTL', '10'))
+SEARCH_CACHE_REFRESH_WINDOW = float(os.environ.get('SEARCH_CACHE_REFRESH_WINDOW', '1'))
+
+# Semantic search mode: "neural" lets OpenSearch embed the query on every request, "knn" embeds
+# it once through the ML predict API, caches the vector and sends a plain knn query
+SEARCH_MODE = os.environ.get('SEARCH_MODE', 'neural')
+SEARCH_MODES = ("neural", "knn")
+EMBEDDING_CACHE_SIZE = int(os.environ.get('EMBEDDING_CACHE_SIZE', '10000'))
+EMBEDDING_CACHE_TTL = float(os.environ.get('EMBEDDING_CACHE_TTL', '3600'))
+SEARCH_BATCH_MAX_QUERIES = int(os.environ.get('SEARCH_BATCH_MAX_QUERIES', '50'))
+# Largest `k` (hits per query) a search may ask for
+SEARCH_MAX_K = int(os.environ.get('SEARCH_MAX_K', '100'))
+
+# /search response shaping: "full" returns the OpenSearch hits, "compact" flat {id, score, fields};
+# highlight snippets are up to SEARCH_HIGHLIGHT_FRAGMENTS fragments of SEARCH_HIGHLIGHT_FRAGMENT_SIZE characters
+SEARCH_FORMATS = ("full", "compact")
+SEARCH_HIGHLIGHT_FRAGMENT_SIZE = int(os.environ.get('SEARCH_HIGHLIGHT_FRAGMENT_SIZE', '150'))
+SEARCH_HIGHLIGHT_FRAGMENTS = int(os.environ.get('SEARCH_HIGHLIGHT_FRAGMENTS', '2'))
+# Serialize JSON responses with orjson when it is installed, false forces the stdlib encoder
+FAST_JSON = os.environ.get('FAST_JSON', 'true').lower() == 'true'
+
+# Batched deletion: filenames per /delete-batch request, and how long finished deletion tasks
+# are remembered to invalidate the search cache of their index
+DELETE_BATCH_MAX_FILENAMES = int(os.environ.get('DELETE_BATCH_MAX_FILENAMES', '1000'))
+DELETE_TASK_TTL = float(os.environ.get('DELETE_TASK_TTL', '3600'))
+
+# Document listing: number of distinct filenames fetched per composite aggregation page
+DOCUMENTS_PAGE_SIZE = int(os.environ.get('DOCUMENTS_PAGE_SIZE', '1000'))
+# Largest `page_size` of a paginated /get-documents listing
+DOCUMENTS_MAX_PAGE_SIZE = int(os.environ.get('DOCUMENTS_MAX_PAGE_SIZE', '1000'))
+
+# kNN index profile from opensearch-config/index-profiles.json used for new indices
+INDEX_PROFILE = os.environ.get('INDEX_PROFILE', 'default')
+
+# Tenancy: "index" gives every user id its own index, "shared" stores users in a few shared
+# indices, routed by user id and filtered on the tenant field
+TENANCY_MODE = os.environ.get('TENANCY_MODE', 'index').lower()
+SHARED_INDEX_PREFIX = os.environ.get('SHARED_INDEX_PREFIX', 'documents')
+SHARED_INDEX_COUNT = int(os.environ.get('SHARED_INDEX_COUNT', '1'))
+SHARED_INDEX_SHARDS = int(os.environ.get('SHARED_INDEX_SHARDS', '6'))
+
+# Lifecycle of idle per-user indices, off by default ("none"): an index without searches, uploads or listings
+# for LIFECYCLE_IDLE_AFTER seconds is closed ("close"), has its kNN graphs evicted from native memory ("evict")
+# or is switched to LIFECYCLE_WARM_SETTINGS and evicted ("warm"). The next request for the index reopens or
+# restores it. Indices are checked every LIFECYCLE_SWEEP_INTERVAL seconds by one instance per cluster (behind
+# a lock document in LOCK_INDEX), at most LIFECYCLE_MAX_PER_SWEEP of them are deactivated per check, and an
+# active index is not checked again for LIFECYCLE_STATE_TTL seconds (at most half of LIFECYCLE_IDLE_AFTER)
+LIFECYCLE_ACTION = os.environ.get('LIFECYCLE_ACTION', 'none').lower()
+LIFECYCLE_ACTIONS = ("none", "close", "evict", "warm")
+LIFECYCLE_IDLE_AFTER = float(os.environ.get('LIFECYCLE_IDLE_AFTER', str(7 * 24 * 3600)))
+LIFECYCLE_SWEEP_INTERVAL = float(os.environ.get('LIFECYCLE_SWEEP_INTERVAL', '600'))
+LIFECYCLE_MAX_PER_SWEEP = int(os.environ.get('LIFECYCLE_MAX_PER_SWEEP', '50'))
+LIFECYCLE_STATE_TTL = float(os.environ.get('LIFECYCLE_STATE_TTL', '30'))
+LIFECYCLE_RESTORE_TIMEOUT = int(os.environ.get('LIFECYCLE_RESTORE_TIMEOUT', '60'))
+LIFECYCLE_WARM_SETTINGS = json.loads(os.environ.get(
+    'LIFECYCLE_WARM_SETTINGS', '{"index.number_of_replicas": 0, "index.refresh_interval": "-1"}'
+))
+LIFECYCLE_HISTORY = int(os.environ.get('LIFECYCLE_HISTORY', '100'))
+
+# Adaptive bulk ingestion: batches are bounded by document count and bytes, batch size and
+# parallelism adapt to bulk latency and 429 rejections within these limits
+BULK_INITIAL_BATCH_DOCS = int(os.environ.get('BULK_INITIAL_BATCH_DOCS', '50'))
+BULK_MIN_BATCH_DOCS = int(os.environ.get('BULK_MIN_BATCH_DOCS', '5'))
+BULK_MAX_BATCH_DOCS = int(os.environ.get('BULK_MAX_BATCH_DOCS', '500'))
+BULK_MAX_BATCH_BYTES = int(os.environ.get('BULK_MAX_BATCH_BYTES', str(10 * 1024 * 1024)))
+BULK_INITIAL_PARALLELISM = int(os.environ.get('BULK_INITIAL_PARALLELISM', '2'))
+BULK_MAX_PARALLELISM = int(os.environ.get('BULK_MAX_PARALLELISM', '4'))
+BULK_TARGET_LATENCY = float(os.environ.get('BULK_TARGET_LATENCY', '5'))
+BULK_MAX_RETRIES = int(os.environ.get('BULK_MAX_RETRIES', '5'))
+BULK_INITIAL_BACKOFF = float(os.environ.get('BULK_INITIAL_BACKOFF', '1'))
+BULK_MAX_BACKOFF = float(os.environ.get('BULK_MAX_BACKOFF', '30'))
+BULK_REQUEST_TIMEOUT = int(os.environ.get('BULK_REQUEST_TIMEOUT', '60'))
+
+# Bulk-load mode for large imports: refreshes and replicas are off during the ingest, afterwards
+# the index is refreshed and, unless BULK_LOAD_FORCE_MERGE_SEGMENTS is 0, merged to that many segments
+BULK_LOAD_FORCE_MERGE_SEGMENTS = int(os.environ.get('BULK_LOAD_FORCE_MERGE_SEGMENTS', '0'))
+BULK_LOAD_FORCE_MERGE_TIMEOUT = int(os.environ.get('BULK_LOAD_FORCE_MERGE_TIMEOUT', '3600'))
+
+# Content-hash deduplication: chunks whose text is already stored are not re-embedded,
+# stored hashes are fetched with one mget per DEDUP_BATCH_SIZE chunks
+INGEST_DEDUP = os.environ.get('INGEST_DEDUP', 'true').lower() == 'true'
+DEDUP_BATCH_SIZE = int(os.environ.get('DEDUP_BATCH_SIZE', '500'))
+
+# Admission control of /search and uploads: at most ADMISSION_MAX_CONCURRENT requests run at once,
+# uploads at most ADMISSION_MAX_INGEST of them and never while a search waits, per tenant at most
+# ADMISSION_TENANT_MAX_SEARCHES / ADMISSION_TENANT_MAX_INGEST. Token buckets (rate per second and
+# burst, a rate of 0 disables them) limit searches and embedded chunks per tenant and globally.
+# Requests wait up to ADMISSION_QUEUE_TIMEOUT seconds in a queue of ADMISSION_QUEUE_SIZE per kind,
+# then get 429 with Retry-After
+ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', 'true').lower() == 'true'
+ADMISSION_MAX_CONCURRENT = int(os.environ.get('ADMISSION_MAX_CONCURRENT', '64'))
+ADMISSION_MAX_INGEST = int(os.environ.get('ADMISSION_MAX_INGEST', '8'))
+ADMISSION_TENANT_MAX_SEARCHES = int(os.environ.get('ADMISSION_TENANT_MAX_SEARCHES', '8'))
+ADMISSION_TENANT_MAX_INGEST = int(os.environ.get('ADMISSION_TENANT_MAX_INGEST', '2'))
+ADMISSION_QUEUE_SIZE = int(os.environ.get('ADMISSION_QUEUE_SIZE', '100'))
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', '5'))
+ADMISSION_TENANT_SEARCH_RATE = float(os.environ.get('ADMISSION_TENANT_SEARCH_RATE', '20'))
+ADMISSION_TENANT_SEARCH_BURST = float(os.environ.get('ADMISSION_TENANT_SEARCH_BURST', '40'))
+ADMISSION_TENANT_INGEST_RATE = float(os.environ.get('ADMISSION_TENANT_INGEST_RATE', '200'))
+ADMISSION_TENANT_INGEST_BURST = float(os.environ.get('ADMISSION_TENANT_INGEST_BURST', '2000'))
+ADMISSION_SEARCH_RATE = float(os.environ.get('ADMISSION_SEARCH_RATE', '0'))
+ADMISSION_SEARCH_BURST = float(os.environ.get('ADMISSION_SEARCH_BURST', '100'))
+ADMISSION_INGEST_RATE = float(os.environ.get('ADMISSION_INGEST_RATE', '1000'))
+ADMISSION_INGEST_BURST = float(os.environ.get('ADMISSION_INGEST_BURST', '10000'))
+ADMISSION_MAX_TENANTS = int(os.environ.get('ADMISSION_MAX_TENANTS', '100000'))
+ADMISSION_BUCKET_TTL = float(os.environ.get('ADMISSION_BUCKET_TTL', '600'))
+
+# Asynchronous ingestion jobs
+INGEST_WORKERS = int(os.environ.get('INGEST_WORKERS', '2'))
+INGEST_QUEUE_SIZE = int(os.environ.get('INGEST_QUEUE_SIZE', '100'))
+INGEST_JOB_HISTORY = int(os.environ.get('INGEST_JOB_HISTORY', '1000'))
+
+# Cluster bootstrap (cluster settings, model group, model, deployment, ingest pipeline).
+# It runs once per cluster behind a lock document in LOCK_INDEX, all durations in seconds
+BOOTSTRAP_IN_BACKGROUND = os.environ.get('BOOTSTRAP_IN_BACKGROUND', 'true').lower() == 'true'
+ML_TASK_TIMEOUT = float(os.environ.get('ML_TASK_TIMEOUT', '600'))
+ML_POLL_INITIAL_INTERVAL = float(os.environ.get('ML_POLL_INITIAL_INTERVAL', '0.5'))
+ML_POLL_MAX_INTERVAL = float(os.environ.get('ML_POLL_MAX_INTERVAL', '10'))
+BOOTSTRAP_LOCK_TTL = float(os.environ.get('BOOTSTRAP_LOCK_TTL', '900'))
+BOOTSTRAP_MAX_RETRY_INTERVAL = float(os.environ.get('BOOTSTRAP_MAX_RETRY_INTERVAL', '60'))
+LOCK_INDEX = os.environ.get('LOCK_INDEX', 'db-service-locks')
+
+# Model warm-up before the instance reports ready: every query ("|" separated) is sent through
+# the predict API and as a neural query on WARMUP_INDEX (empty disables the neural queries),
+# WARMUP_ROUNDS_PER_NODE times per worker node the model is deployed on
+WARMUP_ENABLED = os.environ.get('WARMUP_ENABLED', 'true').lower() == 'true'
+WARMUP_QUERIES = [query.strip() for query in os.environ.get(
+    'WARMUP_QUERIES',
+    'what is this document about|summary of the main findings|total amount due on the invoice',
+).split('|') if query.strip()]
+WARMUP_ROUNDS_PER_NODE = int(os.environ.get('WARMUP_ROUNDS_PER_NODE', '2'))
+WARMUP_INDEX = os.environ.get('WARMUP_INDEX', 'db-service-warmup')
 
 # Define paths dynamically relative to this file
 SRC_DIR = Path(__file__).resolve().parent
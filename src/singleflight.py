@@ -0,0 +1,78 @@
+""" Coalescing of identical concurrent calls: one caller runs the call, the others wait for its result """
+import asyncio
+import threading
+import time
+from typing import Any, Awaitable, Callable, Hashable
+from app import metrics, timing
+
+class _Call:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result = None
+        self.error: BaseException | None = None
+
+class SingleFlight:
+    """
+    Concurrent calls with the same key share one execution of the function: the first caller
+    runs it, the others block until it finishes and receive the same result or exception.
+    Nothing is kept afterwards, a call that starts after the previous one finished runs again.
+    """
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            metrics.SINGLE_FLIGHT_COALESCED_TOTAL.labels(operation=self.name).inc()
+            started = time.perf_counter()
+            call.done.wait()
+            timing.record(f"{self.name}_coalesced", time.perf_counter() - started)
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+class AsyncSingleFlight:
+    """
+    asyncio counterpart of SingleFlight. The call runs as its own task, so a caller that is
+    cancelled (e.g. the client went away) does not cancel it for the others. Use from one event loop.
+    """
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._calls: dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda finished: self._finish(key, finished))
+            return await asyncio.shield(task)
+
+        metrics.SINGLE_FLIGHT_COALESCED_TOTAL.labels(operation=self.name).inc()
+        with timing.stage(f"{self.name}_coalesced"):
+            return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # mark the exception as retrieved in case every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
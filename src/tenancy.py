@@ -0,0 +1,81 @@
+""" Placement of a user's documents: a dedicated index or a routed slice of a shared index """
+import zlib
+from typing import NamedTuple
+import settings
+
+TENANT_FIELD = "tenant_id"
+# separates the tenant from the chunk id in the _id of shared documents
+ID_SEPARATOR = ":"
+
+class TenantIndex(NamedTuple):
+    name: str           # index name used by callers (the user id)
+    index: str          # physical index
+    tenant: str | None  # set when the index is shared, also used as the routing value
+
+    @property
+    def shared(self) -> bool:
+        return self.tenant is not None
+
+    @property
+    def routing(self) -> str | None:
+        return self.tenant
+
+def resolve(name: str) -> TenantIndex:
+    """
+    Map an index name as used by the routes onto the index that holds its documents.
+    In shared mode the tenant is placed in one of SHARED_INDEX_COUNT indices by a stable hash.
+    """
+    if settings.TENANCY_MODE != "shared":
+        return TenantIndex(name, name, None)
+    if settings.SHARED_INDEX_COUNT <= 1:
+        return TenantIndex(name, settings.SHARED_INDEX_PREFIX, name)
+    slot = zlib.crc32(name.encode("utf-8")) % settings.SHARED_INDEX_COUNT
+    return TenantIndex(name, f"{settings.SHARED_INDEX_PREFIX}-{slot}", name)
+
+def tenant_filter(target: TenantIndex) -> dict | None:
+    if not target.shared:
+        return None
+    return {"term": {TENANT_FIELD: target.tenant}}
+
+def scope_query(target: TenantIndex, query: dict) -> dict:
+    """
+    Restrict a query clause to the tenant's documents.
+    """
+    if not target.shared:
+        return query
+    return {"bool": {"filter": [tenant_filter(target), query]}}
+
+def source_excludes(target: TenantIndex) -> list[str]:
+    excludes = ["embedding"]
+    if target.shared:
+        excludes.append(TENANT_FIELD)
+    return excludes
+
+def scope_action(action: dict) -> dict:
+    """
+    Rewrite a bulk action addressed to a user's index so it lands in the shared index:
+    physical index, routing by tenant, tenant-prefixed _id and the tenant field in the source.
+    """
+    target = resolve(action["_index"])
+    if not target.shared:
+        return action
+    action = action | {"_index": target.index, "_routing": target.routing}
+    if isinstance(action.get("_source"), dict):
+        action["_source"] = action["_source"] | {TENANT_FIELD: target.tenant}
+    else:
+        action[TENANT_FIELD] = target.tenant
+    if action.get("_id") is not None:
+        action["_id"] = f"{target.tenant}{ID_SEPARATOR}{action['_id']}"
+    return action
+
+def unscope_hits(target: TenantIndex, hits: list[dict]) -> list[dict]:
+    """
+    Present hits of a shared index as if they came from the user's own index.
+    """
+    if not target.shared:
+        return hits
+    prefix = f"{target.tenant}{ID_SEPARATOR}"
+    return [
+        hit | {"_index": target.name, "_id": hit["_id"].removeprefix(prefix)}
+        for hit in hits
+    ]
@@ -1,36 +1,124 @@
 import os
 import sys
+import json
+import queue
+import atexit
+import random
 import logging
+from logging.handlers import QueueHandler, QueueListener
+from typing import IO, Any, AsyncIterable, AsyncIterator, Iterator
 import settings
 
 def get_logger(
     name,
     log_dir=None,
-    level=logging.INFO,
+    level=None,
     format=f"%(asctime)s %(levelname)s: %(message)s",
     stderr=False,
     stdout=False,
 ) -> logging.Logger:
+    """
+    With settings.LOG_ASYNC the handlers run on a QueueListener thread, so file and stream
+    I/O happens off the calling (request) thread.
+    """
     log_dir = log_dir or settings.LOGS_DIR
     os.makedirs(log_dir, exist_ok=True)
 
     logger = logging.getLogger(name)
-    logger.setLevel(level)
+    logger.setLevel(level or settings.LOG_LEVEL)
     logger.propagate = False
 
     if not logger.handlers:
+        handlers = []
         fileHandler = logging.FileHandler(f'{log_dir}/{name}.log')
         fileHandler.setFormatter(logging.Formatter(format))
-        logger.addHandler(fileHandler)
+        handlers.append(fileHandler)
 
         if stderr:
             streamHandler = logging.StreamHandler(sys.stderr)
             streamHandler.setFormatter(logging.Formatter(format))
-            logger.addHandler(streamHandler)
+            handlers.append(streamHandler)
 
         if stdout:
             streamHandler = logging.StreamHandler(sys.stdout)
             streamHandler.setFormatter(logging.Formatter(format))
-            logger.addHandler(streamHandler)
+            handlers.append(streamHandler)
 
-    return logger
\ No newline at end of file
+        if settings.LOG_ASYNC:
+            log_queue = queue.SimpleQueue()
+            listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+            listener.start()
+            atexit.register(listener.stop)
+            logger.addHandler(QueueHandler(log_queue))
+        else:
+            for handler in handlers:
+                logger.addHandler(handler)
+
+    return logger
+
+def log_payload(logger: logging.Logger, message: str, payload: Any, level: int | str | None = None) -> None:
+    """
+    Log a potentially large payload. Nothing is serialized unless the payload level is enabled
+    and the record is sampled; the serialized payload is truncated to settings.LOG_PAYLOAD_MAX_CHARS.
+    """
+    level = level or settings.LOG_PAYLOAD_LEVEL
+    if isinstance(level, str):
+        level = logging.getLevelName(level)
+    if not logger.isEnabledFor(level):
+        return
+    if settings.LOG_PAYLOAD_SAMPLE_RATE < 1 and random.random() >= settings.LOG_PAYLOAD_SAMPLE_RATE:
+        return
+
+    text = payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False, default=str)
+    if len(text) > settings.LOG_PAYLOAD_MAX_CHARS:
+        text = f"{text[:settings.LOG_PAYLOAD_MAX_CHARS]}... ({len(text) - settings.LOG_PAYLOAD_MAX_CHARS} more chars)"
+    logger.log(level, f"{message}\n{text}" if message else text)
+
+def bounded_int(value: Any, maximum: int) -> int | None:
+    """
+    `value` of a request as an int between 1 and `maximum`, None when it is anything else.
+    """
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        return None
+    try:
+        number = int(value)
+    except ValueError:
+        return None
+    if isinstance(value, float) and value != number:
+        return None
+    return number if 1 <= number <= maximum else None
+
+def _parse_ndjson_line(line: bytes | str, line_number: int) -> dict:
+    try:
+        obj = json.loads(line)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON on line {line_number}: {e}") from e
+    if not isinstance(obj, dict):
+        raise ValueError(f"Expected a JSON object on line {line_number}")
+    return obj
+
+def iter_ndjson(stream: IO[bytes]) -> Iterator[dict]:
+    """
+    Lazily parse a newline-delimited JSON stream, one object per non-empty line.
+    """
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        yield _parse_ndjson_line(line, line_number)
+
+async def aiter_ndjson(chunks: AsyncIterable[bytes]) -> AsyncIterator[dict]:
+    """
+    iter_ndjson for an asynchronous stream of arbitrary byte chunks (e.g. an ASGI request body).
+    """
+    buffer = b""
+    line_number = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            if line.strip():
+                yield _parse_ndjson_line(line, line_number)
+    if buffer.strip():
+        yield _parse_ndjson_line(buffer, line_number + 1)
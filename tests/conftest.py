@@ -0,0 +1,39 @@
+""" The service runs against the in-memory fake cluster of benchmarks/fake_opensearch.py """
+import os
+import sys
+from pathlib import Path
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from fake_opensearch import serve
+
+# settings are read on import, so the environment is set before any service module is imported
+server, cluster = serve()
+os.environ["OPENSEARCH_HOSTS"] = f"http://127.0.0.1:{server.server_port}"
+os.environ["OPENSEARCH_USE_SSL"] = "false"
+os.environ["OPENSEARCH_INITIAL_ADMIN_PASSWORD"] = "admin"
+os.environ["SLOW_REQUEST_THRESHOLD"] = "0"
+os.environ["LOG_LEVEL"] = "WARNING"
+
+@pytest.fixture
+def fake_cluster():
+    from opensearch_client import _metadata_cache, _search_cache, _embedding_cache, _delete_tasks, _search_writes
+    cluster.indices.clear()
+    cluster.tasks.clear()
+    for cache in (_metadata_cache, _search_cache, _embedding_cache, _delete_tasks):
+        cache.clear()
+    _search_writes.clear()
+    yield cluster
+
+@pytest.fixture
+def client(fake_cluster):
+    from app import create_app
+    return create_app().test_client()
+
+@pytest.fixture
+def async_app(fake_cluster):
+    from app.async_app import create_async_app
+    return create_async_app()
@@ -0,0 +1,116 @@
+import threading
+import pytest
+from admission import INGEST, SEARCH, AdmissionController, Rejected, TokenBucket, _Slots
+
+def controller(**limits) -> AdmissionController:
+    limits = {"enabled": True, "max_concurrent": 1, "max_ingest": 1, "tenant_max_searches": 1,
+              "tenant_max_ingest": 1, "queue_size": 0, "queue_timeout": 0.05} | limits
+    return AdmissionController(**limits)
+
+def slots(**limits) -> _Slots:
+    limits = {"max_total": 2, "kind_limits": {SEARCH: 2, INGEST: 1}, "tenant_limits": {SEARCH: 1, INGEST: 1}, "queue_size": 1} | limits
+    return _Slots(**limits)
+
+def tokens(admission: AdmissionController, kind: str, tenant: str | None = None) -> float:
+    bucket = admission._global_buckets[kind] if tenant is None else admission._tenant_bucket(kind, tenant)
+    return bucket._tokens
+
+def test_shed_requests_get_their_tokens_back():
+    admission = controller()
+    before = tokens(admission, SEARCH, "u1")
+
+    with admission.admit(SEARCH, "u1"):
+        with pytest.raises(Rejected) as rejected:
+            with admission.admit(SEARCH, "u1"):
+                pass
+
+    assert rejected.value.reason == "queue full"
+    # only the admitted request spent a token
+    assert tokens(admission, SEARCH, "u1") == pytest.approx(before - 1, abs=0.1)
+
+def test_batches_charge_every_tenant():
+    admission = controller()
+    before = {tenant: tokens(admission, SEARCH, tenant) for tenant in ("u1", "u2")}
+
+    with admission.admit(SEARCH, None, cost=3, tenants={"u1": 2, "u2": 1}):
+        pass
+
+    assert tokens(admission, SEARCH, "u1") == pytest.approx(before["u1"] - 2, abs=0.1)
+    assert tokens(admission, SEARCH, "u2") == pytest.approx(before["u2"] - 1, abs=0.1)
+    assert admission._slots.running[SEARCH] == 0
+
+def test_token_bucket_grants_the_burst_then_paces():
+    bucket = TokenBucket(rate=10, burst=2)
+
+    assert bucket.reserve(2) == 0
+    assert bucket.reserve(1) == pytest.approx(0.1, abs=0.01)
+
+def test_token_bucket_goes_into_debt_for_large_reservations():
+    bucket = TokenBucket(rate=10, burst=2)
+
+    # larger than the bucket: granted at once while full, the next caller pays the debt
+    assert bucket.reserve(5) == 0
+    assert bucket.reserve(1, max_wait=0.1) is None
+    assert bucket.reserve(1) == pytest.approx(0.4, abs=0.01)
+
+def test_token_bucket_with_a_rate_of_zero_is_disabled():
+    bucket = TokenBucket(rate=0, burst=1)
+
+    assert bucket.reserve(1000) == 0
+    assert bucket.wait_time(1000) == 0
+
+def test_tenants_are_limited_to_their_slots():
+    state = slots()
+    state.enter(SEARCH, "u1")
+
+    assert not state.available(SEARCH, "u1")
+    assert state.available(SEARCH, "u2")
+    assert state.available(SEARCH, None)
+
+    state.leave(SEARCH, "u1")
+    assert state.available(SEARCH, "u1")
+    assert not state.tenants
+
+def test_ingest_leaves_the_last_slot_to_a_waiting_search():
+    state = slots()
+    state.enter(SEARCH, "u1")
+    state.enqueue((SEARCH, "u2"))
+
+    assert not state.available(INGEST, "u3")
+    assert state.queue_full(SEARCH)
+
+    state.dequeue((SEARCH, "u2"))
+    assert state.available(INGEST, "u3")
+
+def test_waiting_requests_time_out():
+    admission = controller(queue_size=1)
+
+    with admission.admit(SEARCH, "u1"):
+        with pytest.raises(Rejected) as rejected:
+            with admission.admit(SEARCH, "u2"):
+                pass
+
+    assert rejected.value.reason == "timed out waiting for a slot"
+    assert rejected.value.retry_after >= 1
+
+def test_a_released_slot_admits_the_next_request():
+    admission = controller(queue_size=1, queue_timeout=5)
+    admitted = threading.Event()
+
+    def waiting():
+        with admission.admit(SEARCH, "u2"):
+            admitted.set()
+
+    with admission.admit(SEARCH, "u1"):
+        thread = threading.Thread(target=waiting)
+        thread.start()
+        assert not admitted.wait(0.05)
+    thread.join(5)
+
+    assert admitted.is_set()
+
+def test_disabled_admission_admits_everything():
+    admission = controller(enabled=False)
+
+    with admission.admit(SEARCH, "u1"), admission.admit(SEARCH, "u1"):
+        assert admission._slots.running[SEARCH] == 0
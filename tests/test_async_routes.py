@@ -0,0 +1,62 @@
+import asyncio
+from test_routes import chunks, ndjson, upload_errors
+
+# the routes share one module-level AsyncOpenSearch client, its connections are bound to the first event loop
+loop = asyncio.new_event_loop()
+
+def run(app, scenario):
+    async def main():
+        async with app.test_app() as test_app:
+            return await scenario(test_app.test_client())
+    return loop.run_until_complete(main())
+
+def test_upload_stream_with_json_content_type(async_app, fake_cluster):
+    async def scenario(client):
+        response = await client.post(
+            "/db-service/upload-stream?id=u1", data=ndjson(chunks(3)), headers={"Content-Type": "application/json"},
+        )
+        return response.status_code, await response.get_json()
+
+    status, body = run(async_app, scenario)
+    assert status == 200
+    assert body["indexed"] == 3
+    assert len(fake_cluster.indices["u1"]["docs"]) == 3
+
+def test_upload_stream_skips_unchanged_chunks(async_app, fake_cluster):
+    async def scenario(client):
+        bodies = []
+        for _ in range(2):
+            response = await client.post(
+                "/db-service/upload-stream?id=u1", data=ndjson(chunks(3)), headers={"Content-Type": "application/x-ndjson"},
+            )
+            bodies.append(await response.get_json())
+        return bodies
+
+    first, second = run(async_app, scenario)
+    assert first["indexed"] == 3
+    assert second["indexed"] == 0 and second["unchanged"] == 3
+
+def test_failed_uploads_are_counted(async_app, monkeypatch):
+    from app import async_routes
+
+    async def failing_ingest(*args, **kwargs):
+        return None
+
+    async def scenario(client):
+        response = await client.post("/db-service/upload", json={"id": "u1", "content": chunks(1)})
+        return response.status_code
+
+    monkeypatch.setattr(async_routes.client, "ingest_data_bulk", failing_ingest)
+    before = upload_errors()
+
+    assert run(async_app, scenario) == 400
+    assert upload_errors() == before + 1
+
+def test_invalid_requests_are_rejected(async_app):
+    async def scenario(client):
+        response = await client.get("/db-service/search-batch", json={"queries": [{"id": "u1", "query": "chunk", "k": 0}]})
+        return response.status_code, await response.get_json()
+
+    status, body = run(async_app, scenario)
+    assert status == 400
+    assert "'k'" in body["error"]
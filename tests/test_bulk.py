@@ -0,0 +1,122 @@
+import asyncio
+from concurrent.futures import Future
+import pytest
+from opensearchpy.exceptions import TransportError
+from opensearchpy.serializer import JSONSerializer
+from bulk import AdaptiveBulkIndexer, AsyncAdaptiveBulkIndexer
+
+class FakeTransport:
+    serializer = JSONSerializer()
+
+class FakeClient:
+    transport = FakeTransport()
+
+    def __init__(self) -> None:
+        self.requests = 0
+
+    def bulk(self, body: str, request_timeout: int) -> dict:
+        self.requests += 1
+        lines = [line for line in body.splitlines() if line]
+        return {"took": 1, "items": [{"index": {"_id": str(n), "status": 201}} for n in range(len(lines) // 2)]}
+
+class FailingClient(FakeClient):
+    def bulk(self, body: str, request_timeout: int) -> dict:
+        self.requests += 1
+        raise TransportError(429, "es_rejected_execution_exception")
+
+class AsyncFakeClient(FakeClient):
+    async def bulk(self, body: str, request_timeout: int) -> dict:
+        await asyncio.sleep(0)
+        return FakeClient.bulk(self, body, request_timeout)
+
+class AsyncFailingClient(FakeClient):
+    async def bulk(self, body: str, request_timeout: int) -> dict:
+        return FailingClient.bulk(self, body, request_timeout)
+
+class IdleExecutor:
+    """
+    Accepts batches but never runs them, as when every worker is busy.
+    """
+    def submit(self, fn, *args) -> Future:
+        return Future()
+
+def indexer(client=None, **kwargs) -> AdaptiveBulkIndexer:
+    options = dict(initial_batch_docs=1, min_batch_docs=1, initial_parallelism=4, max_parallelism=4, target_latency=60)
+    return AdaptiveBulkIndexer(client or FakeClient(), **options | kwargs)
+
+def async_indexer(client=None, **kwargs) -> AsyncAdaptiveBulkIndexer:
+    options = dict(initial_batch_docs=1, min_batch_docs=1, initial_parallelism=4, max_parallelism=4, target_latency=60)
+    return AsyncAdaptiveBulkIndexer(client or AsyncFakeClient(), **options | kwargs)
+
+async def async_actions(count: int):
+    for action in actions(count):
+        yield action
+
+def collect(bulk: AsyncAdaptiveBulkIndexer, count: int, **kwargs) -> list[tuple[bool, dict]]:
+    async def main():
+        return [result async for result in bulk.index(async_actions(count), **kwargs)]
+    return asyncio.run(main())
+
+def actions(count: int):
+    for n in range(count):
+        yield {"_index": "u1", "_id": str(n), "text": f"chunk {n}"}
+
+def test_every_action_gets_a_result_and_slots_are_released():
+    bulk = indexer()
+    results = list(bulk.index(actions(10)))
+
+    assert len(results) == 10
+    assert all(ok for ok, _ in results)
+    assert bulk.stats()["in_flight"] == 0
+
+def test_cancelled_batches_release_their_slots():
+    bulk = indexer()
+    bulk._executor = IdleExecutor()
+
+    def failing_actions():
+        yield from actions(3)
+        raise ValueError("invalid chunk")
+
+    with pytest.raises(ValueError):
+        list(bulk.index(failing_actions()))
+    assert bulk.stats()["in_flight"] == 0
+
+def test_a_consumer_stopping_early_releases_the_slots():
+    bulk = indexer(initial_parallelism=2, max_parallelism=2)
+    results = bulk.index(actions(20))
+    next(results)
+    results.close()
+
+    # batches still running finish in the background, the next upload is not blocked by leaked slots
+    assert len(list(bulk.index(actions(5)))) == 5
+    assert bulk.stats()["in_flight"] == 0
+
+def test_failed_batches_release_their_slots_and_back_off():
+    client = FailingClient()
+    bulk = indexer(client, max_retries=1, initial_backoff=0, max_backoff=0)
+    results = list(bulk.index(actions(4), raise_on_error=False))
+
+    assert [ok for ok, _ in results] == [False] * 4
+    # every batch was retried once
+    assert client.requests == 8
+    assert bulk.stats()["in_flight"] == 0
+    assert bulk.parallelism < 4
+
+def test_async_indexer_grows_batches_and_releases_its_slots():
+    bulk = async_indexer()
+    results = collect(bulk, 30)
+
+    assert len(results) == 30
+    assert all(ok for ok, _ in results)
+    assert bulk.batch_docs > 1
+    assert bulk.stats()["in_flight"] == 0
+
+def test_async_indexer_retries_rejected_batches_and_backs_off():
+    client = AsyncFailingClient()
+    bulk = async_indexer(client, max_retries=1, initial_backoff=0, max_backoff=0)
+    results = collect(bulk, 4, raise_on_error=False)
+
+    assert [ok for ok, _ in results] == [False] * 4
+    assert client.requests == 8
+    assert bulk.stats()["in_flight"] == 0
+    assert bulk.parallelism < 4
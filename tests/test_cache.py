@@ -0,0 +1,37 @@
+import time
+from cache import MISSING, TTLCache
+
+def test_entries_expire():
+    cache = TTLCache(ttl=0.05)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=10)
+
+    time.sleep(0.1)
+
+    assert cache.get("a") is MISSING
+    assert cache.get("b") == 2
+
+def test_least_recently_used_entries_are_evicted():
+    cache = TTLCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is MISSING
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+
+def test_nothing_is_stored_without_a_ttl_or_a_size():
+    for cache in (TTLCache(ttl=0), TTLCache(maxsize=0)):
+        cache.set("a", 1)
+        assert len(cache) == 0
+
+def test_invalidate_and_pop():
+    cache = TTLCache()
+    for key in (("u1", "q1"), ("u1", "q2"), ("u2", "q1")):
+        cache.set(key, True)
+
+    assert cache.invalidate(lambda key: key[0] == "u1") == 2
+    assert cache.pop(("u2", "q1")) is True
+    assert cache.pop(("u2", "q1")) is MISSING
+    assert len(cache) == 0
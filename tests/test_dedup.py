@@ -0,0 +1,45 @@
+from dedup import HASH_FIELD, NOOP, content_hash, plan, with_hash
+
+def action(text: str = "chunk", **fields) -> dict:
+    return with_hash({"_index": "u1", "_id": "a.pdf-0", "text": text, "filename": "a.pdf", "page_number": 1} | fields)
+
+def stored(action: dict) -> dict:
+    return {key: value for key, value in action.items() if not key.startswith("_")}
+
+def test_with_hash_hashes_the_text():
+    assert action()[HASH_FIELD] == content_hash("chunk")
+    assert HASH_FIELD not in with_hash({"_op_type": "delete", "_index": "u1", "_id": "a.pdf-0"})
+    assert with_hash({"_index": "u1", "_source": {"text": "chunk"}})["_source"][HASH_FIELD] == content_hash("chunk")
+
+def test_new_and_modified_chunks_are_indexed():
+    current = action()
+    [(new, _), (modified, _)] = plan([current, current], [None, stored(action("old text"))])
+
+    assert new == modified == "index"
+
+def test_unchanged_chunks_are_skipped():
+    current = action()
+
+    assert list(plan([current], [stored(current)])) == [(NOOP, current)]
+
+def test_metadata_changes_are_partial_updates():
+    current = action(page_number=2)
+
+    [(op, update)] = plan([current], [stored(action())])
+
+    assert op == "update"
+    assert update == {"_op_type": "update", "_index": "u1", "_id": "a.pdf-0", "doc": {"page_number": 2}}
+
+def test_chunks_dropping_a_field_are_reindexed():
+    current = action()
+    previous = stored(action(url="https://example.com/a.pdf")) | {"embedding": [0.1], "tenant_id": "u1"}
+
+    assert list(plan([current], [previous])) == [("index", current)]
+    # internal fields alone do not count as dropped
+    assert list(plan([current], [stored(current) | {"embedding": [0.1], "tenant_id": "u1"}])) == [(NOOP, current)]
+
+def test_documents_without_a_hash_are_reindexed():
+    current = action()
+    legacy = {key: value for key, value in stored(current).items() if key != HASH_FIELD}
+
+    assert [op for op, _ in plan([current], [legacy])] == ["index"]
@@ -0,0 +1,19 @@
+import settings
+from lifecycle import IndexLifecycleManager
+from opensearch_client import OpenSearchClient
+
+def test_the_lifecycle_is_opt_in(fake_cluster):
+    assert not IndexLifecycleManager(OpenSearchClient()).enabled
+
+def test_one_instance_sweeps_per_interval(fake_cluster):
+    client = OpenSearchClient()
+    instances = [IndexLifecycleManager(client, action="evict") for _ in range(3)]
+
+    swept = [instance.periodic_sweep() for instance in instances]
+
+    assert sum(result is not None for result in swept) == 1
+
+def test_open_indices_are_not_trusted_until_they_can_be_closed(fake_cluster):
+    manager = IndexLifecycleManager(OpenSearchClient(), action="close", idle_after=10)
+
+    assert manager._active.ttl <= 5 < settings.LIFECYCLE_STATE_TTL
@@ -0,0 +1,96 @@
+import pytest
+import settings
+from app import metrics
+from bulk import BULK_LOAD_META
+from opensearch_client import OpenSearchClient, _delete_tasks, _search_cache
+
+@pytest.fixture
+def opensearch(fake_cluster):
+    client = OpenSearchClient()
+    client.create_index("u1")
+    return client
+
+def replication(cluster, index: str = "u1") -> tuple:
+    settings = cluster.indices[index]["settings"]
+    return settings.get("index.refresh_interval"), settings.get("index.number_of_replicas")
+
+def test_bulk_load_restores_the_original_settings(opensearch, fake_cluster):
+    with opensearch.bulk_load_mode("u1", force_merge_segments=0):
+        assert replication(fake_cluster) == ("-1", 0)
+
+    assert replication(fake_cluster) == (None, "1")
+    assert BULK_LOAD_META not in fake_cluster.indices["u1"]["mappings"].get("_meta", {})
+
+def test_overlapping_bulk_loads_of_two_processes(opensearch, fake_cluster):
+    # every process has its own tracker, so both apply the bulk-load settings
+    first = opensearch._apply_bulk_load_settings("u1")
+    second = opensearch._apply_bulk_load_settings("u1")
+    assert first == second == {"index.refresh_interval": None, "index.number_of_replicas": "1"}
+
+    opensearch._finish_bulk_load("u1", first, 0)
+    opensearch._finish_bulk_load("u1", second, 0)
+    assert replication(fake_cluster) == (None, "1")
+
+def test_leftover_bulk_load_settings_are_not_taken_as_original(opensearch, fake_cluster):
+    # a bulk load that died before restoring the settings
+    fake_cluster.indices["u1"]["settings"].update({"index.refresh_interval": "-1", "index.number_of_replicas": 0})
+
+    original = opensearch._apply_bulk_load_settings("u1")
+    opensearch._finish_bulk_load("u1", original, 0)
+
+    assert original == {"index.refresh_interval": None, "index.number_of_replicas": None}
+    assert replication(fake_cluster) == (None, None)
+
+def test_search_batch_does_not_cache_results_raced_by_a_write(opensearch, monkeypatch):
+    msearch = opensearch.client.msearch
+
+    def msearch_during_a_write(**kwargs):
+        response = msearch(**kwargs)
+        opensearch.invalidate_search_cache("u1")
+        return response
+
+    monkeypatch.setattr(settings, "SEARCH_CACHE_REFRESH_WINDOW", 0)
+    monkeypatch.setattr(opensearch.client, "msearch", msearch_during_a_write)
+    results = opensearch.semantic_search_batch([{"index": "u1", "query": "chunk", "k": 2}])
+
+    assert "hits" in results[0]
+    assert len(_search_cache) == 0
+
+def test_searches_right_after_a_write_are_not_cached(opensearch, monkeypatch):
+    search = [{"index": "u1", "query": "chunk", "k": 2}]
+    opensearch.invalidate_search_cache("u1")
+
+    opensearch.semantic_search_batch(search)
+    assert len(_search_cache) == 0
+
+    # the write is visible once the refresh window is over
+    monkeypatch.setattr(settings, "SEARCH_CACHE_REFRESH_WINDOW", 0)
+    opensearch.semantic_search_batch(search)
+    assert len(_search_cache) == 1
+
+def test_deletion_tasks_can_be_polled_on_another_process(opensearch, monkeypatch):
+    opensearch.ingest_data_bulk([{"_index": "u1", "_id": "a.pdf-0", "text": "chunk", "filename": "a.pdf"}])
+    task_id = opensearch.delete_documents("u1", ["a.pdf"])
+    monkeypatch.setattr(settings, "SEARCH_CACHE_REFRESH_WINDOW", 0)
+    opensearch.semantic_search_batch([{"index": "u1", "query": "chunk", "k": 2}])
+    # the poll reaches a process that did not submit the deletion and cached results from before it
+    _delete_tasks.clear()
+
+    assert opensearch.get_delete_task(task_id, "u2") is None
+    assert opensearch.get_delete_task(task_id, "u1")["completed"]
+    assert len(_search_cache) == 0
+
+def test_every_client_gets_its_own_pool_metrics(opensearch):
+    other = OpenSearchClient()
+    opensearch.connection_pool_stats()
+    other.connection_pool_stats()
+
+    samples = [
+        sample.labels["client"]
+        for family in metrics.CONNECTION_POOLS.collect() if family.name == "opensearch_nodes"
+        for sample in family.samples if sample.labels["state"] == "alive"
+    ]
+    assert len(samples) == len(set(samples)) >= 2
+
+    metrics.CONNECTION_POOLS.unregister(other)
+    assert metrics.CONNECTION_POOLS._clients.get(other) is None
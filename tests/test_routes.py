@@ -0,0 +1,89 @@
+import json
+import pytest
+import settings
+from app import metrics
+
+def ndjson(chunks: list[dict]) -> str:
+    return "\n".join(json.dumps(chunk) for chunk in chunks)
+
+def chunks(count: int, filename: str = "a.pdf") -> list[dict]:
+    return [{"id": f"{filename}-{n}", "text": f"chunk {n} of {filename}", "filename": filename, "page_number": n} for n in range(count)]
+
+def test_upload_stream_with_json_content_type(client, fake_cluster):
+    response = client.post("/db-service/upload-stream?id=u1", data=ndjson(chunks(3)), content_type="application/json")
+
+    assert response.status_code == 200
+    assert response.get_json()["indexed"] == 3
+    assert len(fake_cluster.indices["u1"]["docs"]) == 3
+
+def upload_errors() -> float:
+    return metrics.PDF_UPLOAD_TOTAL.labels(status="error")._value.get()
+
+def test_failed_uploads_are_counted(client, monkeypatch):
+    from app import routes
+    monkeypatch.setattr(routes.client, "ingest_data_bulk", lambda *args, **kwargs: None)
+    before = upload_errors()
+
+    response = client.post("/db-service/upload", json={"id": "u1", "content": chunks(1)})
+
+    assert response.status_code == 400
+    assert upload_errors() == before + 1
+
+def test_search_batch_shares_the_search_projection(client, fake_cluster):
+    client.post("/db-service/upload-stream?id=u1", data=ndjson(chunks(3)), content_type="application/x-ndjson")
+
+    batch = client.get("/db-service/search-batch", json={"queries": [{"id": "u1", "query": "chunk 1", "k": 2}]})
+    search = client.get("/db-service/search", json={"id": "u1", "query": "chunk 1", "k": 2})
+
+    assert batch.status_code == 200 and search.status_code == 200
+    hits = batch.get_json()["results"][0]["hits"] + search.get_json()
+    assert hits and all("text_hash" not in hit["_source"] for hit in hits)
+
+def test_search_batch_rejects_an_invalid_k(client, fake_cluster):
+    for k in ("abc", None, 0, -1, 10_000, 2.5):
+        response = client.get("/db-service/search-batch", json={"queries": [{"id": "u1", "query": "chunk", "k": k}]})
+
+        assert response.status_code == 400, k
+
+def test_get_documents_rejects_an_invalid_page_size(client, fake_cluster):
+    for page_size in ("abc", 0, -5, 100_000):
+        response = client.get("/db-service/get-documents", json={"id": "u1", "page_size": page_size})
+
+        assert response.status_code == 400, page_size
+
+def test_delete_tasks_are_visible_to_their_user_only(client, fake_cluster):
+    client.post("/db-service/upload-stream?id=u1", data=ndjson(chunks(3)), content_type="application/x-ndjson")
+    task_id = client.post("/db-service/delete-batch", json={"id": "u1", "filenames": ["a.pdf"]}).get_json()["task_id"]
+
+    assert client.get(f"/db-service/delete-tasks/{task_id}", json={"id": "u2"}).status_code == 404
+    assert client.get(f"/db-service/delete-tasks/{task_id}", json={}).status_code == 400
+    task = client.get(f"/db-service/delete-tasks/{task_id}", json={"id": "u1"})
+    assert task.status_code == 200
+    assert task.get_json()["deleted"] == 3
+
+def test_upload_recreates_an_index_deleted_behind_the_cache(client, fake_cluster):
+    client.post("/db-service/upload-stream?id=u1", data=ndjson(chunks(1)), content_type="application/x-ndjson")
+    client.get("/db-service/get-documents", json={"id": "u1"})
+    mappings = fake_cluster.indices["u1"]["mappings"]
+    fake_cluster.indices.pop("u1")
+
+    client.post("/db-service/upload-stream?id=u1", data=ndjson(chunks(1)), content_type="application/x-ndjson")
+
+    assert fake_cluster.indices["u1"]["mappings"] == mappings
+
+def test_requests_forget_an_index_deleted_behind_the_cache(client, fake_cluster):
+    # created, then known to exist
+    client.get("/db-service/get-documents", json={"id": "u1"})
+    client.get("/db-service/get-documents", json={"id": "u1"})
+    fake_cluster.indices.pop("u1")
+
+    assert client.get("/db-service/get-documents", json={"id": "u1"}).status_code == 400
+    assert client.get("/db-service/get-documents", json={"id": "u1"}).get_json() == {"documents": []}
+    assert "u1" in fake_cluster.indices
+
+def test_an_unknown_index_profile_fails_at_startup(monkeypatch):
+    from app import create_app
+    monkeypatch.setattr(settings, "INDEX_PROFILE", "unknown")
+
+    with pytest.raises(KeyError, match="Unknown index profile unknown"):
+        create_app()
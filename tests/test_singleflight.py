@@ -0,0 +1,64 @@
+import asyncio
+import threading
+import time
+import pytest
+from app import metrics
+from singleflight import AsyncSingleFlight, SingleFlight
+
+def coalesced(name: str) -> float:
+    return metrics.SINGLE_FLIGHT_COALESCED_TOTAL.labels(operation=name)._value.get()
+
+def test_concurrent_calls_share_one_execution():
+    flights = SingleFlight("test_threads")
+    release, calls = threading.Event(), []
+
+    def slow():
+        calls.append(1)
+        release.wait(5)
+        return "result"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flights.do("key", slow))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    # the four other callers wait for the first one
+    deadline = time.monotonic() + 5
+    while coalesced("test_threads") < 4 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == ["result"] * 5
+
+def test_errors_reach_every_caller_and_are_not_kept():
+    flights = SingleFlight("test")
+
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        flights.do("key", fail)
+    assert flights.do("key", lambda: "retried") == "retried"
+
+def test_async_callers_share_one_execution_and_survive_cancellation():
+    async def main():
+        flights = AsyncSingleFlight("test")
+        calls = []
+
+        async def slow():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "result"
+
+        first = asyncio.ensure_future(flights.do("key", slow))
+        second = asyncio.ensure_future(flights.do("key", slow))
+        await asyncio.sleep(0)
+        # the caller that started the call goes away, the other still gets the result
+        first.cancel()
+        return await second, calls
+
+    result, calls = asyncio.run(main())
+    assert result == "result"
+    assert len(calls) == 1